@@ -6,13 +6,17 @@ import sys
 import os
 import shutil
 import json
+import threading
 
 # import tab classes
 from .video_capture_tab import VideoCaptureTab
 from .camera_setup_tab import CameraSetupTab
+from .acquisition_engine import AcquisitionEngine
+from .camera_discovery import CameraDiscovery
+from .data_recorder import gpu_available
+from . import startup_timing
 
-from config.config import __version__, gui_config, ffmpeg_config, paths_config
-
+from config.config import __version__, gui_config, ffmpeg_config, paths_config, acquisition_config, recording_config
 
 if os.name == "nt":  # Needed on windows to get taskbar icon to display correctly.
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(f"pyMultiVideo v{__version__}")
@@ -27,16 +31,13 @@ class GUIMain(QMainWindow):
 
         # Deal with arguments parsed to application
         self.CLI_args = parsed_args
-        # config arguments
-        if self.CLI_args.application_config:
-            config_data = json.loads(self.CLI_args.application_config)
-            self.paths_config = config_data.get("paths_config")
-            self.ffmpeg_config = config_data.get("ffmpeg_config")
-            self.gui_config = config_data.get("gui_config")
-        else:
-            self.paths_config = paths_config
-            self.ffmpeg_config = ffmpeg_config
-            self.gui_config = gui_config
+        # config arguments, each section given in the application config is merged over its default values.
+        config_data = json.loads(self.CLI_args.application_config) if self.CLI_args.application_config else {}
+        self.paths_config = {**paths_config, **config_data.get("paths_config", {})}
+        self.ffmpeg_config = {**ffmpeg_config, **config_data.get("ffmpeg_config", {})}
+        self.gui_config = {**gui_config, **config_data.get("gui_config", {})}
+        self.acquisition_config = {**acquisition_config, **config_data.get("acquisition_config", {})}
+        self.recording_config = {**recording_config, **config_data.get("recording_config", {})}
 
         # close-after argument
         if self.CLI_args.close_after:
@@ -60,6 +61,13 @@ class GUIMain(QMainWindow):
                 "Recording unavaialable",
                 "FFMPEG path not found. \nPlease install FFMPEG and add to environment variables",
             )
+        # Check for a GPU video encoder in the background so it does not delay startup or the first recording.
+        threading.Thread(target=gpu_available, daemon=True).start()
+        # Reader threads which empty the camera buffers independently of the GUI.
+        self.acquisition_engine = AcquisitionEngine(self.acquisition_config)
+        # Enumerates connected cameras in the background.
+        self.camera_discovery = CameraDiscovery(self.acquisition_config["camera_discovery_interval"])
+        self.camera_discovery.start()
         # Set window size, title, icon.
         self.setGeometry(100, 100, 900, 800)  # x, y, width, height
         self.setWindowTitle(f"pyMultiVideo v{__version__}")  # default window title
@@ -67,7 +75,9 @@ class GUIMain(QMainWindow):
         # Initialise the tabs and tab widget.
         self.camera_setup_tab = CameraSetupTab(parent=self)
         self.camera_setup_tab.tab_deselected()
+        startup_timing.mark("cameras enumerated")
         self.video_capture_tab = VideoCaptureTab(parent=self)
+        startup_timing.mark("cameras initialised")
         self.tab_widget = QTabWidget()
         self.tab_widget.addTab(self.video_capture_tab, "Video Capture")
         self.tab_widget.addTab(self.camera_setup_tab, "Cameras")
@@ -115,10 +125,6 @@ class GUIMain(QMainWindow):
 
     def closeEvent(self, event):
         """Close the GUI"""
-        # Ensure all threadpool futures are complete
-        while self.video_capture_tab.futures:
-            future = self.video_capture_tab.futures.pop()
-            future.result()
         # Close open camera widgets
         for c_w in self.video_capture_tab.camera_widgets:
             if c_w.recording:
@@ -129,6 +135,8 @@ class GUIMain(QMainWindow):
         if self.camera_setup_tab.camera_preview:
             self.camera_setup_tab.camera_preview.closeEvent(event)
             self.camera_setup_tab.camera_preview.deleteLater()
+        self.acquisition_engine.stop_all()
+        self.camera_discovery.stop()
 
         event.accept()
         sys.exit(0)
@@ -0,0 +1,412 @@
+import math
+import time
+import queue
+import threading
+from collections import deque
+import numpy as np
+
+from camera_api.generic_camera import FramePool
+from .gpio_trigger import split_batch
+
+# -------------------------------------------------------------------------------------
+# Camera reader
+# -------------------------------------------------------------------------------------
+
+
+class CameraReader(threading.Thread):
+    """Thread that empties one camera's buffer as soon as images arrive. Image batches are
+    pushed to a bounded queue while queueing is enabled, the most recent image is kept for display.
+    Consumers of queued batches must return their frame pool slots with camera_api.release_images."""
+
+    def __init__(self, camera_api, queue_size=100, poll_interval=0.002):
+        super().__init__(daemon=True)
+        self.camera_api = camera_api
+        self.poll_interval = poll_interval  # Time to wait (s) before polling an empty camera buffer again.
+        self.queue_size = queue_size  # Maximum number of frames in the queue.
+        self.frame_queue = queue.Queue()
+        self.queue_enabled = False  # True while batches are needed by a consumer (e.g. the data recorder).
+        self.pre_trigger_settings = None  # (duration, max_size, fps) of the pre-trigger buffer, if used.
+        self.pre_trigger = None  # PreTriggerBuffer, created when the first batch is read.
+        self.gpio_trigger = None  # GPIOTrigger starting and stopping queueing while armed, see gpio_trigger.py.
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._queue_space = threading.Condition(self._lock)  # Notified when batches are taken from the queue.
+        self._queue_lock = threading.Lock()  # Held while deciding whether to queue a batch.
+        # Latest data for display.
+        self.latest_image = None
+        self.latest_slot = None  # (frame_pool, slot) of the latest image, retained until the next batch.
+        self.latest_GPIO = None
+        self.frame_timestamps = deque(maxlen=10)
+        self.newly_dropped_frames = 0
+        # Statistics.
+        self.frames_read = 0
+        self.queued_frames = 0
+        self.max_queue_depth = 0
+        self.latencies = deque(maxlen=100)  # Time (s) batches spent in the queue.
+        self.error = None
+
+    def run(self):
+        """Poll the camera buffer until the reader is stopped."""
+        try:
+            while not self._stop_event.is_set():
+                new_images = self.camera_api.get_available_images()
+                if new_images is None:
+                    self._stop_event.wait(self.poll_interval)
+                    continue
+                self.process_batch(new_images)
+        except Exception as e:
+            self.error = e
+            print(f"Camera reader for {self.camera_api.serial_number} stopped: {e}")
+
+    def process_batch(self, new_images):
+        """Store the newest image for display and queue the batch if queueing is enabled."""
+        new_images["read_time"] = time.perf_counter()
+        n_images = len(new_images["images"])
+        frame_pool = new_images["frame_pool"]
+        latest_slot = new_images["frame_indices"][-1]
+        frame_pool.retain(latest_slot)
+        with self._lock:
+            previous_slot = self.latest_slot
+            self.latest_image = new_images["images"][-1]
+            self.latest_slot = (frame_pool, latest_slot)
+            self.latest_GPIO = new_images["gpio_data"][-1]
+            self.frame_timestamps.extend(new_images["timestamps"])
+            self.newly_dropped_frames += new_images["dropped_frames"]
+            self.frames_read += n_images
+        if previous_slot is not None:
+            previous_slot[0].release(previous_slot[1])
+        with self._queue_lock:
+            if self.gpio_trigger is not None:
+                batches = self.apply_gpio_trigger(new_images)
+            elif self.queue_enabled:
+                batches = [new_images]
+            else:
+                self.release_unqueued(new_images)
+                return
+        for new_images in batches:
+            self.put_batch(new_images)
+
+    def put_batch(self, new_images):
+        """Put a batch in the queue, blocking while the queue holds queue_size frames so the camera buffer is not
+        emptied faster than images are consumed."""
+        n_images = len(new_images["images"])
+        with self._queue_space:
+            while self.queued_frames and self.queued_frames + n_images > self.queue_size:
+                if self._stop_event.is_set():
+                    self.camera_api.release_images(new_images)
+                    return
+                self._queue_space.wait(0.1)
+            self.frame_queue.put(new_images)
+            self.queued_frames += n_images
+            self.max_queue_depth = max(self.max_queue_depth, self.frame_queue.qsize())
+
+    def release_unqueued(self, new_images):
+        """Release a batch that is not queued, after copying it to the pre-trigger buffer if there is one."""
+        if self.pre_trigger_settings:
+            self.add_to_pre_trigger(new_images)
+        self.camera_api.release_images(new_images)
+
+    def stop(self, timeout=1):
+        """Stop the reader thread and wait for it to finish."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        # Return frame pool slots held by the reader.
+        for new_images in self.get_batches():
+            self.camera_api.release_images(new_images)
+        with self._lock:
+            if self.latest_slot is not None:
+                self.latest_slot[0].release(self.latest_slot[1])
+                self.latest_slot = None
+
+    # Data access ---------------------------------------------------------------------
+
+    def get_latest(self):
+        """Return the most recent GPIO state and frame number, and the frame timestamps (up to 10) and number
+        of dropped frames since the previous call. Returns None if no images have been read."""
+        with self._lock:
+            if self.latest_image is None:
+                return None
+            latest = {
+                "frame_number": self.frames_read,
+                "gpio_data": self.latest_GPIO,
+                "timestamps": list(self.frame_timestamps),
+                "dropped_frames": self.newly_dropped_frames,
+            }
+            self.frame_timestamps.clear()
+            self.newly_dropped_frames = 0
+        return latest
+
+    def get_latest_image(self, out=None):
+        """Return a copy of the most recent image and its frame number, or (None, 0) if no images have been read.
+        The image is copied so the frame pool slot can be reused while the image is displayed, into out if it
+        has the image's shape."""
+        with self._lock:
+            if self.latest_image is None:
+                return None, 0
+            if out is None or out.shape != self.latest_image.shape:
+                out = np.empty_like(self.latest_image)
+            np.copyto(out, self.latest_image)
+            return out, self.frames_read
+
+    def get_batches(self):
+        """Return all image batches currently in the queue, oldest first."""
+        batches = []
+        while True:
+            try:
+                batches.append(self.frame_queue.get_nowait())
+            except queue.Empty:
+                break
+        self._batches_removed(batches)
+        return batches
+
+    def _batches_removed(self, batches):
+        """Update queue statistics for batches taken from the queue."""
+        now = time.perf_counter()
+        with self._lock:
+            for new_images in batches:
+                self.queued_frames -= len(new_images["images"])
+                if new_images["images"] and not new_images.get("pre_trigger"):
+                    self.latencies.append(now - new_images["read_time"])
+            self._queue_space.notify_all()
+
+    def start_queueing(self):
+        """Start queueing image batches, discarding anything left over from a previous consumer. Frames in the
+        pre-trigger buffer are queued first, so the queued frames continue on from them."""
+        for new_images in self.get_batches():
+            self.camera_api.release_images(new_images)
+        with self._queue_lock:
+            for new_images in self.take_pre_trigger_batches():
+                self.frame_queue.put(new_images)
+                with self._lock:
+                    self.queued_frames += len(new_images["images"])
+            self.queue_enabled = True
+
+    def stop_queueing(self):
+        """Stop queueing new image batches. Batches already in the queue are kept."""
+        with self._queue_lock:
+            self.queue_enabled = False
+
+    # Pre-trigger buffer --------------------------------------------------------------
+
+    def start_pre_trigger(self, duration, max_size, fps):
+        """Keep the frames read in the last duration seconds, in at most max_size bytes, while not queueing."""
+        with self._queue_lock:
+            if self.pre_trigger_settings != (duration, max_size, fps):
+                self.pre_trigger_settings = (duration, max_size, fps)
+                self.pre_trigger = None  # Reallocated for the new settings.
+
+    def add_to_pre_trigger(self, new_images):
+        """Copy a batch into the pre-trigger buffer, created for the batch's frame size on first use."""
+        frame_size = new_images["frame_pool"].frame_size
+        if self.pre_trigger is None or self.pre_trigger.frame_pool.frame_size != frame_size:
+            self.pre_trigger = PreTriggerBuffer(
+                frame_size, new_images["gpio_data"].shape[1], *self.pre_trigger_settings
+            )
+        self.pre_trigger.add_batch(new_images)
+
+    def take_pre_trigger_batches(self):
+        """Return the frames in the pre-trigger buffer as batches. They are queued whatever the queue size, as they
+        do not hold camera frame pool slots."""
+        if self.pre_trigger is None:
+            return []
+        return self.pre_trigger.take_batches(self.camera_api.BUFFER_SIZE)
+
+    # GPIO trigger --------------------------------------------------------------------
+
+    def arm_gpio_trigger(self, gpio_trigger):
+        """Queue batches only while the frames read meet the GPIOTrigger's rule, until disarmed. The frames
+        recording starts and stops at are marked by empty batches with "trigger" set to "start" or "stop"."""
+        with self._queue_lock:
+            gpio_trigger.reset()
+            self.gpio_trigger = gpio_trigger
+            self.queue_enabled = False
+
+    def disarm_gpio_trigger(self):
+        """Stop evaluating the GPIO trigger and stop queueing. Batches already in the queue are kept, so a
+        recording the trigger started may have no "stop" batch."""
+        with self._queue_lock:
+            self.gpio_trigger = None
+            self.queue_enabled = False
+
+    def apply_gpio_trigger(self, new_images):
+        """Split a batch at the frames the GPIO trigger starts and stops recording at, returning the batches to
+        queue. Frames read while not recording are released, via the pre-trigger buffer if there is one, and the
+        pre-trigger frames are queued when recording starts."""
+        events = self.gpio_trigger.get_events(new_images["gpio_data"], new_images["timestamps"])
+        if not events:
+            if self.queue_enabled:
+                return [new_images]
+            self.release_unqueued(new_images)
+            return []
+        batches = []
+        first_frame = 0
+        for frame, event in events + [(len(new_images["images"]), None)]:
+            if frame > first_frame:
+                part = split_batch(new_images, first_frame, frame)
+                if self.queue_enabled:
+                    batches.append(part)
+                else:
+                    self.release_unqueued(part)
+            if event == "start":
+                batches.append({**split_batch(new_images, frame, frame), "trigger": "start"})
+                batches.extend(self.take_pre_trigger_batches())
+                self.queue_enabled = True
+            elif event == "stop":
+                batches.append({**split_batch(new_images, frame, frame), "trigger": "stop"})
+                self.queue_enabled = False
+            first_frame = frame
+        return batches
+
+    def get_stats(self):
+        """Return queue depth and latency statistics for this camera."""
+        with self._lock:
+            return {
+                "frames_read": self.frames_read,
+                "queue_depth": self.frame_queue.qsize(),
+                "queued_frames": self.queued_frames,
+                "max_queue_depth": self.max_queue_depth,
+                "mean_latency": sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+                "max_latency": max(self.latencies) if self.latencies else 0.0,
+                **self.get_pre_trigger_stats(),
+            }
+
+    def get_pre_trigger_stats(self):
+        """Return the pre-trigger buffer statistics, see PreTriggerBuffer.get_stats, empty if there is no buffer."""
+        with self._queue_lock:
+            return self.pre_trigger.get_stats() if self.pre_trigger else {}
+
+
+# -------------------------------------------------------------------------------------
+# Pre-trigger buffer
+# -------------------------------------------------------------------------------------
+
+
+class PreTriggerBuffer:
+    """Ring of the most recent frames read while not recording, so a recording can include the frames from before
+    it started. Frames are copied into the slots of a preallocated FramePool, with their timestamps, GPIO states and
+    frame gaps in arrays indexed by slot. Frames older than duration (s) are released, and the oldest frame's slot is
+    reused when all slots are in use. Frames are passed to the recorder as batches of slots, so a slot is only reused
+    once the recorder has released it."""
+
+    def __init__(self, frame_size, n_gpio, duration, max_size, fps):
+        n_slots = max(1, min(max_size // frame_size, math.ceil(duration * fps) + 1))
+        self.duration = int(duration * 1e9)  # (ns)
+        self.frame_pool = FramePool(n_slots, frame_size)
+        self.timestamps = np.zeros(n_slots, dtype=np.int64)
+        self.gpio_data = np.zeros((n_slots, n_gpio), dtype=np.uint8)
+        self.frame_gaps = np.zeros(n_slots, dtype=np.int64)
+        self.read_times = np.zeros(n_slots)
+        self.slots = deque()  # Slots of the frames in the buffer, oldest first.
+
+    @property
+    def n_frames(self):
+        return len(self.slots)
+
+    def add_batch(self, new_images):
+        """Copy a batch of frames into the buffer, keeping its newest frames if it is larger than the buffer."""
+        n_images = len(new_images["images"])
+        slots = []
+        while len(slots) < n_images:
+            slot = self.frame_pool.acquire()
+            if slot is None and self.slots:
+                slot = self.slots.popleft()  # Reuse the oldest frame's slot.
+            if slot is None:  # All slots are held by the recorder.
+                break
+            slots.append(slot)
+        if not slots:
+            return
+        slots = np.array(slots, dtype=np.intp)
+        batch = slice(n_images - len(slots), n_images)
+        self.frame_pool.frames[slots] = new_images["frame_pool"].frames[new_images["frame_indices"][batch]]
+        self.timestamps[slots] = new_images["timestamps"][batch]
+        self.gpio_data[slots] = new_images["gpio_data"][batch]
+        self.frame_gaps[slots] = new_images["frame_gaps"][batch]
+        self.read_times[slots] = new_images["read_time"]
+        self.slots.extend(slots.tolist())
+        # Release frames more than duration older than the newest frame.
+        while self.timestamps[self.slots[-1]] - self.timestamps[self.slots[0]] > self.duration:
+            self.frame_pool.release(self.slots.popleft())
+
+    def take_batches(self, batch_size):
+        """Return the frames in the buffer as batches in the format returned by get_available_images, oldest first,
+        and empty the buffer. Slots are returned to the buffer by camera_api.release_images."""
+        slots = np.array(self.slots, dtype=np.intp)
+        self.slots.clear()
+        batches = []
+        for start in range(0, len(slots), batch_size):
+            batch_slots = slots[start : start + batch_size]
+            frame_gaps = self.frame_gaps[batch_slots]
+            batches.append(
+                {
+                    "images": [self.frame_pool.frames[slot] for slot in batch_slots],
+                    "frame_indices": batch_slots,
+                    "frame_pool": self.frame_pool,
+                    "gpio_data": self.gpio_data[batch_slots],
+                    "timestamps": self.timestamps[batch_slots],
+                    "frame_gaps": frame_gaps,
+                    "dropped_frames": int(frame_gaps.sum()),
+                    "read_time": float(self.read_times[batch_slots[-1]]),
+                    "pre_trigger": True,  # Frames read before recording started.
+                }
+            )
+        return batches
+
+    def get_stats(self):
+        """Return the duration (s) and memory use (bytes) of the frames in the buffer and the memory allocated."""
+        n_frames = len(self.slots)
+        duration = (self.timestamps[self.slots[-1]] - self.timestamps[self.slots[0]]) / 1e9 if n_frames else 0.0
+        return {
+            "pre_trigger_frames": n_frames,
+            "pre_trigger_duration": duration,
+            "pre_trigger_bytes": n_frames * self.frame_pool.frame_size,
+            "pre_trigger_allocated_bytes": self.frame_pool.frames.nbytes,
+        }
+
+
+# -------------------------------------------------------------------------------------
+# Acquisition engine
+# -------------------------------------------------------------------------------------
+
+
+class AcquisitionEngine:
+    """Manages one CameraReader thread per camera, indexed by camera unique ID."""
+
+    def __init__(self, acquisition_config):
+        self.acquisition_config = acquisition_config
+        self.readers = {}  # {unique_id: CameraReader}
+
+    def start_reader(self, unique_id, camera_api, fps=None):
+        """Start a reader thread for the camera, or return the running reader if there is one. If fps is given
+        and acquisition_config pre_trigger_duration is set, the reader keeps a pre-trigger buffer."""
+        reader = self.readers.get(unique_id)
+        if reader is None or not (reader.camera_api is camera_api and reader.is_alive()):
+            if reader is not None:
+                self.stop_reader(unique_id)
+            reader = CameraReader(
+                camera_api,
+                queue_size=self.acquisition_config["reader_queue_size"],
+                poll_interval=self.acquisition_config["reader_poll_interval"],
+            )
+            reader.start()
+            self.readers[unique_id] = reader
+        if fps and self.acquisition_config["pre_trigger_duration"]:
+            reader.start_pre_trigger(
+                self.acquisition_config["pre_trigger_duration"], self.acquisition_config["pre_trigger_max_size"], fps
+            )
+        return reader
+
+    def stop_reader(self, unique_id):
+        """Stop the camera's reader thread. Must be called before the camera stops capturing."""
+        reader = self.readers.pop(unique_id, None)
+        if reader is not None:
+            reader.stop()
+
+    def stop_all(self):
+        """Stop all reader threads."""
+        for unique_id in list(self.readers.keys()):
+            self.stop_reader(unique_id)
+
+    def get_stats(self):
+        """Return queue depth and latency statistics for every camera."""
+        return {unique_id: reader.get_stats() for unique_id, reader in self.readers.items()}
@@ -0,0 +1,76 @@
+import time
+import threading
+from collections import deque
+
+from camera_api import get_camera_ids
+
+# -------------------------------------------------------------------------------------
+# Camera discovery
+# -------------------------------------------------------------------------------------
+
+
+class CameraDiscovery:
+    """Keeps the list of connected cameras up to date by enumerating cameras on a background thread.
+    Cameras added or removed since the previous enumeration are reported as events by get_events."""
+
+    def __init__(self, discovery_interval):
+        self.discovery_interval = discovery_interval  # Time (s) between enumerations, 0 for only when requested.
+        self.camera_ids = None  # Unique IDs of the cameras found by the last enumeration.
+        self.scan_duration = None  # Time (s) taken by the last enumeration.
+        self._events = deque()  # ("added" or "removed", unique_id) not yet returned by get_events.
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._scan_requested = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """Start enumerating cameras in the background."""
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._scan_requested.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._scan_requested.wait(self.discovery_interval or None)
+            self._scan_requested.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Error enumerating cameras: {e}")
+
+    def scan(self):
+        """Enumerate connected cameras and queue events for cameras added or removed since the previous enumeration."""
+        with self._scan_lock:
+            start_time = time.perf_counter()
+            camera_ids, _ = get_camera_ids()
+            with self._lock:
+                previous_ids = self.camera_ids or []
+                self._events.extend(("added", unique_id) for unique_id in camera_ids if unique_id not in previous_ids)
+                self._events.extend(("removed", unique_id) for unique_id in previous_ids if unique_id not in camera_ids)
+                self.camera_ids = camera_ids
+                self.scan_duration = time.perf_counter() - start_time
+
+    def request_scan(self):
+        """Enumerate cameras on the background thread as soon as possible."""
+        self._scan_requested.set()
+
+    def get_camera_ids(self) -> list[str]:
+        """Return the cameras found by the last enumeration, enumerating now if cameras have not been enumerated."""
+        if self.camera_ids is None:
+            self.scan()
+        with self._lock:
+            return list(self.camera_ids)
+
+    def get_events(self) -> list[tuple[str, str]]:
+        """Return the ("added" or "removed", unique_id) events since the previous call, oldest first."""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
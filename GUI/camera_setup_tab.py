@@ -1,9 +1,11 @@
 import os
 import json
-from dataclasses import dataclass, asdict
+import queue
+import threading
+from dataclasses import asdict
 
 from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtWidgets import (
     QWidget,
     QGroupBox,
@@ -21,22 +23,9 @@ from PyQt6.QtWidgets import (
 )
 
 from config.config import default_camera_config
+from config.config_classes import CameraSettingsConfig
 from .camera_widget import CameraWidget
-from camera_api import get_camera_ids, init_camera_api_from_module
-
-
-@dataclass
-class CameraSettingsConfig:
-    """Represents the CamerasTab settings for one camera"""
-
-    name: str
-    unique_id: str
-    fps: int
-    exposure_time: float
-    gain: float
-    pixel_format: str
-    external_trigger: bool
-    downsampling_factor: int
+from camera_api import init_camera_api_from_module, init_camera_apis
 
 
 class TableCheckbox(QWidget):
@@ -68,10 +57,13 @@ class CameraSetupTab(QWidget):
         self.preview_showing = False
         self.camera_preview = None  # Place holder for camera preview widget
         self.setups_changed = False  # Flag that is checked for handling camera setups being changed
+        self.camera_discovery = self.GUI.camera_discovery
+        self.unopened_cameras = set()  # Connected cameras that could not be opened, retried on refresh.
+        self.opening_cameras = set()  # Cameras being opened on a worker thread.
+        self.opened_cameras = queue.Queue()  # (settings_list, results) of cameras opened on worker threads.
 
         # Check if any cameras are connected
-        _, CAMERAS_CONNECTED = get_camera_ids()
-        if not CAMERAS_CONNECTED:
+        if not self.camera_discovery.get_camera_ids():
             warning_box = QMessageBox()
             warning_box.setIcon(QMessageBox.Icon.Warning)
             warning_box.setText("No cameras connected.")
@@ -118,7 +110,12 @@ class CameraSetupTab(QWidget):
             self.saved_setups = [
                 CameraSettingsConfig(**{**default_camera_config, **cam_dict}) for cam_dict in cams_list
             ]
-        self.refresh()
+        self.update_setups(wait=True)
+
+        # Apply cameras connected or disconnected found by the background enumeration.
+        self.discovery_timer = QTimer()
+        self.discovery_timer.timeout.connect(self.discovery_timer_callback)
+        self.discovery_timer.start(1000)
 
     # Refresh timer / tab changing logic -------------------------------------------------------------------------------
 
@@ -163,27 +160,89 @@ class CameraSetupTab(QWidget):
                 json.dump([asdict(setup) for setup in self.saved_setups], f, indent=4)
 
     def refresh(self):
-        """Check for new and removed cameras and updates the setups table."""
-        connected_cameras, _ = get_camera_ids()
-        if not connected_cameras == self.setups.keys():
-            # Add any new cameras setups to the setups (comparing unique_ids)
-            for unique_id in set(connected_cameras) - set(self.setups.keys()):
-                # Check if this unique_id has been seen before by looking in the saved setups database
-                camera_settings_config: CameraSettingsConfig = self.get_saved_setup(unique_id=unique_id)
-                if camera_settings_config:
-                    # Instantiate the setup and add it to the setups dict
-                    self.setups[unique_id] = Camera_table_item(self.camera_table, **asdict(camera_settings_config))
-                else:  # unique_id has not been seen before, create a new setup
-                    self.setups[unique_id] = Camera_table_item(
-                        self.camera_table, **default_camera_config, unique_id=unique_id
-                    )
-                self.update_saved_setups(self.setups[unique_id])
-            # Remove any setups that are no longer connected
-            for unique_id in set(self.setups.keys()) - set(connected_cameras):
-                # Sequence for removed a setup from the table (and deleting it)
-                self.setups.pop(unique_id)
-                self.camera_table.remove(unique_id)
+        """Request an enumeration of connected cameras and update the setups table with changes found so far.
+        Changes found by the requested enumeration are applied by the discovery timer."""
+        self.camera_discovery.request_scan()
+        self.update_setups(retry_unopened=True)
+        self.add_opened_cameras()
+
+    def discovery_timer_callback(self):
+        """Update the setups table and the video capture tab if cameras have been connected or disconnected."""
+        setups_changed = self.update_setups()
+        setups_changed |= self.add_opened_cameras()
+        if setups_changed and getattr(self.GUI, "video_capture_tab", None):
+            self.GUI.video_capture_tab.refresh()
+
+    def update_setups(self, retry_unopened=False, wait=False):
+        """Add or remove setups for cameras connected or disconnected since the last update. New cameras are opened
+        concurrently on a worker thread, so a camera that is slow to open does not block the GUI, and their setups
+        are added by add_opened_cameras, or before returning if wait is True. Returns True if the setups changed."""
+        events = self.camera_discovery.get_events()
+        connected_cameras = set(self.setups.keys()) | self.opening_cameras
+        for event, unique_id in events:
+            if event == "added":
+                connected_cameras.add(unique_id)
+            else:
+                connected_cameras.discard(unique_id)
+                self.unopened_cameras.discard(unique_id)
+                self.opening_cameras.discard(unique_id)  # Closed when opened, see add_opened_cameras.
+        if retry_unopened:
+            connected_cameras |= self.unopened_cameras
+        # Remove any setups that are no longer connected
+        for unique_id in set(self.setups.keys()) - connected_cameras:
+            # Sequence for removed a setup from the table (and deleting it)
+            self.setups.pop(unique_id)
+            self.camera_table.remove(unique_id)
+        # Add setups for new cameras, opening the cameras concurrently.
+        new_settings = []
+        for unique_id in sorted(connected_cameras - set(self.setups.keys()) - self.opening_cameras):
+            # Check if this unique_id has been seen before by looking in the saved setups database
+            camera_settings_config: CameraSettingsConfig = self.get_saved_setup(unique_id=unique_id)
+            if camera_settings_config is None:  # unique_id has not been seen before, create a new setup
+                camera_settings_config = CameraSettingsConfig(**{**default_camera_config, "unique_id": unique_id})
+            new_settings.append(camera_settings_config)
+        if new_settings:
+            self.opening_cameras.update(settings.unique_id for settings in new_settings)
+            open_thread = threading.Thread(target=self.open_cameras, args=(new_settings,), daemon=True)
+            open_thread.start()
+            if wait:
+                open_thread.join()
+                self.add_opened_cameras()
+        self.n_setups = len(self.setups.keys())
+        return bool(events)
+
+    def open_cameras(self, settings_list):
+        """Open cameras concurrently, called on a worker thread. Results are passed to the GUI thread through the
+        opened_cameras queue."""
+        results = init_camera_apis(settings_list, timeout=self.GUI.acquisition_config["camera_init_timeout"])
+        self.opened_cameras.put((settings_list, results))
+
+    def add_opened_cameras(self):
+        """Add setups for the cameras opened on worker threads since the last call. Returns True if setups were
+        added."""
+        setups_added = False
+        while not self.opened_cameras.empty():
+            settings_list, results = self.opened_cameras.get()
+            for settings in settings_list:
+                result = results[settings.unique_id]
+                if settings.unique_id not in self.opening_cameras:  # Disconnected while being opened.
+                    if result["camera_api"] is not None:
+                        result["camera_api"].close_api()
+                    continue
+                self.opening_cameras.discard(settings.unique_id)
+                if result["camera_api"] is None:
+                    print(f"Unable to open camera {settings.unique_id}: {result['error']}")
+                    self.unopened_cameras.add(settings.unique_id)
+                    continue
+                self.unopened_cameras.discard(settings.unique_id)
+                # Instantiate the setup and add it to the setups dict
+                self.setups[settings.unique_id] = Camera_table_item(
+                    self.camera_table, camera_api=result["camera_api"], **asdict(settings)
+                )
+                self.update_saved_setups(self.setups[settings.unique_id])
+                setups_added = True
         self.n_setups = len(self.setups.keys())
+        return setups_added
 
     def get_camera_labels(self) -> list[str]:
         """Get the labels of the available cameras. The label is the camera's user set name if available, else unique ID."""
@@ -242,13 +301,13 @@ class CameraOverviewTable(QTableWidget):
 class Camera_table_item:
     """Class representing single camera in the Camera Tab table."""
 
-    def __init__(self, setups_table, **kwargs):
+    def __init__(self, setups_table, camera_api=None, **kwargs):
         self.settings = CameraSettingsConfig(**kwargs)
 
         self.setups_table = setups_table
         self.setups_tab = setups_table.setups_tab
         self.setups_tab.preview_showing = False
-        self.camera_api = init_camera_api_from_module(settings=self.settings)
+        self.camera_api = camera_api if camera_api is not None else init_camera_api_from_module(settings=self.settings)
 
         # Name edit
         self.name_edit = QLineEdit()
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+import numpy as np
+
+# Synchronisation of the cameras recorded together in an experiment. Each camera timestamps frames with its own clock,
+# so when recording starts the sync service records a host clock anchor (time.perf_counter_ns, the clock the camera
+# readers time batches with) shared by all cameras. For each batch of frames recorded, the camera timestamp of the
+# last frame and the host time the batch was read are added to a linear model of the camera clock against the host
+# clock, giving each camera's clock offset and drift while recording. When recording stops the frame timestamps of
+# every camera are mapped to host time and an aligned frame table is written, with the frame of each camera nearest
+# in time to each frame of the reference (first) camera. With external triggering, the frames captured by each
+# camera (recorded plus dropped) are compared to check all cameras received the same number of triggers.
+# start_recordings and stop_recordings start and stop several cameras' recordings together, and store the skew
+# between the cameras' start and stop times in each camera's metadata.
+
+
+class CameraClock:
+    """Linear model of a camera's clock against the host clock, fitted by least squares to the (camera timestamp,
+    host read time) of each batch of frames, with times measured from the first batch."""
+
+    def __init__(self):
+        self.device_anchor = None  # Camera timestamp (ns) of the last frame of the first batch.
+        self.host_anchor = None  # Host time (ns) the first batch was read.
+        self.n_batches = 0
+        self.sums = np.zeros(4)  # Sums of x, y, x*x and x*y, the camera and host times (s) since the anchors.
+
+    def add_batch(self, new_images):
+        """Add the timestamp of the last frame of a batch and the time the batch was read to the model."""
+        device_time = int(new_images["timestamps"][-1])
+        host_time = int(new_images["read_time"] * 1e9)
+        if self.device_anchor is None:
+            self.device_anchor, self.host_anchor = device_time, host_time
+        x = (device_time - self.device_anchor) / 1e9
+        y = (host_time - self.host_anchor) / 1e9
+        self.sums += (x, y, x * x, x * y)
+        self.n_batches += 1
+
+    def get_fit(self):
+        """Return the slope and intercept (s) of host time against camera time since the anchors."""
+        if self.n_batches == 0:
+            return 1.0, 0.0
+        sum_x, sum_y, sum_xx, sum_xy = self.sums
+        denominator = self.n_batches * sum_xx - sum_x * sum_x
+        if denominator <= 0:  # Not enough batches to estimate drift.
+            return 1.0, (sum_y - sum_x) / self.n_batches
+        slope = (self.n_batches * sum_xy - sum_x * sum_y) / denominator
+        return slope, (sum_y - slope * sum_x) / self.n_batches
+
+    def get_estimates(self, host_anchor=0):
+        """Return the host time (ns, from host_anchor) of the camera's anchor frame and the clock drift (ppm)
+        relative to the host clock."""
+        slope, intercept = self.get_fit()
+        return {
+            "device_anchor": self.device_anchor,
+            "anchor_host_time": (
+                None if self.host_anchor is None else self.host_anchor - host_anchor + round(intercept * 1e9)
+            ),
+            "drift_ppm": round((1 / slope - 1) * 1e6, 3),
+        }
+
+    def to_host(self, timestamps, host_anchor=0):
+        """Return the host times (ns, from host_anchor) of camera timestamps."""
+        slope, intercept = self.get_fit()
+        device_times = (np.asarray(timestamps, dtype=np.int64) - self.device_anchor) / 1e9
+        return self.host_anchor - host_anchor + np.rint((device_times * slope + intercept) * 1e9).astype(np.int64)
+
+
+def nearest_frames(frame_times, times, tolerance):
+    """Return the index of the frame nearest each of times, or -1 if no frame is within tolerance."""
+    if len(frame_times) == 0:
+        return np.full(len(times), -1, dtype=np.int64)
+    after = np.minimum(np.searchsorted(frame_times, times), len(frame_times) - 1)
+    before = np.maximum(after - 1, 0)
+    nearest = np.where(np.abs(times - frame_times[before]) <= np.abs(frame_times[after] - times), before, after)
+    return np.where(np.abs(frame_times[nearest] - times) <= tolerance, nearest, -1)
+
+
+# -------------------------------------------------------------------------------------
+# Sync service
+# -------------------------------------------------------------------------------------
+
+
+class SyncService:
+    """Estimates the clock offset and drift of each camera recorded in an experiment, and writes the sync metadata
+    and aligned frame table when recording stops."""
+
+    def __init__(self):
+        self.data_recorders = {}  # Data recorder of each camera by label, while recording.
+
+    def start(self, data_dir, data_recorders):
+        """Record the host clock anchor and start fitting the clock of each camera. Called once recording has
+        started, data_recorders is a dict of the data recorder of each camera by label."""
+        self.host_anchor = time.perf_counter_ns()
+        self.start_time = datetime.now()
+        self.filepath_stem = os.path.join(data_dir, f"sync_{self.start_time.strftime('%Y-%m-%d-%H%M%S')}")
+        self.data_recorders = dict(data_recorders)
+        self.clocks = {}
+        self.cameras = {}  # Sync data of each camera that has stopped recording, see stop_camera.
+        self.host_times = {}  # Host times (ns) of the frames of each camera that has stopped recording.
+        for label, data_recorder in data_recorders.items():
+            self.clocks[label] = CameraClock()
+            data_recorder.camera_clock = self.clocks[label]  # Batches are added as they are put in the writer queue.
+
+    def get_estimates(self):
+        """Return the current clock estimates of each camera, see CameraClock.get_estimates."""
+        return {label: clock.get_estimates(self.host_anchor) for label, clock in self.clocks.items()}
+
+    def stop_camera(self, label):
+        """Collect the sync data of a camera once its data recorder has stopped and detach its clock, so the camera
+        can record again before the other cameras stop."""
+        data_recorder = self.data_recorders.pop(label)
+        data_recorder.camera_clock = None
+        clock = self.clocks[label]
+        if clock.device_anchor is None:
+            print(f"No frames recorded from camera {label}, not included in sync data.")
+            return
+        self.host_times[label] = clock.to_host(data_recorder.get_timestamps(), self.host_anchor)
+        self.cameras[label] = {
+            "metadata_file": os.path.basename(data_recorder.metadata_filepath),
+            **clock.get_estimates(self.host_anchor),
+            "batches": clock.n_batches,
+            "fps": data_recorder.settings.fps,
+            "external_trigger": data_recorder.settings.external_trigger,
+            "recorded_frames": data_recorder.recorded_frames,
+            "captured_frames": data_recorder.recorded_frames + data_recorder.dropped_frames,
+        }
+
+    def stop(self):
+        """Write the sync metadata and aligned frame table. Called once all the data recorders have stopped."""
+        for label in list(self.data_recorders):
+            self.stop_camera(label)
+        # Cameras in the order recording started, which may differ from the order they stopped.
+        cameras = {label: self.cameras[label] for label in self.clocks if label in self.cameras}
+        host_times = {label: self.host_times[label] for label in cameras}
+        self.clocks, self.cameras, self.host_times = {}, {}, {}
+        if not cameras:
+            return
+        trigger_counts = {
+            label: camera["captured_frames"] for label, camera in cameras.items() if camera["external_trigger"]
+        }
+        trigger_counts_match = len(set(trigger_counts.values())) == 1 if trigger_counts else None
+        if trigger_counts_match is False:
+            print(f"Cameras captured different numbers of triggers: {trigger_counts}")
+        reference = next(iter(host_times))
+        self.write_aligned_frames(self.filepath_stem + "_aligned_frames.csv", host_times, cameras)
+        metadata = {
+            "start_time": self.start_time.isoformat(timespec="milliseconds"),
+            "host_clock": "time.perf_counter_ns",
+            "host_anchor": self.host_anchor,  # Host times in this file and the frame table are from this time (ns).
+            "reference_camera": reference,
+            "aligned_frames_file": os.path.basename(self.filepath_stem) + "_aligned_frames.csv",
+            "trigger_counts_match": trigger_counts_match,
+            "cameras": cameras,
+        }
+        with open(self.filepath_stem + "_metadata.json", "w") as f:
+            json.dump(metadata, f, indent=4)
+
+    def write_aligned_frames(self, filepath, host_times, cameras):
+        """Write a table with a row for each frame of the reference camera, giving its host time and the frame of
+        each camera within half a frame interval of it, -1 if there is none."""
+        labels = list(host_times)
+        reference_times = host_times[labels[0]]
+        columns = [reference_times]
+        for label in labels:
+            tolerance = 0.5e9 / cameras[label]["fps"]
+            columns.append(nearest_frames(host_times[label], reference_times, tolerance))
+        np.savetxt(
+            filepath,
+            np.column_stack(columns),
+            fmt="%d",
+            delimiter=",",
+            header=",".join(["Host_time"] + labels),
+            comments="",
+        )
+
+
+# -------------------------------------------------------------------------------------
+# Coordinated start and stop
+# -------------------------------------------------------------------------------------
+
+
+def run_in_parallel(function, items):
+    """Call function on each item from its own thread, returning the items for which it raised no exception."""
+    succeeded = [False] * len(items)
+
+    def run(i):
+        try:
+            function(items[i])
+            succeeded[i] = True
+        except Exception as e:
+            print(f"Error: {e}")
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [item for item, item_succeeded in zip(items, succeeded) if item_succeeded]
+
+
+def start_recordings(recordings):
+    """Start recording from several cameras in two phases so they start together. recordings is a list of
+    (camera_reader, data_recorder, subject_id, save_dir, settings). The data recorders are first prepared in
+    parallel, opening files and starting encoder processes, then every camera reader starts queueing images for its
+    recorder in one step. Returns the recordings that were started."""
+    recordings = run_in_parallel(lambda recording: recording[1].start_recording(*recording[2:]), recordings)
+    for camera_reader, data_recorder, *_ in recordings:
+        camera_reader.start_queueing()
+        data_recorder.arm_time = time.perf_counter()
+    return recordings
+
+
+def stop_recordings(recordings):
+    """Stop recording from several cameras in two phases, mirroring start_recordings. recordings is a list of
+    (camera_reader, data_recorder). Every camera reader stops queueing images in one step, then the images already
+    queued are passed to the recorders, the start and stop skew between cameras is added to each recorder's
+    metadata, and the recorders write their remaining images and close their files in parallel."""
+    for camera_reader, data_recorder in recordings:
+        camera_reader.stop_queueing()
+        data_recorder.disarm_time = time.perf_counter()
+    for camera_reader, data_recorder in recordings:
+        for new_images in camera_reader.get_batches():
+            data_recorder.put_images(new_images)
+    data_recorders = [data_recorder for _, data_recorder in recordings]
+    add_skew(data_recorders, "start_skew", ["arm_time", "first_frame_time"])
+    add_skew(data_recorders, "stop_skew", ["disarm_time", "last_frame_time"])
+    run_in_parallel(lambda data_recorder: data_recorder.stop_recording(), data_recorders)
+
+
+def add_skew(data_recorders, key, time_attributes):
+    """Set metadata[key][time_attribute] of each data recorder to the time (ms) of its time_attribute, a host time
+    (s), after the earliest of the data recorders."""
+    for time_attribute in time_attributes:
+        times = [getattr(data_recorder, time_attribute) for data_recorder in data_recorders]
+        if None in times:  # No frames recorded by a camera.
+            continue
+        for data_recorder, host_time in zip(data_recorders, times):
+            data_recorder.metadata[key][time_attribute] = round((host_time - min(times)) * 1000, 3)
@@ -1,8 +1,7 @@
 import os
-import cv2
+import time
 import numpy as np
 from datetime import datetime, timedelta
-from dataclasses import dataclass
 from collections import deque
 
 import pyqtgraph as pg
@@ -11,15 +10,13 @@ from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import QComboBox, QGroupBox, QHBoxLayout, QLabel, QPushButton, QTextEdit, QVBoxLayout, QMessageBox
 
 from .data_recorder import Data_recorder
+from .camera_sync import start_recordings, stop_recordings
+from .gpio_trigger import GPIOTrigger
+from .preview import PreviewWorker, get_preview_factor
+from .video_display import get_display_backend, make_image_item
+from . import startup_timing
 from camera_api import init_camera_api_from_module
-
-
-@dataclass
-class CameraWidgetConfig:
-    """Represents the configuration of a Camera_widget."""
-
-    label: str
-    subject_id: str
+from config.config_classes import CameraWidgetConfig
 
 
 class ScrollableGraphicsView(pg.GraphicsView):
@@ -27,8 +24,8 @@ class ScrollableGraphicsView(pg.GraphicsView):
 
     wheelScrolled = pyqtSignal(str)
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, useOpenGL=None):
+        super().__init__(useOpenGL=useOpenGL)
 
     def wheelEvent(self, event):
         """Emit Signals from wheel events"""
@@ -43,7 +40,7 @@ class ScrollableGraphicsView(pg.GraphicsView):
 class CameraWidget(QGroupBox):
     """Widget for displaying camera video and camera controls."""
 
-    def __init__(self, parent, label, subject_id="", preview_mode=False):
+    def __init__(self, parent, label, subject_id="", preview_mode=False, camera_api=None):
         super(CameraWidget, self).__init__(parent)
         self.video_capture_tab = parent
         self.GUI = self.video_capture_tab.GUI
@@ -52,23 +49,33 @@ class CameraWidget(QGroupBox):
         self.subject_id = subject_id
         self.label = label
         self.settings = self.GUI.camera_setup_tab.get_camera_settings_from_label(label)
-        self.camera_api = init_camera_api_from_module(settings=self.settings)
+        # Camera API may be initialised by the caller, e.g. concurrently with other cameras.
+        self.camera_api = camera_api if camera_api is not None else init_camera_api_from_module(settings=self.settings)
         self.camera_height = self.camera_api.get_height()
         self.camera_width = self.camera_api.get_width()
-        self.latest_image = None
+        self.latest_GPIO = None
+        self._newly_dropped_frames = 0
+        self.preview_worker = None
+        self.overlay_texts = {}  # {text_item: (text, color)} last set by set_overlay_text.
+        self.first_frame_displayed = False
+        self.display_interval = 1 / self.GUI.gui_config["display_update_rate"]
+        self.next_display_time = 0  # time.perf_counter() time at which the video display is next updated.
+        self.camera_reader = None
+        self.gpio_trigger_armed = False  # True while recordings are started and stopped by GPIO inputs.
         self.frame_timestamps = deque([0], maxlen=10)
         self.framenumbers = deque([0], maxlen=10)
         self.controls_visible = True
 
         # Video display ---------------------------------------------------------------
 
-        self.graphics_view = ScrollableGraphicsView()
+        self.display_backend = get_display_backend(self.GUI.gui_config["display_backend"])
+        self.graphics_view = ScrollableGraphicsView(useOpenGL=self.display_backend == "opengl")
         self.graphics_view.wheelScrolled.connect(self.handle_wheel_event)
         self.video_view_box = pg.ViewBox(defaultPadding=0, invertY=True)
         self.video_view_box.setMouseEnabled(x=False, y=False)
         self.graphics_view.setCentralItem(self.video_view_box)
         pg.setConfigOption("imageAxisOrder", "row-major")
-        self.video_image_item = pg.ImageItem()
+        self.video_image_item = make_image_item(self.display_backend)
         self.video_view_box.addItem(self.video_image_item)
         self.video_view_box.setAspectLocked()
 
@@ -176,7 +183,9 @@ class CameraWidget(QGroupBox):
             self.update_timer.timeout.connect(self.update)
             self.update_timer.start(int(1000 / self.GUI.gui_config["camera_update_rate"]))
         else:
-            self.data_recorder = Data_recorder(self)
+            self.data_recorder = Data_recorder(
+                self.camera_api, self.GUI.ffmpeg_path, self.GUI.ffmpeg_config, self.GUI.recording_config
+            )
 
         self.begin_capturing()  # After init, start capturing from the widget
 
@@ -186,120 +195,246 @@ class CameraWidget(QGroupBox):
         """Start streaming video from camera."""
         self.recording = False
         self._last_timestamp = None
-        # Begin capturing using the camera API
+        # Begin capturing using the camera API, with image buffers for the frames the queues can hold.
+        self.set_frame_pool_size()
         self.camera_api.begin_capturing(self.settings)
+        # Empty the camera buffer from a dedicated reader thread.
+        self.camera_reader = self.GUI.acquisition_engine.start_reader(
+            self.settings.unique_id, self.camera_api, fps=None if self.preview_mode else self.settings.fps
+        )
+        self.start_preview_worker()
+
+    def set_frame_pool_size(self):
+        """Size the camera's frame pool to hold the frames the reader queue can hold, and the writer queue if the
+        widget records, the preview widget of the camera setup tab does not."""
+        n_queued_frames = self.GUI.acquisition_config["reader_queue_size"]
+        if not self.preview_mode:
+            n_queued_frames += self.GUI.recording_config["writer_queue_size"]
+        self.camera_api.set_frame_pool_size(n_queued_frames)
 
     def stop_capturing(self):
         """Stop streaming video from camera."""
-        if self.recording:
+        if self.recording or self.gpio_trigger_armed:
             self.stop_recording()
+        self.stop_preview_worker()
+        # Reader thread must stop before the camera API stops capturing.
+        self.GUI.acquisition_engine.stop_reader(self.settings.unique_id)
         self.camera_api.stop_capturing()
 
+    def start_preview_worker(self):
+        """Start the thread that prepares display images from the camera reader."""
+        self.stop_preview_worker()
+        if self.preview_mode:  # Camera settings are shown in preview mode.
+            property_getters = {"exposure_time": self.camera_api.get_exposure_time, "gain": self.camera_api.get_gain}
+        else:
+            property_getters = {}
+        self.preview_worker = PreviewWorker(
+            self.camera_reader, property_getters, self.GUI.gui_config["camera_property_update_interval"]
+        )
+        self.preview_worker.start()
+
+    def stop_preview_worker(self):
+        if self.preview_worker is not None:
+            self.preview_worker.stop()
+            self.preview_worker = None
+
     def fetch_image_data(self):
-        """Get images and associated data from camera and save to disk if recording."""
-        new_images = self.camera_api.get_available_images()
-        if new_images == None:
+        """Get the latest image data from the camera reader and pass queued images to the data recorder."""
+        latest = self.camera_reader.get_latest()
+        if latest is None:
             return
-        # Store most recent image and GPIO state for the next display update.
-        self.latest_image = new_images["images"][-1]
-        self.latest_GPIO = new_images["gpio_data"][-1]
-        # Check for dropped frames based on expected interval between exposure timestamps
-        self._newly_dropped_frames = new_images["dropped_frames"]
-        self.frame_timestamps.extend(new_images["timestamps"])  # For displaying the calculated framerate
+        # Store most recent GPIO state for the next display update, images are prepared by the preview worker.
+        self.latest_GPIO = latest["gpio_data"]
+        # Dropped frames found by the camera API since the last display update.
+        self._newly_dropped_frames += latest["dropped_frames"]
+        self.frame_timestamps.extend(latest["timestamps"])  # For displaying the calculated framerate
 
         # Record data to disk.
-        if self.recording:
-            self.video_capture_tab.futures.append(
-                self.video_capture_tab.threadpool.submit(self.data_recorder.record_new_images, new_images)
-            )
-
-    def update(self, update_video_display=True):
-        """Called regularly by timer to fetch new images and optionally update video display."""
+        if self.recording or self.gpio_trigger_armed:
+            self.write_queued_images()
+
+    def write_queued_images(self):
+        """Pass queued batches to the data recorder, starting and stopping GPIO triggered recordings at the
+        batches marking the frames the trigger started and stopped at."""
+        for new_images in self.camera_reader.get_batches():
+            trigger = new_images.get("trigger")
+            if trigger == "start":
+                try:
+                    self.data_recorder.start_recording(*self.get_recording()[2:])
+                    self.data_recorder.metadata["gpio_trigger"] = self.GUI.acquisition_config["gpio_trigger"]
+                    self.recording_started()
+                except Exception as e:
+                    print(f"Error starting GPIO triggered recording: {e}")
+            elif trigger == "stop":
+                if self.recording:
+                    self.data_recorder.stop_recording()
+                    self.recording_stopped()
+            elif self.recording:
+                self.data_recorder.put_images(new_images)
+            else:
+                self.camera_api.release_images(new_images)
+
+    def update(self):
+        """Called regularly by timer to fetch new images, updates the video display at the display update rate."""
         self.fetch_image_data()
-        if update_video_display:
+        now = time.perf_counter()
+        if now >= self.next_display_time:
+            self.next_display_time = max(self.next_display_time + self.display_interval, now)
             self.update_video_display()
-        # Remove completed futures from the list
-        if self.video_capture_tab.futures:
-            self.video_capture_tab.futures = [f for f in self.video_capture_tab.futures if not f.done()]
 
     # Recording controls --------------------------------------------------------------
 
     def start_recording(self):
-        """Start recording vidoe data to disk"""
+        """Start recording vidoe data to disk, or arm the GPIO trigger if one is set."""
+        if self.GUI.acquisition_config["gpio_trigger"]:
+            self.arm_gpio_trigger()
+            return
+        recording = self.get_recording()
+        if recording and start_recordings([recording]):
+            self.recording_started()
+
+    def get_recording(self):
+        """Return the arguments for camera_sync.start_recordings, or None if the subject ID is invalid."""
         subject_id = self.subject_id_text.toPlainText()
         # Check subject ID is valid.
         if any(char in set('<>:"/\\|?*') for char in subject_id):
             QMessageBox.information(self, "Invalid subject ID", f"Subject ID contains invalid characters: {subject_id}")
-            return
-        # Start data recording.
+            return None
         save_dir = self.GUI.video_capture_tab.data_dir
-        self.data_recorder.start_recording(subject_id, save_dir, self.settings)
-        # Empty camera buffer before recording is started
-        self.camera_api.get_available_images()
+        return (self.camera_reader, self.data_recorder, subject_id, save_dir, self.settings)
+
+    def recording_started(self):
+        """Update the GUI once data recording has started."""
         self.recording = True
-        # Update GUI
-        self.stop_recording_button.setEnabled(True)
-        self.camera_dropdown.setEnabled(False)
-        self.start_recording_button.setEnabled(False)
-        self.subject_id_text.setEnabled(False)
-        self.GUI.tab_widget.tabBar().setEnabled(False)
-        self.GUI.video_capture_tab.update_button_states()
+        self.update_recording_controls()
 
     def stop_recording(self):
-        """Stop recording video data to disk."""
-        self.data_recorder.stop_recording()
+        """Stop recording video data to disk, or disarm the GPIO trigger if it is armed."""
+        if self.gpio_trigger_armed:
+            self.disarm_gpio_trigger()
+            return
+        stop_recordings([(self.camera_reader, self.data_recorder)])
+        self.recording_stopped()
+        if not self.preview_mode:
+            self.GUI.video_capture_tab.camera_recording_stopped(self)
+
+    def recording_stopped(self):
+        """Update the GUI once data recording has stopped."""
         self.recording = False
-        # Update GUI
-        self.recording_status_item.setText("NOT RECORDING", color="r")
-        self.stop_recording_button.setEnabled(False)
-        self.start_recording_button.setEnabled(True)
-        self.subject_id_text.setEnabled(True)
-        self.camera_dropdown.setEnabled(True)
+        self.set_overlay_text(self.recording_status_item, "ARMED" if self.gpio_trigger_armed else "NOT RECORDING", "r")
+        self.update_recording_controls()
+
+    def update_recording_controls(self):
+        """Disable the controls that can not be changed while recording or while the GPIO trigger is armed."""
+        active = self.recording or self.gpio_trigger_armed
+        self.stop_recording_button.setEnabled(active)
+        self.start_recording_button.setEnabled(not active)
+        self.subject_id_text.setEnabled(not active)
+        self.camera_dropdown.setEnabled(not active)
         self.GUI.video_capture_tab.update_button_states()
-        self.GUI.tab_widget.tabBar().setEnabled(True)
+        self.GUI.tab_widget.tabBar().setEnabled(not active)
+
+    def arm_gpio_trigger(self):
+        """Start and stop recording when the camera's GPIO inputs meet acquisition_config["gpio_trigger"], until
+        the trigger is disarmed. Returns True if the trigger was armed."""
+        if self.get_recording() is None:
+            return False
+        try:
+            gpio_trigger = GPIOTrigger(self.GUI.acquisition_config["gpio_trigger"])
+        except (ValueError, KeyError) as e:
+            QMessageBox.information(self, "Invalid GPIO trigger", f"Invalid GPIO trigger rule: {e}")
+            return False
+        self.camera_reader.arm_gpio_trigger(gpio_trigger)
+        self.gpio_trigger_armed = True
+        self.recording_stopped()  # Show the trigger is armed.
+        return True
+
+    def disarm_gpio_trigger(self):
+        """Stop starting recordings from GPIO inputs, stopping the current GPIO triggered recording."""
+        self.camera_reader.disarm_gpio_trigger()
+        self.write_queued_images()
+        if self.recording:
+            self.data_recorder.stop_recording()
+        self.gpio_trigger_armed = False
+        self.recording_stopped()
 
     # Video display -------------------------------------------------------------------
 
     def update_video_display(self, gpio_smoothing_decay=0.5):
-        """Display most recent image and update information overlays."""
-        if self.latest_image is None:
+        """Display the most recent prepared image and update information overlays."""
+        if self.latest_GPIO is None:
             return
-        image = np.frombuffer(self.latest_image, dtype=np.uint8).reshape(self.camera_height, self.camera_width)
-        if self.settings.pixel_format != "Mono":
-            image = cv2.cvtColor(image, self.camera_api.pixel_format_map[self.settings.pixel_format]["cv2"])
-        self.video_image_item.setImage(image)
+        # Request a display image of the latest frame, downsampled to its on-screen size, from the preview worker.
+        screen_pixel_size = min(self.video_view_box.viewPixelSize()) / self.graphics_view.devicePixelRatioF()
+        if self.settings.pixel_format == "Mono":
+            cv2_conversion = None
+        else:
+            cv2_conversion = self.camera_api.pixel_format_map[self.settings.pixel_format]["cv2"]
+        self.preview_worker.request(
+            self.camera_height,
+            self.camera_width,
+            cv2_conversion,
+            factor=get_preview_factor(screen_pixel_size) if self.first_frame_displayed else 1,
+            method=self.GUI.gui_config["display_downsampling"],
+        )
+        # Display the image prepared since the last update, the image item is scaled to camera pixel coordinates.
+        image = self.preview_worker.get_prepared()
+        if image is not None:
+            self.video_image_item.setImage(image)
+            self.video_image_item.setRect(0, 0, self.camera_width, self.camera_height)
+            if not self.first_frame_displayed:
+                self.first_frame_displayed = True
+                startup_timing.mark(f"first frame {self.label}")
         # Compute average framerate and display over image.
         avg_time_diff = (self.frame_timestamps[-1] - self.frame_timestamps[0]) / (self.frame_timestamps.maxlen - 1)
         calculated_framerate = 1e9 / avg_time_diff
         color = "r" if (abs(calculated_framerate - int(self.settings.fps)) > 1) else "g"
-        self.frame_rate_text.setText(f"FPS: {calculated_framerate:.2f}", color=color)
+        self.set_overlay_text(self.frame_rate_text, f"FPS: {calculated_framerate:.2f}", color)
         # Update GPIO status indicators.
         self.gpio_state_smoothed = gpio_smoothing_decay * self.gpio_state_smoothed
         self.gpio_state_smoothed[np.array(self.latest_GPIO) > 0] = 1
         for i, gpio_indicator in enumerate(self.gpio_status_indicators):
-            gpio_indicator.setText("\u2b24", color=[0, 0, self.gpio_state_smoothed[i] * 255])
+            self.set_overlay_text(gpio_indicator, "\u2b24", (0, 0, int(self.gpio_state_smoothed[i] * 255)))
         # Display the current recording duration over image.
         if self.recording:
             elapsed_time = datetime.now() - self.data_recorder.record_start_time
-            self.recording_status_item.setText(f"RECORDING  {str(elapsed_time).split('.')[0]}", color="g")
+            if self.data_recorder.encoder_lagging:
+                encode_lag = self.data_recorder.get_encode_lag()["seconds"]
+                self.set_overlay_text(
+                    self.recording_status_item,
+                    f"RECORDING  {str(elapsed_time).split('.')[0]}  ENCODER LAG {encode_lag:.1f}s",
+                    "y",
+                )
+            else:
+                self.set_overlay_text(self.recording_status_item, f"RECORDING  {str(elapsed_time).split('.')[0]}", "g")
+        elif self.camera_reader.pre_trigger_settings:  # Show the frames held for the start of the next recording.
+            pre_trigger = self.camera_reader.get_pre_trigger_stats()
+            if pre_trigger:
+                self.set_overlay_text(
+                    self.recording_status_item,
+                    f"{'ARMED' if self.gpio_trigger_armed else 'NOT RECORDING'}  PRE-TRIGGER {pre_trigger['pre_trigger_duration']:.1f}s "
+                    f"{pre_trigger['pre_trigger_bytes'] / 2**20:.0f}MB",
+                    "r",
+                )
         # Update dropped frames indicator.
-        if self._newly_dropped_frames:
-            self.dropped_frames_text.setText("DROPPED FRAMES", color="r")
-        else:
-            self.dropped_frames_text.setText("")
-        # Show additional camera settings if in preview mode.
+        self.set_overlay_text(self.dropped_frames_text, "DROPPED FRAMES" if self._newly_dropped_frames else "", "r")
+        self._newly_dropped_frames = 0
+        # Show additional camera settings if in preview mode, read by the preview worker at a low rate.
         if self.preview_mode:
-            self.exposure_time_text.setText(
-                (
-                    f"Exposure Time (us) : {self.camera_api.get_exposure_time():.2f}"
-                    if self.camera_api.get_exposure_time()
-                    else "Exposure Time (us) : N/A"
-                ),
-                color="magenta",
-            )
-            self.gain_text.setText(
-                f"Gain (dB) :{self.camera_api.get_gain():.2f}" if self.camera_api.get_gain() else "Gain (dB) : N/A"
+            exposure_time = self.preview_worker.camera_properties.get("exposure_time")
+            gain = self.preview_worker.camera_properties.get("gain")
+            self.set_overlay_text(
+                self.exposure_time_text,
+                f"Exposure Time (us) : {exposure_time:.2f}" if exposure_time else "Exposure Time (us) : N/A",
+                "magenta",
             )
+            self.set_overlay_text(self.gain_text, f"Gain (dB) :{gain:.2f}" if gain else "Gain (dB) : N/A", "magenta")
+
+    def set_overlay_text(self, text_item, text, color):
+        """Set the text of an overlay, only if it has changed as text updates are costly."""
+        if self.overlay_texts.get(text_item) != (text, color):
+            self.overlay_texts[text_item] = (text, color)
+            text_item.setText(text, color=color)
 
     # GUI element updates -------------------------------------------------------------
 
@@ -337,10 +472,7 @@ class CameraWidget(QGroupBox):
 
     def update_viewfinder_text(self):
         """Update the viewfinder display text based on if settings have changed"""
-        self.recording_status_item.setText(
-            "NOT RECORDING",
-            color="r",
-        )
+        self.set_overlay_text(self.recording_status_item, "NOT RECORDING", "r")
 
     def subject_ID_edited(self):
         """Store new subject ID and update status of recording button."""
@@ -377,16 +509,27 @@ class CameraWidget(QGroupBox):
     def change_camera(self) -> None:
         # shut down old camera
         if self.camera_api is not None:
+            self.stop_preview_worker()
+            self.GUI.acquisition_engine.stop_reader(self.settings.unique_id)
             self.camera_api.close_api()
             del self.camera_api
-        self.latest_image = None
+        self.latest_GPIO = None
         # Initialise the new camera
         self.label = str(self.camera_dropdown.currentText())
         self.settings = self.GUI.camera_setup_tab.get_camera_settings_from_label(self.label)
         self.camera_api = init_camera_api_from_module(self.settings)
+        self.set_frame_pool_size()
         self.camera_api.begin_capturing(self.settings)
+        self.camera_reader = self.GUI.acquisition_engine.start_reader(
+            self.settings.unique_id, self.camera_api, fps=None if self.preview_mode else self.settings.fps
+        )
+        self.start_preview_worker()
         self.camera_height = self.camera_api.get_height()
         self.camera_width = self.camera_api.get_width()
+        if not self.preview_mode:
+            self.data_recorder = Data_recorder(
+                self.camera_api, self.GUI.ffmpeg_path, self.GUI.ffmpeg_config, self.GUI.recording_config
+            )
         # Rename pyqtgraph element
         self.camera_name_item.setText(
             f"{self.settings.name if self.settings.name is not None else self.settings.unique_id}", color="white"
@@ -402,11 +545,11 @@ class CameraWidget(QGroupBox):
             )
             self.graphics_view.addItem(gpio_indicator)
         # Update Frame triggered text
-        self.recording_status_item.setText("NOT RECORDING", color="r")
+        self.set_overlay_text(self.recording_status_item, "NOT RECORDING", "r")
         # Update other camera widget dropdowns
-        for c_w in self.video_capture_tab.camera_widgets: 
+        for c_w in self.video_capture_tab.camera_widgets:
             c_w.update_camera_dropdown()
-            
+
     def closeEvent(self, event):
         """Handle the close event to stop the timer and release resources"""
         self.stop_capturing()
@@ -2,25 +2,129 @@ import os
 import csv
 import json
 import math
+import shlex
+import time
+import queue
+import threading
 import subprocess
-import numpy as np
+from collections import deque
 from datetime import datetime, timedelta
+import numpy as np
+
+from .gpio_log import GPIOLogWriter
+from .raw_video import RawVideoWriter, read_raw_header, read_raw_video
+from .frame_index import FrameIndexWriter, read_frame_index, add_keyframe_offsets, get_ffprobe_path
+
+# Encoders to use with and without a GPU available for video encode.
+
+gpu_encoder_config = {
+    "encoder_map": {"h264": "h264_nvenc", "h265": "hevc_nvenc"},
+    "encoding_speeds": ["slow", "medium", "fast"],  # Presets in order of increasing speed.
+    "quality_option": "-cq",
+}
+cpu_encoder_config = {
+    "encoder_map": {"h264": "libx264", "h265": "libx265"},
+    "encoding_speeds": ["slow", "medium", "fast", "veryfast", "ultrafast"],
+    "quality_option": "-crf",
+}
+
+_gpu_available = None
+_gpu_check_lock = threading.Lock()
+
+
+def gpu_available():
+    """Check GPU availibility for video encode. The check runs nvidia-smi so is only done once, on first use."""
+    global _gpu_available
+    with _gpu_check_lock:
+        if _gpu_available is None:
+            try:
+                subprocess.check_output("nvidia-smi")
+                _gpu_available = True
+            except Exception:
+                _gpu_available = False
+    return _gpu_available
+
+
+def get_encoder_config():
+    """Get the encoders, presets and quality option to use given GPU availability."""
+    return gpu_encoder_config if gpu_available() else cpu_encoder_config
+
+
+def get_ffmpeg_command(
+    ffmpeg_path,
+    ffmpeg_config,
+    width,
+    height,
+    pixel_format,
+    fps,
+    downsampling_factor,
+    encoding_speed,
+    video_filepath,
+    input_filepath=None,
+    input_offset=0,
+    n_frames=None,
+):
+    """Return the FFMPEG command to encode raw frames from stdin, or from input_filepath starting input_offset bytes
+    into the file, to video_filepath."""
+    encoder_config = get_encoder_config()
+    ffmpeg_command = " ".join(
+        [
+            ffmpeg_path,  # Path to binary
+            "-f rawvideo",  # Input codec (raw video)
+            f"-s {width}x{height}",  # Input frame size
+            f"-pix_fmt {pixel_format}",  # Input Pixel Format: 8-bit grayscale input to ffmpeg process. Input array 1D
+            f"-r {fps}",  # Frame rate
+            f"-skip_initial_bytes {input_offset}" if input_offset else "",  # Start of the frames in the input file.
+            f'-i "{input_filepath}"' if input_filepath else "-i -",  # input comes from a file or a pipe (stdin)
+            f"-c:v {encoder_config['encoder_map'][ffmpeg_config['compression_standard']]}",  # Output codec
+            f"-s {width // downsampling_factor}x{height // downsampling_factor}",  # Output frame size.
+            "-pix_fmt yuv420p",  # Output pixel format
+            f"-preset {encoding_speed}",  # Encoding speed [fast, medium, slow]
+            f"-b:v 0 ",  # Encoder uses variable bit rate https://superuser.com/questions/1236275/how-can-i-use-crf-encoding-with-nvenc-in-ffmpeg
+            f"{encoder_config['quality_option']} {ffmpeg_config['crf']}",  # Controls quality vs filesize
+            (  # Keyframe every keyframe_interval frames, so any frame can be decoded from a known keyframe.
+                f"-g {ffmpeg_config['keyframe_interval']} "
+                f"-force_key_frames expr:gte(n,n_forced*{ffmpeg_config['keyframe_interval']})"
+                if ffmpeg_config["keyframe_interval"]
+                else ""
+            ),
+            f"-frames:v {n_frames}" if n_frames is not None else "",  # Number of frames to encode.
+            (  # Fragments at each keyframe so frames written so far are readable before the file is closed.
+                "-movflags +frag_keyframe+empty_moov+default_base_moof" if ffmpeg_config.get("fragmented_mp4") else ""
+            ),
+            f'"{video_filepath}"',  # Output file path
+        ]
+    )
+    if os.name != "nt":  # Command string is only split into arguments by Popen on Windows.
+        ffmpeg_command = shlex.split(ffmpeg_command)
+    return ffmpeg_command
+
+
+def transcode_raw_video(raw_filepath, ffmpeg_path, ffmpeg_config, video_filepath=None):
+    """Encode a raw video file written in the raw output format to video with the FFMPEG settings in ffmpeg_config.
+    Returns the video file path."""
+    if video_filepath is None:
+        video_filepath = os.path.splitext(raw_filepath)[0] + ".mp4"
+    if os.path.exists(video_filepath):
+        raise FileExistsError(f"{video_filepath} already exists.")
+    header = read_raw_header(raw_filepath)
+    ffmpeg_command = get_ffmpeg_command(
+        ffmpeg_path,
+        ffmpeg_config,
+        header["width"],
+        header["height"],
+        header["pixel_format"],
+        header["fps"],
+        header["downsampling_factor"],
+        ffmpeg_config["encoding_speed"],
+        video_filepath,
+        input_filepath=raw_filepath,
+        input_offset=header["frames_offset"],
+        n_frames=header["frame_count"],
+    )
+    subprocess.run(ffmpeg_command, stdin=subprocess.DEVNULL, check=True)
+    return video_filepath
 
-# Check GPU availibility for video encode and set which encoders to use.
-
-try:
-    subprocess.check_output("nvidia-smi")
-    ffmpeg_encoder_map = {
-        "h264": "h264_nvenc",
-        "h265": "hevc_nvenc",
-    }
-    GPU_AVAILABLE = True
-except Exception:
-    ffmpeg_encoder_map = {
-        "h264": "libx264",
-        "h265": "libx265",
-    }
-    GPU_AVAILABLE = False
 
 # -------------------------------------------------------------------------------------
 # Data recorder
@@ -30,29 +134,65 @@ except Exception:
 class Data_recorder:
     """Class for recording video data, GPIO pinstates and metadata."""
 
-    def __init__(self, camera_widget):
-        self.camera_widget = camera_widget
+    def __init__(self, camera_api, ffmpeg_path, ffmpeg_config, recording_config):
+        self.camera_api = camera_api
+        self.ffmpeg_path = ffmpeg_path
+        self.ffmpeg_config = ffmpeg_config
+        self.recording_config = recording_config
+        self._pending_lock = threading.Lock()
+        self._writer_space = threading.Condition(self._pending_lock)  # Notified when pending images are written.
+        self.camera_clock = None  # Set by the sync service to fit the camera clock, see camera_sync.py.
 
     def start_recording(self, subject_id, save_dir, settings):
         """Open data files and launches FFMPEG process"""
         self.settings = settings
+        self.camera_clock = None  # Attached by the sync service once recording has started.
         self.recorded_frames = 0
         self.dropped_frames = 0
+        self.pre_trigger_frames = 0  # Frames from the pre-trigger buffer, read before recording started.
         self.first_timestamp = None
+        # Images passed to the recorder that have not yet been written.
+        self.pending_batches = deque()  # (read_time, n_frames, n_pool_frames) of each pending batch, oldest first.
+        self.pending_frames = 0
+        self.pending_pool_frames = 0  # Pending frames held in camera frame pool slots, see wait_for_writer_space.
+        self.writer_full = False  # True while the writer queue is full.
+        self.max_encode_lag = 0.0
+        self.encoder_lagging = False
+        self.backpressure_action = None  # Action to apply on the writer thread before the next batch is written.
+        self.raw_spill_file = None
+        self.raw_video = None
+        self.writer_dropped_frames = 0  # Frames discarded because the writer queue was full.
+        # Host times (perf_counter, s) recording was armed and disarmed, and of the first and last frames recorded,
+        # the frame times estimated from the time their batch was read. Armed and disarmed times are set by
+        # camera_sync.start_recordings and stop_recordings.
+        self.arm_time = None
+        self.disarm_time = None
+        self.first_frame_time = None
+        self.last_frame_time = None
         # Create Filepaths_config.
         self.subject_id = subject_id
         self.record_start_time = datetime.now()
         filename_stem = f"{self.subject_id}_{self.record_start_time.strftime('%Y-%m-%d-%H%M%S')}"
-        self.video_filepath = os.path.join(save_dir, filename_stem + ".mp4")
-        self.GPIO_filepath = os.path.join(save_dir, filename_stem + "_GPIO_data.csv")
-        self.metadata_filepath = os.path.join(save_dir, filename_stem + "_metadata.json")
+        self.filepath_stem = os.path.join(save_dir, filename_stem)
+        n = 1
+        while os.path.exists(self.filepath_stem + "_metadata.json"):  # GPIO triggered recordings in the same second.
+            n += 1
+            self.filepath_stem = os.path.join(save_dir, f"{filename_stem}_{n}")
+        self.output_format = self.recording_config["output_format"]
+        self.video_filepath = self.filepath_stem + (".raw" if self.output_format == "raw" else ".mp4")
+        self.metadata_filepath = self.filepath_stem + "_metadata.json"
 
         # Open GPIO file and write header data.
-        self.gpio_file = open(self.GPIO_filepath, mode="w", newline="")
-        self.gpio_writer = csv.writer(self.gpio_file)
-        self.gpio_writer.writerow(
-            [f"GPIO{pin}" for pin in range(1, self.camera_widget.camera_api.N_GPIO + 1)] + ["Timestamp"]
-        )
+        self.gpio_file_format = self.recording_config["gpio_file_format"]
+        self.open_gpio_file(self.filepath_stem)
+
+        # Open the frame gap log, a row for each gap in the frames recorded.
+        self.frame_gaps_filepath = self.filepath_stem + "_frame_gaps.csv"
+        self.frame_gaps_file = open(self.frame_gaps_filepath, mode="w", newline="")
+        self.frame_gaps_writer = csv.writer(self.frame_gaps_file)
+        self.frame_gaps_writer.writerow(["Frame", "Dropped_frames", "Timestamp"])
+        self.gap_size_counts = np.zeros(64, dtype=np.int64)  # Number of gaps by log2 of the frames dropped.
+        self.dropped_per_minute = np.zeros(0, dtype=np.int64)  # Dropped frames in each minute of the recording.
 
         # Create metadata file.
         self.metadata = {
@@ -65,70 +205,457 @@ class Data_recorder:
             "gain": self.settings.gain,
             "pixel_format": self.settings.pixel_format,
             "downsampling_factor": self.settings.downsampling_factor,
-            "device_model": self.camera_widget.camera_api.device_model,
-            "device_serial_number": self.camera_widget.camera_api.serial_number,
+            "device_model": self.camera_api.device_model,
+            "device_serial_number": self.camera_api.serial_number,
             # Recording information
             "start_time": self.record_start_time.isoformat(timespec="milliseconds"),
             "end_time": None,
             "duration": None,
             "recorded_frames": 0,
             "dropped_frames": None,
+            "pre_trigger_frames": None,
+            "gpio_trigger": None,  # Rule the recording was started by, see gpio_trigger.py.
+            "frame_gaps_file": os.path.basename(self.frame_gaps_filepath),
+            "drop_histograms": None,
+            "max_encode_lag": None,
+            "writer_dropped_frames": None,
+            "backpressure_events": [],
+            # Times (ms) after the first camera recorded together was armed, or recorded its first frame, and the
+            # same for stopping, see camera_sync.py.
+            "start_skew": {"arm_time": None, "first_frame_time": None},
+            "stop_skew": {"disarm_time": None, "last_frame_time": None},
+            "output_format": self.output_format,
+            "video_files": [],
+            "segments": [],
         }
-        with open(self.metadata_filepath, "w") as meta_data_file:
-            json.dump(self.metadata, meta_data_file, indent=4)
 
         # Initalise ffmpeg process
-        self.downsampled_width = self.camera_widget.camera_width // self.settings.downsampling_factor
-        self.downsampled_height = self.camera_widget.camera_height // self.settings.downsampling_factor
-        ffmpeg_command = " ".join(
-            [
-                self.camera_widget.GUI.ffmpeg_path,  # Path to binary
-                "-f rawvideo",  # Input codec (raw video)
-                f"-s {self.camera_widget.camera_width}x{self.camera_widget.camera_height}",  # Input frame size
-                f"-pix_fmt {self.camera_widget.camera_api.pixel_format_map[self.settings.pixel_format]['ffmpeg']}",  # Input Pixel Format: 8-bit grayscale input to ffmpeg process. Input array 1D
-                f"-r {self.settings.fps}",  # Frame rate
-                "-i -",  # input comes from a pipe (stdin)
-                f"-c:v {ffmpeg_encoder_map[self.camera_widget.GUI.ffmpeg_config['compression_standard']]}",  # Output codec
-                f"-s {self.downsampled_width}x{self.downsampled_height}",  # Output frame size after any downsampling.
-                "-pix_fmt yuv420p",  # Output pixel format
-                f"-preset {self.camera_widget.GUI.ffmpeg_config['encoding_speed']}",  # Encoding speed [fast, medium, slow]
-                f"-b:v 0 ",  # Encoder uses variable bit rate https://superuser.com/questions/1236275/how-can-i-use-crf-encoding-with-nvenc-in-ffmpeg
-                (
-                    f"-cq {self.camera_widget.GUI.ffmpeg_config['crf']}"
-                    if GPU_AVAILABLE
-                    else f"-crf {self.camera_widget.GUI.ffmpeg_config['crf']}"
-                ),  # Controls quality vs filesize
-                f'"{self.video_filepath}"',  # Output file path
-            ]
+        self.camera_width = self.camera_api.get_width()
+        self.camera_height = self.camera_api.get_height()
+        self.ffmpeg_processes = []
+        if self.output_format == "raw":  # Frames written to disk unencoded, see raw_video.py.
+            self.open_raw_video(self.video_filepath)
+        else:
+            self.start_ffmpeg_process(self.video_filepath, self.ffmpeg_config["encoding_speed"])
+        self.next_size_check = 0.0  # Time of the next check of the segment's video file size.
+        self.add_segment()
+        # Frame index, written as frames are recorded. Raw video files have their own index.
+        self.frame_index_writer = None
+        if self.output_format != "raw":
+            self.frame_index_writer = FrameIndexWriter(
+                self.filepath_stem + "_frame_index.npy", self.settings.fps, self.ffmpeg_config["keyframe_interval"]
+            )
+            self.metadata["frame_index"] = os.path.basename(self.filepath_stem) + "_frame_index.npy"
+        self.write_metadata()
+
+        # Start the writer thread, which writes queued batches to disk in the order they were put in the queue.
+        self.writer_queue = queue.Queue()  # Bounded by writer_queue_size frames, see wait_for_writer_space.
+        self.writer_thread = threading.Thread(target=self.run_writer, daemon=True)
+        self.writer_thread.start()
+
+    def start_ffmpeg_process(self, video_filepath, encoding_speed):
+        """Start an FFMPEG process encoding the images written to its stdin to video_filepath."""
+        ffmpeg_command = get_ffmpeg_command(
+            self.ffmpeg_path,
+            self.ffmpeg_config,
+            self.camera_width,
+            self.camera_height,
+            self.camera_api.pixel_format_map[self.settings.pixel_format]["ffmpeg"],
+            self.settings.fps,
+            self.settings.downsampling_factor,
+            encoding_speed,
+            video_filepath,
         )
         self.ffmpeg_process = subprocess.Popen(ffmpeg_command, stdin=subprocess.PIPE)
+        self.ffmpeg_processes.append(self.ffmpeg_process)
+        self.ffmpeg_filepath = video_filepath
+        self.encoding_speed = encoding_speed
+        self.metadata["video_files"].append(
+            {
+                "filename": os.path.basename(video_filepath),
+                "first_frame": self.recorded_frames,
+                "encoding_speed": encoding_speed,
+            }
+        )
+
+    def open_raw_video(self, video_filepath):
+        """Open a raw video file for the images from the next frame."""
+        self.raw_video = RawVideoWriter(
+            video_filepath,
+            self.camera_width,
+            self.camera_height,
+            self.camera_api.pixel_format_map[self.settings.pixel_format]["ffmpeg"],
+            self.settings.fps,
+            self.settings.downsampling_factor,
+            write_size=self.recording_config["raw_write_size"],
+            preallocate_size=self.recording_config["raw_preallocate_size"],
+            use_mmap=self.recording_config["raw_use_mmap"],
+        )
+        self.metadata["video_files"].append(
+            {"filename": os.path.basename(video_filepath), "first_frame": self.recorded_frames, "encoding_speed": None}
+        )
+
+    def open_gpio_file(self, filepath_stem):
+        """Open the GPIO file for the pinstates from the next frame and write header data."""
+        if self.gpio_file_format == "npy":  # Binary file written per batch, see gpio_log.py.
+            self.GPIO_filepath = filepath_stem + "_GPIO_data.npy"
+            self.gpio_log = GPIOLogWriter(self.GPIO_filepath, self.camera_api.N_GPIO, self.recorded_frames)
+        else:
+            self.GPIO_filepath = filepath_stem + "_GPIO_data.csv"
+            self.gpio_file = open(self.GPIO_filepath, mode="w", newline="")
+            self.gpio_writer = csv.writer(self.gpio_file)
+            self.gpio_writer.writerow([f"GPIO{pin}" for pin in range(1, self.camera_api.N_GPIO + 1)] + ["Timestamp"])
+
+    def close_gpio_file(self):
+        if self.gpio_file_format == "npy":
+            self.gpio_log.close()
+        else:
+            self.gpio_file.close()
+
+    def write_metadata(self):
+        """Write the metadata file, replacing the previous version once it is written."""
+        with open(self.metadata_filepath + ".tmp", "w") as meta_data_file:
+            json.dump(self.metadata, meta_data_file, indent=4)
+        os.replace(self.metadata_filepath + ".tmp", self.metadata_filepath)
+
+    def get_filepaths(self):
+        """Return the paths of all files written by the recording."""
+        directory = os.path.dirname(self.filepath_stem)
+        filenames = [video_file["filename"] for video_file in self.metadata["video_files"]]
+        filenames += [segment["gpio_file"] for segment in self.metadata["segments"]]
+        filenames.append(self.metadata["frame_gaps_file"])
+        if "raw_spill" in self.metadata:
+            filenames.append(self.metadata["raw_spill"]["filename"])
+        if "frame_index" in self.metadata:
+            filenames.append(self.metadata["frame_index"])
+        return [self.metadata_filepath] + [os.path.join(directory, filename) for filename in filenames]
 
     def stop_recording(self) -> None:
-        """Close data files and FFMPEG process."""
+        """Write any queued images then close data files and FFMPEG process."""
+        self.writer_queue.put(None)  # Stops the writer thread once the batches ahead of it are written.
+        self.writer_thread.join()
         end_time = datetime.now()
         # Close files.
-        self.gpio_file.close()
+        self.close_gpio_file()
+        self.frame_gaps_file.close()
+        if self.raw_spill_file:
+            self.raw_spill_file.close()
+        if self.raw_video:
+            self.raw_video.close()
         self.metadata["end_time"] = end_time.isoformat(timespec="milliseconds")
         self.metadata["duration"] = str(end_time - self.record_start_time)[:-3]
         self.metadata["recorded_frames"] = self.recorded_frames
         self.metadata["dropped_frames"] = self.dropped_frames
+        self.metadata["pre_trigger_frames"] = self.pre_trigger_frames
+        self.metadata["drop_histograms"] = self.get_drop_histograms()
+        self.metadata["max_encode_lag"] = round(self.max_encode_lag, 3)
+        self.metadata["writer_dropped_frames"] = self.writer_dropped_frames
+        if self.frame_index_writer:
+            self.frame_index_writer.close()
+        self.write_metadata()
+        # Close FFMPEG processes
+        for ffmpeg_process in self.ffmpeg_processes:
+            if not ffmpeg_process.stdin.closed:
+                ffmpeg_process.stdin.close()
+            ffmpeg_process.wait()
+        # Add the keyframes and their byte offsets to the frame index once the video files are complete.
+        ffprobe_path = get_ffprobe_path(self.ffmpeg_path)
+        if self.frame_index_writer and self.frame_index_writer.n_rows and ffprobe_path:
+            threading.Thread(
+                target=self.add_keyframe_offsets,
+                args=(self.filepath_stem + "_frame_index.npy", ffprobe_path),
+                name="frame-index",
+            ).start()
+
+    # Frame index -----------------------------------------------------------------------
+
+    def get_timestamps(self):
+        """Return the camera timestamps (ns) of the frames recorded, read from the frame index, or the raw video
+        files, once recording has stopped."""
+        if self.frame_index_writer:
+            return np.array(read_frame_index(self.frame_index_writer.filepath)["timestamp"])
+        directory = os.path.dirname(self.filepath_stem)
+        timestamps = [
+            read_raw_video(os.path.join(directory, video_file["filename"]))[2]
+            for video_file in self.metadata["video_files"]
+        ]
+        return np.concatenate(timestamps) if timestamps else np.zeros(0, dtype=np.int64)
+
+    def add_keyframe_offsets(self, index_filepath, ffprobe_path):
+        """Add the keyframes found in the video files to the frame index, run on a separate thread."""
+        video_filepaths = [
+            os.path.join(os.path.dirname(self.filepath_stem), video_file["filename"])
+            for video_file in self.metadata["video_files"]
+        ]
+        try:
+            add_keyframe_offsets(index_filepath, video_filepaths, self.settings.fps, ffprobe_path)
+        except Exception as e:
+            print(f"Unable to add keyframe offsets to {index_filepath}: {e}")
+
+    # Segments --------------------------------------------------------------------------
+
+    def add_segment(self):
+        """Add the segment of files recorded to from the next frame to the metadata."""
+        self.segment = {
+            "video_file": os.path.basename(self.video_filepath),
+            "gpio_file": os.path.basename(self.GPIO_filepath),
+            "first_frame": self.recorded_frames,
+            "last_frame": None,
+            "first_timestamp": None,  # Camera timestamps (ns).
+            "last_timestamp": None,
+        }
+        self.metadata["segments"].append(self.segment)
+
+    def segment_due(self, timestamp):
+        """Check whether the current segment has reached the segment duration or size in recording_config. The video
+        file size is checked at most once a second."""
+        if self.raw_spill_file or self.segment["first_timestamp"] is None:  # Spill files are not segmented.
+            return False
+        segment_duration = self.recording_config["segment_duration"]
+        if segment_duration and timestamp - self.segment["first_timestamp"] >= segment_duration * 60e9:
+            return True
+        segment_size = self.recording_config["segment_size"]
+        if segment_size and time.perf_counter() > self.next_size_check:
+            self.next_size_check = time.perf_counter() + 1
+            if self.raw_video:
+                video_file_size = self.raw_video.buffer_offset + self.raw_video.buffer_used
+            else:
+                video_file_size = os.path.getsize(self.ffmpeg_filepath) if os.path.exists(self.ffmpeg_filepath) else 0
+            return video_file_size >= segment_size * 1e9
+        return False
+
+    def start_new_segment(self, segment_stem=None, encoding_speed=None):
+        """Continue recording to a new set of video and GPIO files named segment_stem, by default the recording's
+        next _seg file, encoding video at encoding_speed, by default the current speed. Called on the writer thread
+        between batches, so images queued while the new files are opened are written to them and no frames are
+        lost."""
+        if segment_stem is None:
+            segment_stem = f"{self.filepath_stem}_seg{len(self.metadata['segments']) + 1}"
+        self.close_gpio_file()
+        self.open_gpio_file(segment_stem)
+        if self.raw_video:
+            self.raw_video.close()
+            self.video_filepath = segment_stem + ".raw"
+            self.open_raw_video(self.video_filepath)
+        else:
+            self.ffmpeg_process.stdin.close()  # FFMPEG finishes the previous file while the new one is encoded.
+            self.ffmpeg_processes = [process for process in self.ffmpeg_processes if process.poll() is None]
+            self.video_filepath = segment_stem + ".mp4"
+            self.start_ffmpeg_process(self.video_filepath, encoding_speed or self.encoding_speed)
+        self.add_segment()
+        self.write_metadata()  # Segments so far are listed in the metadata file while recording.
+
+    # Dropped frames --------------------------------------------------------------------
 
-        with open(self.metadata_filepath, "w") as self.meta_data_file:
-            json.dump(self.metadata, self.meta_data_file, indent=4)
-        # Close FFMPEG process
-        self.ffmpeg_process.stdin.close()
-        self.ffmpeg_process.wait()
+    def log_frame_gaps(self, new_images):
+        """Write the gaps in a batch of frames to the frame gap log, with the frame after each gap, the number of
+        frames dropped and the frame's timestamp, and add them to the drop histograms."""
+        gap_indices = np.flatnonzero(new_images["frame_gaps"])
+        gap_sizes = new_images["frame_gaps"][gap_indices]
+        rel_timestamps = new_images["timestamps"][gap_indices] - self.first_timestamp
+        self.frame_gaps_writer.writerows(
+            zip((gap_indices + self.recorded_frames).tolist(), gap_sizes.tolist(), rel_timestamps.tolist())
+        )
+        self.gap_size_counts += np.bincount(np.log2(gap_sizes).astype(int), minlength=len(self.gap_size_counts))
+        minute_counts = np.bincount(rel_timestamps // 60_000_000_000, weights=gap_sizes).astype(np.int64)
+        if len(minute_counts) > len(self.dropped_per_minute):
+            self.dropped_per_minute.resize(len(minute_counts), refcheck=False)
+        self.dropped_per_minute[: len(minute_counts)] += minute_counts
+
+    def get_drop_histograms(self):
+        """Return the number of gaps by frames dropped, in power of 2 bins, and the frames dropped in each minute
+        of the recording."""
+        gap_sizes = {}
+        for i in np.flatnonzero(self.gap_size_counts):
+            gap_sizes["1" if i == 0 else f"{2**i}-{2**(i + 1) - 1}"] = int(self.gap_size_counts[i])
+        n_minutes = 0
+        if self.first_timestamp is not None:
+            n_minutes = (self.segment["last_timestamp"] - self.first_timestamp) // 60_000_000_000 + 1
+        dropped_per_minute = np.zeros(max(n_minutes, len(self.dropped_per_minute)), dtype=np.int64)
+        dropped_per_minute[: len(self.dropped_per_minute)] = self.dropped_per_minute
+        return {"gap_sizes": gap_sizes, "dropped_per_minute": dropped_per_minute.tolist()}
+
+    # Writer thread ---------------------------------------------------------------------
+
+    def put_images(self, new_images):
+        """Queue a batch of images for the writer thread. If the queue is full the caller is blocked until there
+        is space, or the batch is discarded, depending on recording_config["writer_full_policy"]."""
+        if not self.wait_for_writer_space(new_images):
+            self.writer_dropped_frames += len(new_images["images"])
+            self.camera_api.release_images(new_images)
+            return
+        self.add_pending_images(new_images)  # Before the batch is queued, as it may be written straight away.
+        if self.camera_clock:
+            self.camera_clock.add_batch(new_images)
+        if self.first_frame_time is None:
+            batch_duration = (new_images["timestamps"][-1] - new_images["timestamps"][0]) / 1e9
+            self.first_frame_time = new_images["read_time"] - batch_duration
+        self.last_frame_time = new_images["read_time"]
+        self.writer_queue.put(new_images)
+
+    def wait_for_writer_space(self, new_images):
+        """Return True if the writer queue has space for a batch, waiting for space if it is full and
+        writer_full_policy is "block", or returning False if it is "drop". The queue is full when it holds
+        writer_queue_size frames from the camera's frame pool, which is sized to hold them (see
+        GenericCamera.set_frame_pool_size), so the queue fills before the camera runs out of image buffers. Frames
+        from the pre-trigger buffer do not hold camera frame pool slots, so are always queued."""
+        if new_images.get("pre_trigger"):
+            return True
+        n_images = len(new_images["images"])
+        policy = self.recording_config["writer_full_policy"]
+        with self._writer_space:
+            while (
+                self.pending_pool_frames
+                and self.pending_pool_frames + n_images > self.recording_config["writer_queue_size"]
+            ):
+                if not self.writer_full:
+                    self.writer_full = True
+                    print(
+                        f"Writer queue for camera {self.settings.unique_id} is full "
+                        f"({self.pending_pool_frames} frames), applying writer full policy: {policy}"
+                    )
+                    self.metadata["backpressure_events"].append(
+                        {"frame": self.recorded_frames + self.pending_frames, "writer_queue_full": policy}
+                    )
+                if policy == "drop":
+                    return False
+                self._writer_space.wait()
+            self.writer_full = False
+        return True
+
+    def run_writer(self):
+        """Write queued batches until stop_recording puts None in the queue."""
+        while True:
+            new_images = self.writer_queue.get()
+            if new_images is None:
+                break
+            try:
+                self.record_new_images(new_images)
+            except Exception as e:
+                print(f"Error writing images from camera {self.settings.unique_id}: {e}")
+                self.camera_api.release_images(new_images)
+                self.remove_pending_images()
+
+    def get_queue_depth(self):
+        """Return the number of batches waiting in the writer queue."""
+        return self.writer_queue.qsize()
 
     def record_new_images(self, new_images):
         """Record newly aquired images and GPIO pinstates."""
+        if self.backpressure_action:
+            self.apply_backpressure_action()
+        if self.segment_due(new_images["timestamps"][0]):
+            self.start_new_segment()
         if self.first_timestamp is None:
-            self.first_timestamp = new_images["timestamps"][0]
+            self.first_timestamp = int(new_images["timestamps"][0])
             self.timestamp_digit_count = len(str(self.first_timestamp))
+        if new_images["dropped_frames"]:
+            self.log_frame_gaps(new_images)
         self.recorded_frames += len(new_images["images"])
         self.dropped_frames += new_images["dropped_frames"]
-        # Concatenate the list of numpy buffers into one bytestream
-        frame = np.concatenate([img for img in new_images["images"]])
-        self.ffmpeg_process.stdin.write(frame)
-        for gpio_pinstate, timestamp in zip(new_images["gpio_data"], new_images["timestamps"]):
-            rel_timestamp = timestamp - self.first_timestamp
-            self.gpio_writer.writerow(list(gpio_pinstate) + [f"{rel_timestamp:0{self.timestamp_digit_count}d}"])
+        if new_images.get("pre_trigger"):
+            self.pre_trigger_frames += len(new_images["images"])
+        if self.frame_index_writer:
+            self.frame_index_writer.write(
+                new_images["timestamps"],
+                self.metadata["video_files"],
+                self.metadata["raw_spill"]["first_frame"] if "raw_spill" in self.metadata else None,
+            )
+        if self.raw_video:
+            self.raw_video.write(new_images["images"], new_images["timestamps"])
+        elif self.raw_spill_file:
+            self.raw_spill_file.writelines(new_images["images"])
+        else:
+            # Write each image buffer straight to the ffmpeg pipe, avoiding an intermediate copy of the batch.
+            self.ffmpeg_process.stdin.writelines(new_images["images"])
+        if self.gpio_file_format == "npy":
+            self.gpio_log.write(new_images["timestamps"], new_images["gpio_data"], new_images["frame_gaps"])
+        else:
+            rel_timestamps = (new_images["timestamps"] - self.first_timestamp).tolist()
+            for gpio_pinstate, rel_timestamp in zip(new_images["gpio_data"].tolist(), rel_timestamps):
+                self.gpio_writer.writerow(gpio_pinstate + [f"{rel_timestamp:0{self.timestamp_digit_count}d}"])
+        if self.segment["first_timestamp"] is None:
+            self.segment["first_timestamp"] = int(new_images["timestamps"][0])
+        self.segment["last_frame"] = self.recorded_frames - 1
+        self.segment["last_timestamp"] = int(new_images["timestamps"][-1])
+        # Image data has been written, frame pool slots can be reused.
+        self.camera_api.release_images(new_images)
+        self.remove_pending_images()
+
+    # Encoder backpressure ------------------------------------------------------------
+
+    def add_pending_images(self, new_images):
+        """Track a batch queued for the writer thread and apply the backpressure policy if the encode lag
+        is over the threshold."""
+        # Encode lag of frames from the pre-trigger buffer is measured from when they are queued, not read.
+        queue_time = time.perf_counter() if new_images.get("pre_trigger") else new_images["read_time"]
+        with self._pending_lock:
+            n_pool_frames = 0 if new_images.get("pre_trigger") else len(new_images["images"])
+            self.pending_batches.append((queue_time, len(new_images["images"]), n_pool_frames))
+            self.pending_frames += len(new_images["images"])
+            self.pending_pool_frames += n_pool_frames
+        encode_lag = self.get_encode_lag()
+        self.max_encode_lag = max(self.max_encode_lag, encode_lag["seconds"])
+        max_encode_lag = self.recording_config["max_encode_lag"]
+        if not self.encoder_lagging and encode_lag["seconds"] > max_encode_lag:
+            self.encoder_lagging = True
+            policy = self.recording_config["backpressure_policy"]
+            print(
+                f"Encoder for camera {self.settings.unique_id} is {encode_lag['seconds']:.1f}s "
+                f"({encode_lag['frames']} frames) behind, applying backpressure policy: {policy}"
+            )
+            self.metadata["backpressure_events"].append(
+                {"frame": self.recorded_frames + encode_lag["frames"], "encode_lag": round(encode_lag["seconds"], 3)}
+            )
+            if policy in ("faster_preset", "raw_spill") and not (self.raw_spill_file or self.raw_video):
+                self.backpressure_action = policy
+        elif self.encoder_lagging and encode_lag["seconds"] < max_encode_lag / 2:
+            self.encoder_lagging = False
+
+    def remove_pending_images(self):
+        """Stop tracking the oldest pending batch once it has been written."""
+        with self._pending_lock:
+            if self.pending_batches:
+                _, n_frames, n_pool_frames = self.pending_batches.popleft()
+                self.pending_frames -= n_frames
+                self.pending_pool_frames -= n_pool_frames
+                self._writer_space.notify_all()
+
+    def get_encode_lag(self):
+        """Return the number of frames waiting to be written and the time (s) the oldest has been waiting."""
+        with self._pending_lock:
+            seconds = time.perf_counter() - self.pending_batches[0][0] if self.pending_batches else 0.0
+            return {"frames": self.pending_frames, "seconds": seconds}
+
+    def apply_backpressure_action(self):
+        """Switch the encoder to a faster preset or write the remaining images to a raw spill file.
+        Called on the writer thread so images already written are not affected."""
+        action, self.backpressure_action = self.backpressure_action, None
+        if action == "faster_preset":
+            encoding_speeds = get_encoder_config()["encoding_speeds"]
+            faster_speeds = (
+                encoding_speeds[encoding_speeds.index(self.encoding_speed) + 1 :]
+                if self.encoding_speed in encoding_speeds
+                else []
+            )
+            if faster_speeds:  # Continue recording to a new segment with the faster preset.
+                part_number = len(self.metadata["video_files"]) + 1
+                self.start_new_segment(f"{self.filepath_stem}_part{part_number}", faster_speeds[0])
+                return
+            action = "raw_spill"  # Already using the fastest preset.
+        if action == "raw_spill":  # Remaining images are written uncompressed to a final segment.
+            self.ffmpeg_process.stdin.close()
+            self.close_gpio_file()
+            self.open_gpio_file(self.filepath_stem + "_spill")
+            raw_spill_filepath = self.filepath_stem + "_spill.raw"
+            self.raw_spill_file = open(raw_spill_filepath, "wb")
+            self.video_filepath = raw_spill_filepath
+            self.metadata["raw_spill"] = {
+                "filename": os.path.basename(raw_spill_filepath),
+                "first_frame": self.recorded_frames,
+                "width": self.camera_width,
+                "height": self.camera_height,
+                "pixel_format": self.camera_api.pixel_format_map[self.settings.pixel_format]["ffmpeg"],
+            }
+            self.add_segment()
+            self.write_metadata()
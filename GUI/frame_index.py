@@ -0,0 +1,128 @@
+import os
+import shutil
+import subprocess
+import numpy as np
+
+from .gpio_log import npy_header, read_npy_rows
+
+# Frame index sidecar files, mapping each recorded frame to its camera timestamp, the video file it was written to,
+# its presentation time in that file and the keyframe its group of pictures starts with, so a frame can be decoded by
+# seeking to its keyframe rather than decoding from the start of the file. The index is written by the data recorder
+# a batch of frames at a time as they are recorded, in the .npy layout of GPIO logs (see gpio_log.py), with keyframes
+# given by ffmpeg_config keyframe_interval. When recording stops add_keyframe_offsets reads the keyframes and their
+# byte offsets from the video files with ffprobe, if it is available.
+
+
+frame_index_dtype = np.dtype(
+    [
+        ("frame_number", "<i8"),  # Frame number in the recording.
+        ("timestamp", "<i8"),  # Camera timestamp (ns).
+        ("file_index", "<i2"),  # Index of the video file in the metadata video_files, -1 for the raw spill file.
+        ("file_frame", "<i8"),  # Frame number in the video file.
+        ("pts_time", "<f8"),  # Presentation time (s) in the video file.
+        ("keyframe", "<i8"),  # Frame number in the video file of the keyframe before the frame, -1 if unknown.
+        ("keyframe_pos", "<i8"),  # Byte offset of the keyframe's packet in the video file, -1 if unknown.
+    ]
+)
+
+
+def make_frame_index(timestamps, video_files, fps, keyframe_interval, raw_spill_first_frame=None, first_frame=0):
+    """Return the frame index rows for frames from first_frame with the given timestamps, the video files list from
+    the metadata and the keyframe interval (frames) the videos were encoded with, 0 if not set."""
+    n_frames = len(timestamps)
+    index = np.zeros(n_frames, dtype=frame_index_dtype)
+    index["frame_number"] = np.arange(first_frame, first_frame + n_frames)
+    index["timestamp"] = timestamps
+    first_frames = [video_file["first_frame"] for video_file in video_files]
+    index["file_index"] = np.searchsorted(first_frames, index["frame_number"], side="right") - 1
+    index["file_frame"] = index["frame_number"] - np.array(first_frames)[index["file_index"]]
+    if raw_spill_first_frame is not None:
+        raw_spill = index["frame_number"] >= raw_spill_first_frame
+        index["file_index"][raw_spill] = -1
+        index["file_frame"][raw_spill] = index["frame_number"][raw_spill] - raw_spill_first_frame
+    index["pts_time"] = index["file_frame"] / fps
+    index["keyframe"] = index["file_frame"] - index["file_frame"] % keyframe_interval if keyframe_interval else -1
+    index["keyframe_pos"] = -1
+    return index
+
+
+class FrameIndexWriter:
+    """Appends the frame index rows of batches of frames to a frame index file."""
+
+    def __init__(self, filepath, fps, keyframe_interval):
+        self.filepath = filepath
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.n_rows = 0
+        self.file = open(filepath, "wb")
+        self.file.write(npy_header(frame_index_dtype, 0))
+
+    def write(self, timestamps, video_files, raw_spill_first_frame=None):
+        """Write the rows of the next batch of frames, with the video files and raw spill first frame so far."""
+        index = make_frame_index(
+            timestamps, video_files, self.fps, self.keyframe_interval, raw_spill_first_frame, self.n_rows
+        )
+        self.file.write(index)
+        self.n_rows += len(index)
+
+    def close(self):
+        """Write the number of rows to the header and close the file."""
+        self.file.seek(0)
+        self.file.write(npy_header(frame_index_dtype, self.n_rows))
+        self.file.close()
+
+
+def read_frame_index(filepath):
+    """Return a frame index written by FrameIndexWriter, memory mapped."""
+    return read_npy_rows(filepath)
+
+
+# -------------------------------------------------------------------------------------
+# Keyframe offsets
+# -------------------------------------------------------------------------------------
+
+
+def get_ffprobe_path(ffmpeg_path):
+    """Return the path of ffprobe, installed with ffmpeg, or None if it is not found."""
+    ffprobe_path = shutil.which("ffprobe")
+    if ffprobe_path is None and ffmpeg_path:
+        ffprobe_path = shutil.which(os.path.join(os.path.dirname(ffmpeg_path), "ffprobe"))
+    return ffprobe_path
+
+
+def probe_keyframes(video_filepath, fps, ffprobe_path):
+    """Return the frame numbers and packet byte offsets of the keyframes in a video file."""
+    output = subprocess.run(
+        [ffprobe_path, "-v", "error", "-select_streams", "v:0"]
+        + ["-show_entries", "packet=pts_time,pos,flags", "-of", "csv=p=0:nk=0", video_filepath],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    pts_times, positions = [], []
+    for line in output.splitlines():
+        packet = dict(field.split("=", 1) for field in line.split(",") if "=" in field)
+        if "K" in packet.get("flags", "") and packet.get("pts_time", "N/A") != "N/A":
+            pts_times.append(float(packet["pts_time"]))
+            positions.append(int(packet["pos"]))
+    if not pts_times:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.argsort(pts_times)
+    pts_times, positions = np.array(pts_times)[order], np.array(positions)[order]
+    frames = np.round((pts_times - pts_times[0]) * fps).astype(np.int64)
+    return frames, positions
+
+
+def add_keyframe_offsets(index_filepath, video_filepaths, fps, ffprobe_path):
+    """Set the keyframe and keyframe byte offset of each frame in a frame index from the keyframes found in the
+    video files, a list in the order of the metadata video_files."""
+    index = np.load(index_filepath, mmap_mode="r+")  # Updated in place.
+    for file_index, video_filepath in enumerate(video_filepaths):
+        keyframes, positions = probe_keyframes(video_filepath, fps, ffprobe_path)
+        if not len(keyframes):
+            continue
+        rows = index["file_index"] == file_index
+        keyframe_numbers = np.searchsorted(keyframes, index["file_frame"][rows], side="right") - 1
+        index["keyframe"][rows] = keyframes[keyframe_numbers]
+        index["keyframe_pos"][rows] = positions[keyframe_numbers]
+    index.flush()
@@ -0,0 +1,140 @@
+import os
+import re
+import json
+import struct
+import numpy as np
+
+# Binary GPIO and timestamp files. Each frame is one row of a numpy structured array, written in bulk per batch of
+# images. Files are in .npy format so can be opened with np.load, the row count in the header is written when the
+# file is closed, read_gpio_log also reads files that were not closed.
+
+HEADER_LENGTH = 256  # Fixed header length (bytes) so the header can be rewritten with the row count.
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def gpio_log_dtype(n_gpio):
+    """Structured array dtype of one row of the GPIO log."""
+    return np.dtype(
+        [
+            ("frame_number", "<i8"),  # Frame number in the recording.
+            ("timestamp", "<i8"),  # Camera timestamp (ns).
+            ("dropped_frames", "<u4"),  # Frames dropped since the previous recorded frame.
+            ("gpio", "u1", (n_gpio,)),  # GPIO pin states.
+        ]
+    )
+
+
+def npy_header(dtype, n_rows):
+    """Return a .npy version 1.0 header padded to HEADER_LENGTH bytes."""
+    header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (n_rows,)})
+    header_length = HEADER_LENGTH - len(NPY_MAGIC) - 2
+    return NPY_MAGIC + struct.pack("<H", header_length) + (header.ljust(header_length - 1) + "\n").encode("latin1")
+
+
+# -------------------------------------------------------------------------------------
+# Writer
+# -------------------------------------------------------------------------------------
+
+
+class GPIOLogWriter:
+    """Appends rows for batches of frames to a binary GPIO log file."""
+
+    def __init__(self, filepath, n_gpio, first_frame=0):
+        self.filepath = filepath
+        self.dtype = gpio_log_dtype(n_gpio)
+        self.first_frame = first_frame  # Frame number of the first row, for files continuing a recording.
+        self.n_rows = 0
+        self.rows = np.zeros(0, dtype=self.dtype)  # Reused between batches of the same size or smaller.
+        self.file = open(filepath, "wb")
+        self.file.write(npy_header(self.dtype, 0))
+
+    def write(self, timestamps, gpio_data, frame_gaps=0):
+        """Write one row per frame of a batch. frame_gaps is the number of frames dropped before each frame."""
+        n_frames = len(timestamps)
+        if len(self.rows) < n_frames:
+            self.rows = np.zeros(n_frames, dtype=self.dtype)
+        rows = self.rows[:n_frames]
+        rows["frame_number"] = np.arange(self.n_rows, self.n_rows + n_frames) + self.first_frame
+        rows["timestamp"] = timestamps
+        rows["dropped_frames"] = frame_gaps
+        rows["gpio"] = gpio_data
+        self.file.write(rows)
+        self.n_rows += n_frames
+
+    def close(self):
+        """Write the number of rows to the header and close the file."""
+        self.file.seek(0)
+        self.file.write(npy_header(self.dtype, self.n_rows))
+        self.file.close()
+
+
+# -------------------------------------------------------------------------------------
+# Reader
+# -------------------------------------------------------------------------------------
+
+
+def read_gpio_log(filepath, mmap=True):
+    """Return the rows of a GPIO log as a structured array with fields frame_number, timestamp, dropped_frames
+    and gpio (n_frames, n_gpio). The file is memory mapped unless mmap is False."""
+    return read_npy_rows(filepath, mmap)
+
+
+def read_npy_rows(filepath, mmap=True):
+    """Return the rows of a .npy file written a batch at a time, whether or not the row count in its header was
+    written. The file is memory mapped unless mmap is False."""
+    with open(filepath, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            _, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            _, _, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    # Row count from the file size, as the header row count is only written when the file is closed.
+    n_rows = (os.path.getsize(filepath) - offset) // dtype.itemsize
+    if mmap and n_rows:
+        return np.memmap(filepath, dtype=dtype, mode="r", offset=offset, shape=(n_rows,))
+    return np.fromfile(filepath, dtype=dtype, count=n_rows, offset=offset)
+
+
+def get_recording_first_timestamp(filepath):
+    """Return the camera timestamp (ns) of the first frame of the recording a GPIO log is from, read from the
+    recording's metadata file, or None if the metadata file is not found."""
+    filepath_stem = re.sub(r"_GPIO_data\.npy$", "", filepath)
+    # Files of later segments of segmented recordings, or written after a backpressure policy was applied.
+    filepath_stem = re.sub(r"_(seg\d+|part\d+|spill)$", "", filepath_stem)
+    if not os.path.isfile(filepath_stem + "_metadata.json"):
+        return None
+    with open(filepath_stem + "_metadata.json", "r") as f:
+        segments = json.load(f).get("segments")
+    return segments[0]["first_timestamp"] if segments else None
+
+
+def convert_to_csv(filepath, csv_filepath=None, first_timestamp=None):
+    """Convert a GPIO log to the CSV layout written by the data recorder, with timestamps relative to first_timestamp,
+    by default the first frame of the recording from its metadata file, so the timestamps of later segments continue
+    from earlier ones, or the first frame of the file if there is no metadata file. Returns the CSV file path."""
+    if csv_filepath is None:
+        csv_filepath = os.path.splitext(filepath)[0] + ".csv"
+    rows = read_gpio_log(filepath)
+    n_gpio = rows.dtype["gpio"].shape[0]
+    if first_timestamp is None:
+        first_timestamp = get_recording_first_timestamp(filepath)
+    if len(rows):
+        if first_timestamp is None:
+            first_timestamp = int(rows["timestamp"][0])
+        table = np.column_stack([rows["gpio"], rows["timestamp"] - first_timestamp])
+        timestamp_digit_count = len(str(first_timestamp))
+    else:
+        table = np.zeros((0, n_gpio + 1), dtype=np.int64)
+        timestamp_digit_count = 1
+    with open(csv_filepath, "w", newline="") as f:
+        np.savetxt(
+            f,
+            table,
+            fmt=["%d"] * n_gpio + [f"%0{timestamp_digit_count}d"],
+            delimiter=",",
+            newline="\r\n",  # Line ending used by csv.writer.
+            header=",".join([f"GPIO{pin}" for pin in range(1, n_gpio + 1)] + ["Timestamp"]),
+            comments="",
+        )
+    return csv_filepath
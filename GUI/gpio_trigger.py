@@ -0,0 +1,120 @@
+import numpy as np
+
+# Recording started and stopped by GPIO inputs. A trigger rule, acquisition_config["gpio_trigger"], is a dict with a
+# start condition, a stop condition and a stop delay, e.g. {"start": "GPIO1 rising", "stop": "GPIO1 falling",
+# "stop_delay": 10} to record from a rising edge of GPIO1 until 10 s after its next falling edge, or
+# {"start": "GPIO2 high", "stop": "GPIO2 low"} to record while GPIO2 is high. Conditions are "GPIO<n> <state>", with
+# pins numbered from 1 as in the GPIO files and state "high", "low", "rising" or "falling". The rule is evaluated on
+# every batch of frames read from the camera by GPIOTrigger.get_events, which returns the frames recording starts and
+# stops at, so recordings start and stop at the exact frame the condition was met. A start condition met during the
+# stop delay cancels the stop. The camera reader splits batches at these frames with split_batch, see
+# CameraReader.apply_gpio_trigger.
+
+CONDITION_STATES = ("high", "low", "rising", "falling")
+
+
+def parse_condition(condition):
+    """Return the pin index and state of a condition string such as "GPIO1 rising"."""
+    try:
+        pin, state = condition.split()
+        if not pin.upper().startswith("GPIO") or state not in CONDITION_STATES:
+            raise ValueError
+        pin_index = int(pin[4:]) - 1
+        if pin_index < 0:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f'Invalid GPIO trigger condition "{condition}", expected e.g. "GPIO1 rising".')
+    return pin_index, state
+
+
+class GPIOTrigger:
+    """Finds the frames at which a trigger rule starts and stops recording, carrying the pin states and any pending
+    stop over from one batch of frames to the next."""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.start_condition = parse_condition(rule["start"])
+        self.stop_condition = parse_condition(rule["stop"])
+        self.stop_delay = int(rule.get("stop_delay", 0) * 1e9)  # (ns)
+        self.reset()
+
+    def reset(self):
+        """Forget the pin states and stop recording, called when the trigger is armed."""
+        self.previous_gpio = None  # Pin states of the last frame of the previous batch.
+        self.recording = False
+        self.stop_time = None  # Timestamp (ns) recording stops at, once the stop condition is met.
+
+    def get_condition_frames(self, gpio, condition):
+        """Return a boolean array of the frames in a batch which meet a condition."""
+        pin_index, state = condition
+        if pin_index >= gpio.shape[1]:
+            return np.zeros(len(gpio), dtype=bool)
+        states = gpio[:, pin_index] > 0
+        if state == "high":
+            return states
+        if state == "low":
+            return ~states
+        previous = np.empty_like(states)
+        previous[1:] = states[:-1]
+        # The first frame read has no previous state, so is not an edge.
+        previous[0] = states[0] if self.previous_gpio is None else self.previous_gpio[pin_index] > 0
+        return states & ~previous if state == "rising" else previous & ~states
+
+    def get_events(self, gpio, timestamps):
+        """Return a list of (frame, event) for a batch of frames, where event is "start" or "stop" and frame is the
+        index in the batch of the first frame recorded, or the first frame not recorded, respectively."""
+        starts = np.flatnonzero(self.get_condition_frames(gpio, self.start_condition))
+        stops = np.flatnonzero(self.get_condition_frames(gpio, self.stop_condition))
+        self.previous_gpio = gpio[-1].copy()
+        events = []
+        frame = 0  # First frame of the batch not yet evaluated.
+        while True:
+            if not self.recording:
+                following_starts = starts[starts >= frame]
+                if not len(following_starts):
+                    break
+                frame = following_starts[0]
+                events.append((int(frame), "start"))
+                self.recording = True
+                frame += 1
+                continue
+            if self.stop_time is None:
+                following_stops = stops[stops >= frame]
+                if not len(following_stops):
+                    break
+                self.stop_time = timestamps[following_stops[0]] + self.stop_delay
+                frame = following_stops[0] + 1
+                stop_frame = following_stops[0] + np.searchsorted(
+                    timestamps[following_stops[0] :], self.stop_time, side="left"
+                )
+            else:  # Stop condition met in an earlier batch.
+                stop_frame = np.searchsorted(timestamps, self.stop_time, side="left")
+                stop_frame = max(stop_frame, frame)
+            # A start condition met before recording stops cancels the stop.
+            cancelling_starts = starts[(starts >= frame) & (starts <= stop_frame)]
+            if len(cancelling_starts):
+                self.stop_time = None
+                frame = cancelling_starts[0] + 1
+                continue
+            if stop_frame >= len(timestamps):  # Recording stops in a later batch.
+                break
+            events.append((int(stop_frame), "stop"))
+            self.recording = False
+            self.stop_time = None
+            frame = stop_frame + 1
+        return events
+
+
+def split_batch(new_images, start, stop):
+    """Return the frames start to stop of a batch as a batch sharing its frame pool slots. A batch split into
+    parts is released by releasing each part."""
+    frame_gaps = new_images["frame_gaps"][start:stop]
+    return {
+        **new_images,
+        "images": new_images["images"][start:stop],
+        "frame_indices": new_images["frame_indices"][start:stop],
+        "gpio_data": new_images["gpio_data"][start:stop],
+        "timestamps": new_images["timestamps"][start:stop],
+        "frame_gaps": frame_gaps,
+        "dropped_frames": int(frame_gaps.sum()),
+    }
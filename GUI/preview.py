@@ -0,0 +1,142 @@
+import time
+import threading
+import cv2
+import numpy as np
+
+# Preview images for the video display. Images are downsampled to about the size they are shown on screen before
+# colour images are demosaiced, so the cost of displaying a camera scales with screen pixels rather than sensor pixels.
+# Images are prepared on a PreviewWorker thread per camera so the GUI thread only updates the display.
+
+
+def get_preview_factor(sensor_pixels_per_screen_pixel):
+    """Integer downsampling factor that keeps at least one image pixel per screen pixel."""
+    return max(1, int(sensor_pixels_per_screen_pixel))
+
+
+def make_preview_image(image_buffer, height, width, cv2_conversion=None, factor=1, method="area", out=None):
+    """Return a preview image from a raw image buffer, downsampled by factor in each dimension. cv2_conversion
+    is the cv2 colour conversion code for Bayer images or None for mono images. method is "area" to average
+    pixels or "stride" to keep every factor'th pixel. The preview is written to out if it has the preview's
+    shape, otherwise to a new array, and never shares memory with image_buffer."""
+    image = np.frombuffer(image_buffer, dtype=np.uint8).reshape(height, width)
+    if factor > 1:
+        if cv2_conversion is None:
+            image = downsample(image, factor, method)
+        else:
+            image = downsample_bayer(image, factor, method)
+    if cv2_conversion is not None:
+        return cv2.cvtColor(image, cv2_conversion, dst=out)
+    if out is None or out.shape != image.shape:
+        out = np.empty_like(image)
+    np.copyto(out, image)
+    return out
+
+
+def downsample(image, factor, method="area"):
+    """Downsample a 2D image by an integer factor."""
+    if method == "stride":
+        return image[::factor, ::factor]
+    height, width = image.shape[0] // factor, image.shape[1] // factor
+    return cv2.resize(image[: height * factor, : width * factor], (width, height), interpolation=cv2.INTER_AREA)
+
+
+def downsample_bayer(image, factor, method="area"):
+    """Downsample a Bayer mosaic by an integer factor keeping the 2x2 colour pattern, so it can be demosaiced
+    with the same conversion as the full resolution image."""
+    if method == "stride":
+        # Keep every factor'th 2x2 block of the mosaic.
+        height, width = image.shape[0] // 2, image.shape[1] // 2
+        blocks = image[: height * 2, : width * 2].reshape(height, 2, width, 2)[::factor, :, ::factor, :]
+        return blocks.reshape(blocks.shape[0] * 2, blocks.shape[2] * 2)
+    # Downsample each of the four colour planes and interleave them into a smaller mosaic.
+    height, width = image.shape[0] // 2 // factor, image.shape[1] // 2 // factor
+    mosaic = np.empty((height * 2, width * 2), dtype=image.dtype)
+    for i in range(2):
+        for j in range(2):
+            mosaic[i::2, j::2] = downsample(np.ascontiguousarray(image[i::2, j::2]), factor, method)[:height, :width]
+    return mosaic
+
+
+# -------------------------------------------------------------------------------------
+# Preview worker
+# -------------------------------------------------------------------------------------
+
+
+class PreviewWorker(threading.Thread):
+    """Prepares display images for one camera off the GUI thread. Requests and prepared images are each held in a
+    single slot, so only the latest frame is prepared and a prepared image not yet displayed is replaced rather than
+    queued. Image memory is reused between frames: prepared images are written to one of three buffers that is
+    neither waiting in the slot nor the last returned by get_prepared, which the display may still be drawing.
+    Camera properties shown in the display are read by the worker every property_interval seconds."""
+
+    def __init__(self, camera_reader, property_getters=None, property_interval=1):
+        super().__init__(daemon=True)
+        self.camera_reader = camera_reader
+        self.property_getters = property_getters or {}  # {name: function returning the property value}
+        self.property_interval = property_interval
+        self.camera_properties = {}  # {name: value} from the last property readout.
+        self._request = None  # Arguments to make_preview_image for the next image.
+        self._prepared = None  # Prepared image not yet returned by get_prepared.
+        self._displayed = None  # Prepared image last returned by get_prepared.
+        self._frame_buffer = None  # Copy of the reader's latest frame.
+        self._buffers = []  # Prepared image buffers.
+        self._prepared_frame_number = 0  # Frame number of the last prepared image.
+        self._next_property_time = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._request is not None or self._stop_event.is_set(), timeout=self.property_interval
+                )
+                request, self._request = self._request, None
+            if self._stop_event.is_set():
+                break
+            try:
+                if request is not None:
+                    self.prepare_image(*request)
+                if self.property_getters and time.perf_counter() >= self._next_property_time:
+                    self._next_property_time = time.perf_counter() + self.property_interval
+                    self.camera_properties = {name: getter() for name, getter in self.property_getters.items()}
+            except Exception as e:
+                print(f"Preview worker error: {e}")
+
+    def prepare_image(self, height, width, cv2_conversion, factor, method):
+        """Prepare a display image from the camera reader's latest frame if it has not already been prepared."""
+        if self.camera_reader.frames_read == self._prepared_frame_number:
+            return
+        self._frame_buffer, frame_number = self.camera_reader.get_latest_image(out=self._frame_buffer)
+        if self._frame_buffer is None:
+            return
+        with self._condition:
+            free_buffers = [b for b in self._buffers if b is not self._prepared and b is not self._displayed]
+        out = free_buffers[0] if free_buffers else None
+        prepared = make_preview_image(self._frame_buffer, height, width, cv2_conversion, factor, method, out)
+        if prepared is not out:  # New buffer or preview size changed.
+            self._buffers = [b for b in self._buffers if b is not out] + [prepared]
+        with self._condition:
+            self._prepared = prepared
+            self._prepared_frame_number = frame_number
+
+    def request(self, height, width, cv2_conversion=None, factor=1, method="area"):
+        """Request a display image of the latest frame, replacing any request not yet started."""
+        with self._condition:
+            self._request = (height, width, cv2_conversion, factor, method)
+            self._condition.notify()
+
+    def get_prepared(self):
+        """Return the most recently prepared image, or None if no new image has been prepared since the last call."""
+        with self._condition:
+            prepared, self._prepared = self._prepared, None
+            if prepared is not None:
+                self._displayed = prepared
+        return prepared
+
+    def stop(self, timeout=1):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        if self.is_alive():
+            self.join(timeout)
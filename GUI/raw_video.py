@@ -0,0 +1,186 @@
+import os
+import json
+import mmap
+import struct
+import numpy as np
+
+# Raw video files, written straight to disk without encoding for frame rates the video encoder cannot keep up with.
+# The file is a fixed size JSON index header, the frames back to back from frames_offset, then the frame timestamps
+# (int64, ns) from timestamps_offset. Frames are copied into a write buffer, or a memory mapped window of the file,
+# and written in large sequential writes aligned to ALIGNMENT into space preallocated ahead of the writes. The header
+# frame count is updated after every write so frames are recoverable if the file is not closed. Timestamps are written
+# to a temporary file as frames are written and copied to the end of the raw file when it is closed. Raw files are
+# converted to video with data_recorder.transcode_raw_video.
+
+RAW_MAGIC = b"PMVRAW\x01\x00"
+ALIGNMENT = max(4096, mmap.ALLOCATIONGRANULARITY)  # Header size and alignment (bytes) of writes and mapped windows.
+
+
+def aligned(size):
+    """Round a size in bytes up to a multiple of ALIGNMENT."""
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def raw_header(header):
+    """Return the header bytes: magic, JSON length and JSON header, padded to ALIGNMENT bytes."""
+    header_json = json.dumps(header).encode()
+    return (RAW_MAGIC + struct.pack("<I", len(header_json)) + header_json).ljust(ALIGNMENT, b"\x00")
+
+
+# -------------------------------------------------------------------------------------
+# Writer
+# -------------------------------------------------------------------------------------
+
+
+class RawVideoWriter:
+    """Writes 8 bit frames and their timestamps to a raw video file."""
+
+    def __init__(
+        self,
+        filepath,
+        width,
+        height,
+        pixel_format,
+        fps,
+        downsampling_factor=1,
+        write_size=2**24,
+        preallocate_size=2**30,
+        use_mmap=False,
+    ):
+        self.filepath = filepath
+        self.header = {
+            "width": width,
+            "height": height,
+            "pixel_format": pixel_format,  # FFMPEG pixel format name.
+            "fps": fps,
+            "downsampling_factor": downsampling_factor,  # Applied when the file is transcoded.
+            "frame_size": width * height,
+            "frame_count": 0,
+            "frames_offset": ALIGNMENT,
+            "timestamps_offset": None,  # Set when the file is closed.
+        }
+        self.frame_size = width * height
+        self.write_size = aligned(write_size)
+        self.preallocate_size = aligned(max(preallocate_size, write_size))
+        self.use_mmap = use_mmap
+        self.n_frames = 0
+        self.timestamps_filepath = filepath + ".timestamps"  # Deleted when the file is closed.
+        self.timestamps_file = open(self.timestamps_filepath, "w+b")
+        self.file = open(filepath, "w+b", buffering=0)
+        self.write_all(raw_header(self.header))
+        self.allocated_size = ALIGNMENT
+        self.buffer_offset = ALIGNMENT  # File offset of the start of the write buffer.
+        self.buffer_used = 0
+        self.buffer = None
+        self.new_buffer()
+
+    def write(self, images, timestamps):
+        """Write a batch of frames, each a contiguous uint8 array, and their timestamps."""
+        for image in images:
+            data = memoryview(image).cast("B")
+            while data:  # Frames are split between buffers when a buffer fills.
+                n_bytes = min(len(data), self.write_size - self.buffer_used)
+                self.buffer_view[self.buffer_used : self.buffer_used + n_bytes] = data[:n_bytes]
+                self.buffer_used += n_bytes
+                data = data[n_bytes:]
+                if self.buffer_used == self.write_size:
+                    self.flush_buffer()
+                    self.new_buffer()
+        self.timestamps_file.write(np.asarray(timestamps, dtype="<i8").tobytes())
+        self.n_frames += len(images)
+
+    def close(self):
+        """Write the buffered frames, the timestamps and the final header, and truncate the preallocated space."""
+        self.flush_buffer()
+        self.file.truncate(self.buffer_offset)
+        self.file.seek(self.buffer_offset)
+        self.timestamps_file.seek(0)
+        while True:
+            data = self.timestamps_file.read(self.write_size)
+            if not data:
+                break
+            self.write_all(data)
+        self.timestamps_file.close()
+        os.remove(self.timestamps_filepath)
+        self.header["timestamps_offset"] = self.buffer_offset
+        self.write_header()
+        self.file.close()
+
+    # Buffers -------------------------------------------------------------------------
+
+    def new_buffer(self):
+        """Start a write buffer at buffer_offset, a window of the file if memory mapped."""
+        if self.use_mmap:
+            self.preallocate(self.buffer_offset + self.write_size)
+            self.buffer = mmap.mmap(self.file.fileno(), self.write_size, offset=self.buffer_offset)
+        elif self.buffer is None:
+            self.buffer = bytearray(self.write_size)
+        self.buffer_view = memoryview(self.buffer)
+
+    def flush_buffer(self):
+        """Write the used part of the write buffer to the file and update the header frame count."""
+        if self.use_mmap:
+            self.buffer_view.release()
+            self.buffer.close()
+        else:
+            self.preallocate(self.buffer_offset + self.buffer_used)
+            self.file.seek(self.buffer_offset)
+            self.write_all(self.buffer_view[: self.buffer_used])
+        self.buffer_offset += self.buffer_used
+        self.buffer_used = 0
+        self.header["frame_count"] = (self.buffer_offset - ALIGNMENT) // self.frame_size
+        self.write_header()
+
+    def preallocate(self, size):
+        """Extend the file in steps of preallocate_size so it is at least size bytes."""
+        if size <= self.allocated_size:
+            return
+        new_size = self.allocated_size + max(self.preallocate_size, aligned(size - self.allocated_size))
+        try:
+            os.posix_fallocate(self.file.fileno(), self.allocated_size, new_size - self.allocated_size)
+        except (AttributeError, OSError):  # Not available on Windows or on some file systems.
+            self.file.truncate(new_size)
+        self.allocated_size = new_size
+
+    def write_header(self):
+        position = self.file.tell()
+        self.file.seek(0)
+        self.write_all(raw_header(self.header))
+        self.file.seek(position)
+
+    def write_all(self, data):
+        """Write all of data at the current file position, as unbuffered writes may be partial."""
+        data = memoryview(data)
+        while data:
+            data = data[self.file.write(data) :]
+
+
+# -------------------------------------------------------------------------------------
+# Reader
+# -------------------------------------------------------------------------------------
+
+
+def read_raw_header(filepath):
+    """Return the header of a raw video file as a dict."""
+    with open(filepath, "rb") as f:
+        if f.read(len(RAW_MAGIC)) != RAW_MAGIC:
+            raise ValueError(f"{filepath} is not a raw video file.")
+        (header_length,) = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(header_length))
+
+
+def read_raw_video(filepath, mmap=True):
+    """Return the header, frames (n_frames, height, width) and timestamps of a raw video file. The frames are memory
+    mapped unless mmap is False. Timestamps are None if the file was not closed."""
+    header = read_raw_header(filepath)
+    shape = (header["frame_count"], header["height"], header["width"])
+    if mmap and header["frame_count"]:
+        frames = np.memmap(filepath, dtype=np.uint8, mode="r", offset=header["frames_offset"], shape=shape)
+    else:
+        frames = np.fromfile(
+            filepath, dtype=np.uint8, count=header["frame_count"] * header["frame_size"], offset=header["frames_offset"]
+        ).reshape(shape)
+    timestamps = None
+    if header["timestamps_offset"] is not None:
+        timestamps = np.fromfile(filepath, dtype="<i8", count=header["frame_count"], offset=header["timestamps_offset"])
+    return header, frames, timestamps
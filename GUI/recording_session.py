@@ -0,0 +1,255 @@
+import os
+import time
+import threading
+
+from .acquisition_engine import AcquisitionEngine
+from .data_recorder import Data_recorder, gpu_available
+from .camera_sync import SyncService, start_recordings, stop_recordings
+from .gpio_trigger import GPIOTrigger
+from . import startup_timing
+from camera_api import init_camera_apis
+from config.config import default_camera_config
+from config.config_classes import CameraSettingsConfig, ExperimentConfig
+
+# Recording without the GUI. Nothing in this module imports Qt, so it can run on machines with no display.
+
+# -------------------------------------------------------------------------------------
+# Session camera
+# -------------------------------------------------------------------------------------
+
+
+class SessionCamera:
+    """One camera of a recording session: camera API, reader thread and data recorder."""
+
+    def __init__(
+        self, label, subject_id, settings, camera_api, acquisition_engine, ffmpeg_path, ffmpeg_config, recording_config
+    ):
+        self.label = label
+        self.subject_id = subject_id
+        self.settings = settings
+        self.acquisition_engine = acquisition_engine
+        self.camera_api = camera_api
+        self.data_recorder = Data_recorder(self.camera_api, ffmpeg_path, ffmpeg_config, recording_config)
+        self.camera_reader = None
+        self.recording = False
+        self.gpio_trigger = None  # GPIOTrigger starting and stopping recordings while armed.
+        self.save_dir = None
+        self.triggered_recordings = 0  # Recordings started by the GPIO trigger.
+        self.encode_lag = 0.0  # Time (s) taken to write the queued images when recording stopped.
+
+    def begin_capturing(self):
+        """Start streaming from the camera and emptying its buffer from a reader thread."""
+        self.camera_api.set_frame_pool_size(
+            self.acquisition_engine.acquisition_config["reader_queue_size"]
+            + self.data_recorder.recording_config["writer_queue_size"]
+        )
+        self.camera_api.begin_capturing(self.settings)
+        self.camera_reader = self.acquisition_engine.start_reader(
+            self.settings.unique_id, self.camera_api, fps=self.settings.fps
+        )
+
+    def stop_capturing(self):
+        """Stop the reader thread, then the camera."""
+        if self.recording:
+            self.stop_recording()
+        self.acquisition_engine.stop_reader(self.settings.unique_id)
+        self.camera_api.stop_capturing()
+        self.camera_api.close_api()
+
+    def get_recording(self, save_dir):
+        """Return the arguments for camera_sync.start_recordings."""
+        return (self.camera_reader, self.data_recorder, self.subject_id, save_dir, self.settings)
+
+    def start_recording(self, save_dir):
+        if start_recordings([self.get_recording(save_dir)]):
+            self.recording = True
+
+    def stop_recording(self):
+        stop_recordings([(self.camera_reader, self.data_recorder)])
+        self.recording_stopped()
+
+    def recording_stopped(self):
+        self.encode_lag = time.perf_counter() - self.data_recorder.disarm_time
+        self.recording = False
+
+    def write_queued_images(self):
+        """Pass batches queued by the reader thread to the data recorder's writer thread, starting and stopping
+        GPIO triggered recordings at the batches marking the frames the trigger started and stopped at."""
+        for new_images in self.camera_reader.get_batches():
+            trigger = new_images.get("trigger")
+            if trigger == "start":
+                try:
+                    self.data_recorder.start_recording(*self.get_recording(self.save_dir)[2:])
+                    self.data_recorder.metadata["gpio_trigger"] = self.gpio_trigger.rule
+                    self.recording = True
+                    self.triggered_recordings += 1
+                    print(f"GPIO trigger started recording {self.label} to {self.data_recorder.video_filepath}")
+                except Exception as e:
+                    print(f"Error starting GPIO triggered recording of {self.label}: {e}")
+            elif trigger == "stop":
+                if self.recording:
+                    self.data_recorder.stop_recording()
+                    self.recording = False
+            elif self.recording:
+                self.data_recorder.put_images(new_images)
+            else:
+                self.camera_api.release_images(new_images)
+
+    def arm_gpio_trigger(self, save_dir, rule):
+        """Start and stop recording to save_dir when the camera's GPIO inputs meet the trigger rule."""
+        self.save_dir = save_dir
+        self.gpio_trigger = GPIOTrigger(rule)
+        self.camera_reader.arm_gpio_trigger(self.gpio_trigger)
+
+    def disarm_gpio_trigger(self):
+        """Stop starting recordings from GPIO inputs, stopping the current GPIO triggered recording."""
+        self.camera_reader.disarm_gpio_trigger()
+        self.write_queued_images()
+        if self.recording:
+            self.data_recorder.stop_recording()
+            self.recording = False
+        self.gpio_trigger = None
+
+    def get_results(self, recording_time):
+        """Return the frame counts, throughput and bytes written by the recording."""
+        filepaths = self.data_recorder.get_filepaths()
+        return {
+            "label": self.label,
+            "recorded_frames": self.data_recorder.recorded_frames,
+            "dropped_frames": self.data_recorder.dropped_frames,
+            "sustained_fps": self.data_recorder.recorded_frames / recording_time if recording_time else 0.0,
+            "encode_lag": self.encode_lag,
+            "max_encode_lag": self.data_recorder.max_encode_lag,
+            "backpressure_events": len(self.data_recorder.metadata["backpressure_events"]),
+            "writer_dropped_frames": self.data_recorder.writer_dropped_frames,
+            "bytes_written": sum(os.path.getsize(f) for f in filepaths if os.path.exists(f)),
+            **self.camera_reader.get_stats(),
+        }
+
+
+# -------------------------------------------------------------------------------------
+# Recording session
+# -------------------------------------------------------------------------------------
+
+
+class RecordingSession:
+    """Records video, GPIO and metadata from the cameras in an experiment config without the GUI."""
+
+    def __init__(self, experiment_config: ExperimentConfig, camera_settings, application_config):
+        self.experiment_config = experiment_config
+        self.ffmpeg_config = application_config["ffmpeg_config"]
+        self.recording_config = application_config["recording_config"]
+        self.update_rate = application_config["gui_config"]["camera_update_rate"]
+        self.ffmpeg_path = application_config["ffmpeg_path"]
+        self.acquisition_engine = AcquisitionEngine(application_config["acquisition_config"])
+        self.gpio_trigger = application_config["acquisition_config"]["gpio_trigger"]
+        self._stop_event = threading.Event()
+        self.recording_time = None  # Duration (s) of the last recording.
+        self.sync_service = SyncService()
+        # Check for a GPU video encoder while the cameras are initialised.
+        threading.Thread(target=gpu_available, daemon=True).start()
+        # Open the cameras concurrently.
+        camera_configs = experiment_config.cameras[: experiment_config.n_cameras]
+        settings_list = [get_camera_settings_from_label(camera_settings, camera.label) for camera in camera_configs]
+        results = init_camera_apis(
+            settings_list, timeout=application_config["acquisition_config"]["camera_init_timeout"]
+        )
+        self.cameras = []
+        for camera, settings in zip(camera_configs, settings_list):
+            result = results[settings.unique_id]
+            if result["camera_api"] is None:
+                print(f"Unable to open camera {camera.label}: {result['error']}")
+                continue
+            print(f"Opened camera {camera.label} in {result['init_time']:.3f}s")
+            self.cameras.append(
+                SessionCamera(
+                    camera.label,
+                    camera.subject_id,
+                    settings,
+                    result["camera_api"],
+                    self.acquisition_engine,
+                    self.ffmpeg_path,
+                    self.ffmpeg_config,
+                    self.recording_config,
+                )
+            )
+            startup_timing.mark(f"{camera.label} initialised")
+
+    def run(self, duration=None):
+        """Record until duration (seconds) has elapsed, stop() is called or the process is interrupted."""
+        os.makedirs(self.experiment_config.data_dir, exist_ok=True)
+        for camera in self.cameras:
+            camera.begin_capturing()
+        start_time = time.perf_counter()
+        try:
+            if self.gpio_trigger:  # Each camera records when its GPIO inputs meet the rule.
+                for camera in self.cameras:
+                    camera.arm_gpio_trigger(self.experiment_config.data_dir, self.gpio_trigger)
+                print(f"Waiting for GPIO trigger: {self.gpio_trigger}")
+            else:
+                # Recorders are prepared in parallel, then all cameras start recording together.
+                recordings = [camera.get_recording(self.experiment_config.data_dir) for camera in self.cameras]
+                started = start_recordings(recordings)
+                for camera, recording in zip(self.cameras, recordings):
+                    if any(recording is s for s in started):
+                        camera.recording = True
+                        print(f"Recording {camera.label} to {camera.data_recorder.video_filepath}")
+                if self.recording_config["sync_cameras"]:
+                    self.sync_service.start(
+                        self.experiment_config.data_dir,
+                        {camera.label: camera.data_recorder for camera in self.cameras if camera.recording},
+                    )
+            startup_reported = False
+            while not self._stop_event.is_set():
+                if duration is not None and time.perf_counter() - start_time >= duration:
+                    break
+                for camera in self.cameras:
+                    camera.write_queued_images()
+                if not startup_reported and all(camera.camera_reader.frames_read for camera in self.cameras):
+                    startup_timing.mark("first frame all cameras")
+                    startup_timing.report()
+                    startup_reported = True
+                self._stop_event.wait(1 / self.update_rate)
+        except KeyboardInterrupt:
+            print("Recording interrupted.")
+        finally:
+            self.recording_time = time.perf_counter() - start_time
+            for camera in self.cameras:
+                if camera.gpio_trigger:
+                    camera.disarm_gpio_trigger()
+            recording_cameras = [camera for camera in self.cameras if camera.recording]
+            stop_recordings([(camera.camera_reader, camera.data_recorder) for camera in recording_cameras])
+            for camera in recording_cameras:
+                camera.recording_stopped()
+            for camera in self.cameras:
+                camera.stop_capturing()
+            if self.sync_service.data_recorders:
+                self.sync_service.stop()
+        for camera in self.cameras:
+            if self.gpio_trigger and not camera.triggered_recordings:
+                print(f"{camera.label}: not triggered")
+                continue
+            print(
+                f"{camera.label}: recorded {camera.data_recorder.recorded_frames} frames, "
+                f"dropped {camera.data_recorder.dropped_frames} frames"
+                + (f" in the last of {camera.triggered_recordings} recordings" if self.gpio_trigger else "")
+            )
+
+    def stop(self):
+        """Stop the recording from another thread."""
+        self._stop_event.set()
+
+    def get_results(self):
+        """Return per camera results of the last recording."""
+        return [camera.get_results(self.recording_time) for camera in self.cameras]
+
+
+def get_camera_settings_from_label(camera_settings, label) -> CameraSettingsConfig:
+    """Get the settings of the camera whose name or unique ID is label. Cameras with no saved settings
+    are given the default camera settings."""
+    for settings in camera_settings:
+        if label in [settings.name, settings.unique_id]:
+            return settings
+    if "-" not in label:
+        raise ValueError(f"No camera settings found for label: {label}")
+    return CameraSettingsConfig(**{**default_camera_config, "unique_id": label})
@@ -0,0 +1,225 @@
+import os
+import re
+import json
+import bisect
+import numpy as np
+import cv2
+
+from .gpio_log import read_gpio_log
+from .raw_video import read_raw_video
+from .frame_index import read_frame_index
+
+# Reader for recordings made by the data recorder, for analysis. A recording is opened by its file path stem, the
+# path of its files without the suffix, e.g. data/subject_2024-01-01-120000. Frames are read lazily by frame index or
+# timestamp: raw video files are memory mapped and video files are decoded with cv2, seeking only when frames are not
+# read in order. Seeks use the frame index sidecar, if there is one, to decode from the keyframe before the frame.
+# GPIO states and timestamps are returned as numpy arrays, memory mapped for binary (.npy) GPIO files. Timestamps are
+# relative to the first frame of the recording whatever the GPIO file format, as in CSV GPIO files, and are read from
+# the memory mapped frame index if there is one, so CSV GPIO files are only parsed if GPIO states are used.
+
+
+class SessionReader:
+    """Reads the frames, GPIO states, timestamps and metadata of one recording."""
+
+    def __init__(self, filepath_stem):
+        for suffix in ("_metadata.json", "_GPIO_data.npy", "_GPIO_data.csv", ".mp4", ".raw"):
+            if filepath_stem.endswith(suffix):  # Accept the path of any file of the recording.
+                filepath_stem = filepath_stem[: -len(suffix)]
+        # Files of later segments of segmented recordings, or written after a backpressure policy was applied.
+        filepath_stem = re.sub(r"_(seg\d+|part\d+|spill)$", "", filepath_stem)
+        self.filepath_stem = filepath_stem
+        with open(filepath_stem + "_metadata.json", "r") as f:
+            self.metadata = json.load(f)
+        self.segments = self.get_segments()
+        self.segment_first_frames = [segment["first_frame"] for segment in self.segments]
+        self._timestamps = None
+        self._gpio = None
+        self._dropped_frames = None
+        self.frame_index = None  # Frame index sidecar, see frame_index.py.
+        if os.path.isfile(self.filepath_stem + "_frame_index.npy"):
+            self.frame_index = read_frame_index(self.filepath_stem + "_frame_index.npy")
+        # Video file currently open for decoding.
+        self._capture = None
+        self._capture_filepath = None
+        self._capture_position = None  # Index in the video file of the next frame read.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def close(self):
+        """Release the open video file."""
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+            self._capture_filepath = None
+
+    # GPIO and timestamps ---------------------------------------------------------------
+
+    @property
+    def timestamps(self):
+        """Frame timestamps (ns) relative to the first frame of the recording."""
+        if self._timestamps is None:
+            if self.frame_index is not None:
+                self._timestamps = self.frame_index["timestamp"] - self.get_first_timestamp(self.frame_index)
+            else:
+                self.load_gpio_data()
+        return self._timestamps
+
+    @property
+    def gpio(self):
+        """GPIO pin states (n_frames, n_gpio)."""
+        if self._gpio is None:
+            self.load_gpio_data()
+        return self._gpio
+
+    @property
+    def dropped_frames(self):
+        """Frames dropped before each frame, only available for binary GPIO files."""
+        if self._gpio is None:
+            self.load_gpio_data()
+        return self._dropped_frames
+
+    def get_first_timestamp(self, rows):
+        """Return the camera timestamp (ns) of the first frame of the recording, from the metadata, or from rows
+        with a timestamp field for recordings without segments in their metadata."""
+        segments = self.metadata.get("segments")
+        if segments and segments[0]["first_timestamp"] is not None:
+            return segments[0]["first_timestamp"]
+        return int(rows["timestamp"][0]) if len(rows) else 0
+
+    def load_gpio_data(self):
+        """Load the GPIO files, memory mapped if they are binary files. The files of segmented recordings are
+        loaded into memory as one array."""
+        directory = os.path.dirname(self.filepath_stem)
+        gpio_filepaths = [
+            os.path.join(directory, segment["gpio_file"]) for segment in self.metadata.get("segments", [])
+        ]
+        if not gpio_filepaths:
+            gpio_filepaths = [self.filepath_stem + "_GPIO_data.npy"]
+            if not os.path.isfile(gpio_filepaths[0]):
+                gpio_filepaths = [self.filepath_stem + "_GPIO_data.csv"]
+        if gpio_filepaths[0].endswith(".npy"):
+            rows = [read_gpio_log(gpio_filepath) for gpio_filepath in gpio_filepaths]
+            rows = rows[0] if len(rows) == 1 else np.concatenate(rows)
+            if self._timestamps is None:
+                self._timestamps = rows["timestamp"] - self.get_first_timestamp(rows)
+            self._gpio = rows["gpio"]
+            self._dropped_frames = rows["dropped_frames"]
+        else:
+            table = np.concatenate(
+                [
+                    np.loadtxt(gpio_filepath, delimiter=",", skiprows=1, dtype=np.int64, ndmin=2)
+                    for gpio_filepath in gpio_filepaths
+                ]
+            )
+            if self._timestamps is None:
+                self._timestamps = table[:, -1]
+            self._gpio = table[:, :-1].astype(np.uint8)
+
+    def frame_index_at_time(self, timestamp):
+        """Return the index of the last frame with a timestamp at or before timestamp."""
+        return max(int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1, 0)
+
+    # Frames ----------------------------------------------------------------------------
+
+    def get_segments(self):
+        """Return the files the frames were written to, in frame order, as dicts with the file path, the index of
+        the first frame and the file type ("video", "raw" or "raw_spill")."""
+        directory = os.path.dirname(self.filepath_stem)
+        video_files = self.metadata.get("video_files") or [
+            {"filename": os.path.basename(self.filepath_stem) + ".mp4", "first_frame": 0}
+        ]
+        segments = [
+            {
+                "filepath": os.path.join(directory, video_file["filename"]),
+                "first_frame": video_file["first_frame"],
+                "type": "raw" if video_file["filename"].endswith(".raw") else "video",
+            }
+            for video_file in video_files
+        ]
+        if "raw_spill" in self.metadata:
+            raw_spill = self.metadata["raw_spill"]
+            segments.append(
+                {
+                    "filepath": os.path.join(directory, raw_spill["filename"]),
+                    "first_frame": raw_spill["first_frame"],
+                    "type": "raw_spill",
+                    "shape": (raw_spill["height"], raw_spill["width"]),
+                }
+            )
+        return sorted(segments, key=lambda segment: segment["first_frame"])
+
+    def get_frame(self, frame_index):
+        """Return a frame by index. Frames from video files are decoded by cv2 as BGR images at the recorded
+        (downsampled) size, frames from raw files are the camera images, Bayer mosaics for colour cameras."""
+        if not 0 <= frame_index < len(self):
+            raise IndexError(f"Frame {frame_index} out of range for {len(self)} frames.")
+        segment = self.segments[bisect.bisect_right(self.segment_first_frames, frame_index) - 1]
+        index = frame_index - segment["first_frame"]  # Index of the frame in the segment's file.
+        if segment["type"] == "video":
+            keyframe = int(self.frame_index["keyframe"][frame_index]) if self.frame_index is not None else -1
+            return self.read_video_frame(segment["filepath"], index, keyframe)
+        if "frames" not in segment:  # Memory map raw files on first use.
+            if segment["type"] == "raw":
+                segment["frames"] = read_raw_video(segment["filepath"])[1]
+            else:
+                height, width = segment["shape"]
+                n_frames = os.path.getsize(segment["filepath"]) // (height * width)
+                segment["frames"] = np.memmap(segment["filepath"], np.uint8, "r", shape=(n_frames, height, width))
+        return segment["frames"][index]
+
+    def get_frame_at_time(self, timestamp):
+        """Return the frame shown at timestamp, see frame_index_at_time."""
+        return self.get_frame(self.frame_index_at_time(timestamp))
+
+    def read_video_frame(self, filepath, index, keyframe=-1):
+        """Decode a frame from a video file, seeking only if it is not the next frame. If the frame's keyframe is
+        known, seeks go to the keyframe and decode only the frames of its group of pictures up to the frame."""
+        if filepath != self._capture_filepath:
+            self.close()
+            self._capture = cv2.VideoCapture(filepath)
+            self._capture_filepath = filepath
+            self._capture_position = 0
+        if index != self._capture_position:
+            if keyframe < 0:
+                self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            else:
+                # Decode forward from the current position if it is in the frame's group of pictures.
+                if self._capture_position is None or not keyframe <= self._capture_position < index:
+                    self._capture.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+                    self._capture_position = keyframe
+                while self._capture_position < index:
+                    self._capture.grab()
+                    self._capture_position += 1
+        success, frame = self._capture.read()
+        if not success:
+            self._capture_position = None
+            raise IndexError(f"Unable to read frame {index} of {filepath}")
+        self._capture_position = index + 1
+        return frame
+
+    def iter_batches(self, batch_size=100, start=0, stop=None):
+        """Yield batches of consecutive frames as dicts with the frame indices, frames, timestamps and GPIO states,
+        so long recordings can be processed with memory use set by the batch size. Batches are cut at the start of
+        each video or raw file, so the frames of a batch are from one file and have the same shape, see get_frame:
+        (n_frames, height, width, 3) for video files and (n_frames, height, width) for raw files."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        batch_start = start
+        while batch_start < stop:
+            batch_stop = min(batch_start + batch_size, stop)
+            segment_number = bisect.bisect_right(self.segment_first_frames, batch_start)
+            if segment_number < len(self.segment_first_frames):  # Next file starts at a later frame.
+                batch_stop = min(batch_stop, self.segment_first_frames[segment_number])
+            yield {
+                "frame_indices": np.arange(batch_start, batch_stop),
+                "frames": np.stack([self.get_frame(i) for i in range(batch_start, batch_stop)]),
+                "timestamps": np.array(self.timestamps[batch_start:batch_stop]),
+                "gpio": np.array(self.gpio[batch_start:batch_stop]),
+            }
+            batch_start = batch_stop
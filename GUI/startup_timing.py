@@ -0,0 +1,19 @@
+import time
+
+# Times (s) of startup events from when this module was first imported, which the application entry points do before
+# any other imports. Used to measure the time from launch to the first frame of every camera being displayed.
+
+START_TIME = time.perf_counter()
+
+startup_times = {}  # {event: time (s) since START_TIME}, in the order events happened.
+
+
+def mark(event):
+    """Record the time of a startup event, only the first time it happens."""
+    if event not in startup_times:
+        startup_times[event] = time.perf_counter() - START_TIME
+
+
+def report():
+    """Print the startup event times."""
+    print("Startup times (s): " + ", ".join(f"{event}: {t:.3f}" for event, t in startup_times.items()))
@@ -1,9 +1,7 @@
 import os
 import json
 from typing import List
-from dataclasses import dataclass, asdict
-from concurrent.futures import ThreadPoolExecutor
-import threading
+from dataclasses import asdict
 
 from PyQt6.QtWidgets import (
     QVBoxLayout,
@@ -21,17 +19,11 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QIcon
 from PyQt6.QtCore import QTimer, Qt
 
-from .camera_widget import CameraWidget, CameraWidgetConfig
-
-
-@dataclass
-class ExperimentConfig:
-    """Represents the configuration of the VideoCaptureTab."""
-
-    data_dir: str
-    n_cameras: int
-    n_columns: int
-    cameras: list[CameraWidgetConfig]
+from .camera_widget import CameraWidget
+from .camera_sync import SyncService, start_recordings, stop_recordings
+from camera_api import init_camera_apis
+from . import startup_timing
+from config.config_classes import CameraWidgetConfig, ExperimentConfig
 
 
 class VideoCaptureTab(QWidget):
@@ -45,10 +37,6 @@ class VideoCaptureTab(QWidget):
         self.saved_config = None
         self.config_save_path = None
 
-        # Initalise Threadpool & futures
-        self.threadpool = ThreadPoolExecutor(max_workers=32)
-        self.futures = []
-
         # GUI Layout
         self.camera_layout = QGridLayout()
         self.config_groupbox = QGroupBox("Experiment Configuration")
@@ -178,16 +166,21 @@ class VideoCaptureTab(QWidget):
         # Timers
         self.camera_widget_update_timer = QTimer()
         self.camera_widget_update_timer.timeout.connect(self.update_camera_widgets)
-        self.update_counter = 0
+        self.startup_reported = False  # Set once startup times have been reported.
+        self.sync_service = SyncService()  # Camera clock sync while all cameras are recorded together.
 
     # Timer callbacks -----------------------------------------------------------------
 
     def update_camera_widgets(self):
-        """Fetches new images from all cameras, updates video displays every n calls."""
-        self.update_counter = (self.update_counter + 1) % self.GUI.gui_config["camera_updates_per_display_update"]
-        update_video_display = self.update_counter == 0
+        """Fetches new images from all cameras, video displays are updated at the display update rate."""
         for camera_widget in self.camera_widgets:
-            camera_widget.update(update_video_display)
+            camera_widget.update()
+        if not self.startup_reported and all(
+            camera_widget.first_frame_displayed for camera_widget in self.camera_widgets
+        ):
+            startup_timing.mark("first frame all cameras")
+            startup_timing.report()
+            self.startup_reported = True
 
     def refresh(self):
         """Refresh tab"""
@@ -215,13 +208,51 @@ class VideoCaptureTab(QWidget):
             QMessageBox.information(None, "Duplicate Subject IDs", "Duplicate Subject IDs detected.")
             return
 
-        # Begin Recording
+        if self.GUI.acquisition_config["gpio_trigger"]:  # Each camera records when its GPIO inputs meet the rule.
+            for camera_widget in self.camera_widgets:
+                if not camera_widget.arm_gpio_trigger():
+                    return
+            return
+        # Begin Recording, recorders are prepared in parallel then all cameras start recording together.
+        recordings = {}
         for camera_widget in self.camera_widgets:
-            camera_widget.start_recording()
+            recording = camera_widget.get_recording()
+            if recording is None:
+                return
+            recordings[camera_widget] = recording
+        started = start_recordings(list(recordings.values()))
+        started_widgets = [
+            camera_widget for camera_widget, recording in recordings.items() if any(recording is s for s in started)
+        ]
+        for camera_widget in started_widgets:
+            camera_widget.recording_started()
+        if self.GUI.recording_config["sync_cameras"]:
+            self.sync_service.start(
+                self.data_dir,
+                {camera_widget.label: camera_widget.data_recorder for camera_widget in started_widgets},
+            )
 
     def stop_recording(self):
+        """Stop recording from all recording camera widgets together, and disarm GPIO triggers."""
         for camera_widget in self.camera_widgets:
-            camera_widget.stop_recording()
+            if camera_widget.gpio_trigger_armed:
+                camera_widget.disarm_gpio_trigger()
+        recording_widgets = [camera_widget for camera_widget in self.camera_widgets if camera_widget.recording]
+        stop_recordings(
+            [(camera_widget.camera_reader, camera_widget.data_recorder) for camera_widget in recording_widgets]
+        )
+        for camera_widget in recording_widgets:
+            camera_widget.recording_stopped()
+        if self.sync_service.data_recorders:  # Sync data is written once all the cameras have stopped.
+            self.sync_service.stop()
+
+    def camera_recording_stopped(self, camera_widget):
+        """Called when a camera widget's own stop button stops its recording. Writes the sync data once the last
+        camera recorded together has stopped."""
+        if camera_widget.label in self.sync_service.data_recorders:
+            self.sync_service.stop_camera(camera_widget.label)
+            if not self.sync_service.data_recorders:
+                self.sync_service.stop()
 
     # GUI element update functions ----------------------------------------------------
 
@@ -247,20 +278,44 @@ class VideoCaptureTab(QWidget):
             list(set(self.camera_setup_tab.get_camera_labels()) - set(self.get_camera_widget_labels())), key=str.lower
         )
         # Add camera widgets.
-        while self.n_cameras_spinbox.value() > len(self.camera_widgets):
-            if available_cameras:
-                label = available_cameras.pop(0)
-                self.initialise_camera_widget(label=label)
-            else:
-                break
+        n_new_cameras = self.n_cameras_spinbox.value() - len(self.camera_widgets)
+        if n_new_cameras > 0:
+            self.initialise_camera_widgets(
+                [CameraWidgetConfig(label, "") for label in available_cameras[:n_new_cameras]]
+            )
         # Remove camera widgets.
         while self.n_cameras_spinbox.value() < len(self.camera_widgets):
             self.remove_camera_widget(self.camera_widgets.pop())
         self.refresh()
 
-    def initialise_camera_widget(self, label: str, subject_id=None):
+    def initialise_camera_widgets(self, camera_configs: List[CameraWidgetConfig]):
+        """Open the cameras concurrently then create their camera widgets. Cameras that fail to open are reported."""
+        settings_list = [
+            self.camera_setup_tab.get_camera_settings_from_label(camera_config.label)
+            for camera_config in camera_configs
+        ]
+        results = init_camera_apis(settings_list, timeout=self.GUI.acquisition_config["camera_init_timeout"])
+        errors = []
+        for camera_config, settings in zip(camera_configs, settings_list):
+            result = results[settings.unique_id]
+            if result["camera_api"] is None:
+                errors.append(f"{camera_config.label}: {result['error']}")
+                continue
+            self.initialise_camera_widget(camera_config.label, camera_config.subject_id, result["camera_api"])
+        print(
+            "Camera initialisation times (s): "
+            + ", ".join(
+                f"{camera_config.label}: {results[settings.unique_id]['init_time']:.3f}"
+                for camera_config, settings in zip(camera_configs, settings_list)
+                if results[settings.unique_id]["init_time"] is not None
+            )
+        )
+        if errors:
+            QMessageBox.warning(self, "Camera initialisation failed", "\n".join(errors))
+
+    def initialise_camera_widget(self, label: str, subject_id=None, camera_api=None):
         """Create a new camera widget and add it to the tab"""
-        self.camera_widgets.append(CameraWidget(parent=self, label=label, subject_id=subject_id))
+        self.camera_widgets.append(CameraWidget(parent=self, label=label, subject_id=subject_id, camera_api=camera_api))
         position = len(self.camera_widgets) - 1
         n_columns = self.n_columns_spinbox.value()
         self.camera_layout.addWidget(self.camera_widgets[-1], position // n_columns, position % n_columns)
@@ -346,8 +401,7 @@ class VideoCaptureTab(QWidget):
         """Configure tab to match settings in experiment config."""
         self.remove_all_camera_widgets()
         # Initialise camera widgets.
-        for cam_config in experiment_config.cameras:
-            self.initialise_camera_widget(label=cam_config.label, subject_id=cam_config.subject_id)
+        self.initialise_camera_widgets(experiment_config.cameras)
         # Set the values of the spinbox and encoder selection based on config file
         self.n_cameras_spinbox.setValue(experiment_config.n_cameras)
         self.n_columns_spinbox.setValue(experiment_config.n_columns)
@@ -391,7 +445,7 @@ class VideoCaptureTab(QWidget):
         """Update the states of global recording buttons based on the readiness and
         recording status of cameras. Update save button state."""
         all_ready = all(c_w.start_recording_button.isEnabled() for c_w in self.camera_widgets)
-        any_recording = any(camera_widget.recording for camera_widget in self.camera_widgets)
+        any_recording = any(c_w.recording or c_w.gpio_trigger_armed for c_w in self.camera_widgets)
         self.start_recording_button.setEnabled(all_ready)
         self.GUI.start_recording_all_action.setEnabled(all_ready)
         self.stop_recording_button.setEnabled(any_recording)
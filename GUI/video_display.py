@@ -0,0 +1,230 @@
+import numpy as np
+import pyqtgraph as pg
+from PyQt6.QtCore import Qt, QRect, QRectF, QSize
+from PyQt6.QtGui import QImage, QOpenGLContext, QOffscreenSurface, QPaintEngine
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtOpenGL import QOpenGLPixelTransferOptions, QOpenGLTexture, QOpenGLTextureBlitter
+
+# Display backends for camera video:
+# "pyqtgraph": frames are drawn by pg.ImageItem, which converts every frame through its levels and lookup table.
+# "qimage": frames are drawn directly from the preview worker's reused buffers, wrapped as QImages without copying.
+# "opengl": frames are uploaded into a texture kept for the life of the item, which is updated in place when the frame
+# size is unchanged, and drawn scaled by OpenGL in an OpenGL viewport.
+# The opengl backend falls back to qimage if no OpenGL context can be created, and a tile draws its frames as QImages
+# if its texture cannot be used when it is painted. Software OpenGL can be used on machines without a GPU by setting
+# gui_config software_opengl, which is applied by set_opengl_attributes before the QApplication is created.
+
+DISPLAY_BACKENDS = ["pyqtgraph", "qimage", "opengl"]
+
+_opengl_available = None
+
+
+def set_opengl_attributes(gui_config):
+    """Request software OpenGL rendering if set in the gui config. Must be called before the QApplication is
+    created."""
+    if gui_config["software_opengl"]:
+        QApplication.setAttribute(Qt.ApplicationAttribute.AA_UseSoftwareOpenGL)
+
+
+def opengl_available():
+    """Check whether an OpenGL context supporting textures of any size can be created. Requires a QApplication."""
+    global _opengl_available
+    if _opengl_available is None:
+        context = QOpenGLContext()
+        surface = QOffscreenSurface()
+        surface.create()
+        _opengl_available = context.create() and context.makeCurrent(surface)
+        if _opengl_available:
+            _opengl_available = QOpenGLTexture.hasFeature(QOpenGLTexture.Feature.NPOTTextures)
+            context.doneCurrent()
+    return _opengl_available
+
+
+def get_display_backend(display_backend):
+    """Return the display backend to use, falling back to qimage if OpenGL is unavailable."""
+    if display_backend not in DISPLAY_BACKENDS:
+        print(f"Unknown display backend '{display_backend}', using pyqtgraph.")
+        return "pyqtgraph"
+    if display_backend == "opengl" and not opengl_available():
+        print(
+            "OpenGL is not available, using the qimage display backend. Set gui_config software_opengl to True to "
+            "use software OpenGL."
+        )
+        return "qimage"
+    return display_backend
+
+
+def make_image_item(display_backend):
+    """Return the graphics item used to draw video frames with the display backend."""
+    if display_backend == "pyqtgraph":
+        return pg.ImageItem()
+    return TextureFrameItem() if display_backend == "opengl" else FrameItem()
+
+
+# -------------------------------------------------------------------------------------
+# Frame item
+# -------------------------------------------------------------------------------------
+
+
+class FrameItem(pg.GraphicsObject):
+    """Graphics item that draws uint8 mono or BGR frames as QImages wrapping the frame's memory. The frame must not
+    be modified until the next call to setImage, which the preview worker guarantees for the image it last returned."""
+
+    def __init__(self):
+        super().__init__()
+        self.image = None
+        self.qimage = None
+        self.rect = QRectF()
+
+    def setImage(self, image):
+        self.image = image  # Reference kept as the QImage does not own the memory.
+        self.qimage = None  # Made when the frame is painted.
+        if self.rect.isEmpty():
+            self.setRect(0, 0, image.shape[1], image.shape[0])
+        self.update()
+
+    def setRect(self, x, y, width, height):
+        """Set the rectangle in view coordinates the frame is drawn in."""
+        rect = QRectF(x, y, width, height)
+        if rect != self.rect:
+            self.prepareGeometryChange()
+            self.rect = rect
+            self.informViewBoundsChanged()
+
+    def boundingRect(self):
+        return QRectF(self.rect)
+
+    def paint(self, painter, *args):
+        if self.image is None:
+            return
+        if self.qimage is None:
+            image_format = QImage.Format.Format_Grayscale8 if self.image.ndim == 2 else QImage.Format.Format_BGR888
+            self.qimage = pg.functions.ndarray_to_qimage(self.image, image_format)
+        painter.drawImage(self.rect, self.qimage)
+
+
+class TextureFrameItem(FrameItem):
+    """Frame item that draws frames from an OpenGL texture. The texture is allocated when the first frame is painted,
+    or the frame size or colour changes, and frames are otherwise uploaded into it in place, once per frame however
+    often the item is repainted. The frame is drawn as a QImage instead if the item is not painted in an OpenGL
+    viewport, the view is rotated or flipped, or the texture cannot be created."""
+
+    def __init__(self):
+        super().__init__()
+        self.context = None  # OpenGL context the texture and blitter belong to.
+        self.texture = None
+        self.texture_format = None  # (mono, pixel format) of the frames in the texture.
+        self.blitter = None
+        self.texture_current = False  # True if the texture holds the current frame.
+        self.use_texture = True
+        self.transfer_options = QOpenGLPixelTransferOptions()
+        self.transfer_options.setAlignment(1)  # Frame rows are not padded to 4 bytes.
+
+    def setImage(self, image):
+        super().setImage(np.ascontiguousarray(image))
+        self.texture_current = False
+
+    def paint(self, painter, *args):
+        if self.image is None:
+            return
+        transform = painter.deviceTransform()
+        if (
+            not self.use_texture
+            or painter.paintEngine().type() != QPaintEngine.Type.OpenGL2
+            or transform.m12() != 0
+            or transform.m21() != 0
+            or transform.m11() <= 0
+            or transform.m22() <= 0
+        ):
+            return super().paint(painter, *args)
+        painter.beginNativePainting()
+        try:
+            if self.make_texture():
+                self.draw_texture(painter, transform)
+        finally:
+            painter.endNativePainting()
+        if not self.use_texture:  # Texture could not be created, draw this frame as a QImage.
+            super().paint(painter, *args)
+
+    def make_texture(self):
+        """Create the texture and blitter in the current context if needed and upload the frame. Returns False, and
+        stops the item using textures, if they cannot be created."""
+        context = QOpenGLContext.currentContext()
+        height, width = self.image.shape[:2]
+        mono = self.image.ndim == 2
+        if context is not self.context:  # Resources of a previous context are released with it.
+            self.context, self.texture, self.blitter = context, None, None
+        if self.blitter is None:
+            self.blitter = QOpenGLTextureBlitter()
+            if not self.blitter.create():
+                return self.stop_using_texture("Unable to create an OpenGL texture blitter")
+        if self.texture is not None and (
+            self.texture.width() != width or self.texture.height() != height or self.texture_format[0] != mono
+        ):
+            self.texture.destroy()
+            self.texture = None
+        if self.texture is None:
+            self.texture = QOpenGLTexture(QOpenGLTexture.Target.Target2D)
+            if mono and QOpenGLTexture.hasFeature(QOpenGLTexture.Feature.Swizzle):
+                pixel_format = QOpenGLTexture.PixelFormat.Red
+                self.texture.setFormat(QOpenGLTexture.TextureFormat.R8_UNorm)
+            elif mono:
+                pixel_format = QOpenGLTexture.PixelFormat.Luminance
+                self.texture.setFormat(QOpenGLTexture.TextureFormat.LuminanceFormat)
+            else:
+                pixel_format = QOpenGLTexture.PixelFormat.BGR
+                self.texture.setFormat(QOpenGLTexture.TextureFormat.RGB8_UNorm)
+            self.texture_format = (mono, pixel_format)
+            self.texture.setSize(width, height)
+            self.texture.setMipLevels(1)
+            self.texture.setMinMagFilters(QOpenGLTexture.Filter.Linear, QOpenGLTexture.Filter.Linear)
+            self.texture.setWrapMode(QOpenGLTexture.WrapMode.ClampToEdge)
+            if not self.texture.create():
+                return self.stop_using_texture("Unable to create an OpenGL texture")
+            if pixel_format == QOpenGLTexture.PixelFormat.Red:  # Draw mono frames as grey, not red.
+                red, one = QOpenGLTexture.SwizzleValue.RedValue, QOpenGLTexture.SwizzleValue.OneValue
+                self.texture.setSwizzleMask(red, red, red, one)
+            self.texture.allocateStorage(pixel_format, QOpenGLTexture.PixelType.UInt8)
+            self.texture_current = False
+        if not self.texture_current:
+            self.texture.setData(
+                self.texture_format[1], QOpenGLTexture.PixelType.UInt8, self.image, self.transfer_options
+            )
+            self.texture_current = True
+        return True
+
+    def draw_texture(self, painter, transform):
+        """Draw the part of the texture inside the painter's clip region, scaled to the item's rectangle."""
+        visible_rect = QRectF(self.rect)
+        if painter.hasClipping():
+            visible_rect = visible_rect.intersected(painter.clipBoundingRect())
+        if visible_rect.isEmpty():
+            return
+        # Part of the texture (pixels) and of the viewport (device coordinates) the visible rectangle covers.
+        x_scale = self.texture.width() / self.rect.width()
+        y_scale = self.texture.height() / self.rect.height()
+        source_rect = QRectF(
+            (visible_rect.x() - self.rect.x()) * x_scale,
+            (visible_rect.y() - self.rect.y()) * y_scale,
+            visible_rect.width() * x_scale,
+            visible_rect.height() * y_scale,
+        )
+        target_rect = transform.mapRect(visible_rect)
+        viewport = QRect(0, 0, painter.device().width(), painter.device().height())
+        self.blitter.bind()
+        self.blitter.blit(
+            self.texture.textureId(),
+            QOpenGLTextureBlitter.targetTransform(target_rect, viewport),
+            QOpenGLTextureBlitter.sourceTransform(
+                source_rect,
+                QSize(self.texture.width(), self.texture.height()),
+                QOpenGLTextureBlitter.Origin.OriginTopLeft,
+            ),
+        )
+        self.blitter.release()
+
+    def stop_using_texture(self, message):
+        print(f"{message}, drawing frames as QImages.")
+        self.use_texture = False
+        self.texture = None
+        return False
@@ -1,76 +1,116 @@
-import os
+import time
 import importlib
 import pkgutil
+import threading
+from concurrent.futures import Future, wait
 
 from .generic_camera import GenericCamera
 
-# Get the directory of this __init__.py file
-current_directory = os.path.dirname(__file__)
+# Camera modules are listed by name without importing them. A module, and the camera SDK it uses, is only imported
+# and checked for the required functions when it is first used.
 
-# Loop through all files in the directory
-for file_name in os.listdir(current_directory):
-    if file_name.endswith(".py") and file_name != "__init__.py" and file_name != "generic_camera.py":
-        # Remove the '.py' extension to get the module name
-        module_name = file_name[:-3]
-        installed_modules = []
+CAMERA_MODULE_NAMES = [name for _, name, _ in pkgutil.iter_modules(__path__) if name != "generic_camera"]
+
+_camera_modules = {}  # {module_name: module or None if the module's dependencies are not installed}
+
+
+def validate_camera_module(module):
+    """Check the expected functions and classes exist in a module in the camera package."""
+    if hasattr(module, "list_available_cameras") is False:
+        print(f"Error: {module} does not have the function 'list_available_cameras. \
+                This is a requirment of all modules in the camera package.")
+    if hasattr(module, "initialise_camera_api") is False:
+        print(f"Error: {module} does not have the function 'initialise_camera_api. \
+                This is a requirment of all modules in the camera package.")
+    # Check if the module has a class with the inheritance from GenericCamera
+    for attribute in vars(module).values():
+        if isinstance(attribute, type) and issubclass(attribute, GenericCamera) and attribute is not GenericCamera:
+            break
+    else:
+        print(f"Error: {module} does not have a class inheriting from 'GenericCamera'. \
+                This is a requirment of all modules in the camera package.")
+
+
+def get_camera_module(module_name):
+    """Import and validate a camera module on first use. Returns None if its dependencies are not installed."""
+    if module_name not in _camera_modules:
         try:
-            # Import the module
-            module = importlib.import_module(f".{module_name}", package=__name__)
-            installed_modules.append(module)
+            module = importlib.import_module(f"camera_api.{module_name}")
+            validate_camera_module(module)
         except ModuleNotFoundError:
-            continue
-
-        # Check if the expected functions and classes exist in every python module in the camera package
-        if hasattr(module, "list_available_cameras") is False:
-            print(
-                f"Error: {module} does not have the function 'list_available_cameras. \
-                    This is a requirment of all modules in the camera package."
-            )
-        if hasattr(module, "initialise_camera_api") is False:
-            print(
-                f"Error: {module} does not have the function 'initialise_camera_api. \
-                    This is a requirment of all modules in the camera package."
-            )
-
-        # Check if the module has a class with the inheritance from GenericCamera
-        for attribute_name in dir(module):
-            attribute = getattr(module, attribute_name)
-            if isinstance(attribute, type) and issubclass(attribute, GenericCamera) and attribute is not GenericCamera:
-                break
-        else:
-            print(
-                f"Error: {module} does not have a class inheriting from 'GenericCamera'. \
-                    This is a requirment of all modules in the camera package."
-            )
+            module = None
+        _camera_modules[module_name] = module
+    return _camera_modules[module_name]
 
-### Functions for initialising camera API -----------------------------------------------------------------------------
 
+### Functions for initialising camera API -----------------------------------------------------------------------------
 
-def get_camera_ids():
-    """Get a list of unique camera IDs for all the different types of cameras connected to the machine."""
-    # for each module in the camera class, run the get unique ids function
 
-    package = importlib.import_module("camera_api")
-    package_path = package.__path__  # Get the package's path
+def get_camera_modules():
+    """Get the camera modules whose dependencies are installed."""
+    modules = [get_camera_module(module_name) for module_name in CAMERA_MODULE_NAMES]
+    return [module for module in modules if module is not None]
 
-    modules = []
-    for _, module_name, _ in pkgutil.iter_modules(package_path):
-        modules.append(module_name)
 
+def get_camera_ids():
+    """Get a list of unique camera IDs for all the different types of cameras connected to the machine."""
     camera_list = []
-    for module in modules:
-        # Get the module
-        try:
-            camera_module = importlib.import_module(f"camera_api.{module}")
-            # Get the list of cameras as a string.
-            camera_list.extend(camera_module.list_available_cameras())
-        except ModuleNotFoundError:
-            continue
+    for camera_module in get_camera_modules():
+        # Get the list of cameras as a string.
+        camera_list.extend(camera_module.list_available_cameras())
     return camera_list, not len(camera_list) == 0
 
 
 def init_camera_api_from_module(settings):
     """Initialise a camera API object given the camera ID and any camera settings."""
     _, module_name = settings.unique_id.split("-")
-    camera_module = importlib.import_module(f"camera_api.{module_name}")
+    camera_module = get_camera_module(module_name)
+    if camera_module is None:
+        raise ModuleNotFoundError(f"Dependencies of camera module '{module_name}' are not installed.")
     return camera_module.initialise_camera_api(CameraConfig=settings)
+
+
+def init_camera_apis(settings_list, timeout=None):
+    """Initialise the camera APIs for a list of camera settings concurrently. Returns a dict {unique_id: result},
+    where result is a dict with the camera API (None if initialisation failed or timed out), the error message and
+    the initialisation time (s). Each camera is opened on a daemon thread. A camera that times out is abandoned: its
+    thread is left running, does not prevent the program exiting, and closes the camera if it finishes opening."""
+    if not settings_list:
+        return {}
+    futures = {}
+    for settings in settings_list:
+        future = Future()
+        threading.Thread(target=_init_camera_api_thread, args=(settings, future), daemon=True).start()
+        futures[future] = settings
+    done, _ = wait(futures, timeout)
+    results = {}
+    for future, settings in futures.items():
+        if future in done:
+            results[settings.unique_id] = future.result()
+        else:
+            results[settings.unique_id] = {
+                "camera_api": None,
+                "error": f"Timed out after {timeout}s",
+                "init_time": None,
+            }
+            future.add_done_callback(_close_timed_out_camera_api)
+    return results
+
+
+def _init_camera_api_thread(settings, future):
+    future.set_result(_init_camera_api_timed(settings))
+
+
+def _init_camera_api_timed(settings):
+    start_time = time.perf_counter()
+    try:
+        camera_api, error = init_camera_api_from_module(settings), None
+    except Exception as e:
+        camera_api, error = None, f"{type(e).__name__}: {e}"
+    return {"camera_api": camera_api, "error": error, "init_time": time.perf_counter() - start_time}
+
+
+def _close_timed_out_camera_api(future):
+    camera_api = future.result()["camera_api"]
+    if camera_api is not None:
+        camera_api.close_api()
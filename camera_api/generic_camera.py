@@ -2,8 +2,53 @@
 Generic API defining functionality needed for for camera system to interact with the GUI.
 """
 
-from collections import OrderedDict
+import threading
+from collections import OrderedDict, deque
 import cv2
+import numpy as np
+
+# FramePool class -----------------------------------------------------------------------
+
+
+class FramePool:
+    """Fixed number of preallocated image buffers that camera APIs copy images into. Slots are reference
+    counted so an image buffer is only reused once every consumer of the image has released it. Free slots are
+    reused most recently released first, so only the slots needed to hold the images in use are written to and
+    the memory of the rest of the pool is not touched."""
+
+    def __init__(self, n_slots: int, frame_size: int):
+        self.frame_size = frame_size  # Bytes per image.
+        self.frames = np.zeros((n_slots, frame_size), dtype=np.uint8)
+        self.ref_counts = np.zeros(n_slots, dtype=np.int32)
+        self.free_slots = deque(range(n_slots))
+        self._lock = threading.Lock()
+
+    def acquire(self) -> int:
+        """Return the index of a free slot, or None if all slots are in use."""
+        with self._lock:
+            if not self.free_slots:
+                return None
+            slot = self.free_slots.pop()
+            self.ref_counts[slot] = 1
+            return slot
+
+    def retain(self, slots) -> None:
+        """Add a reference to slots that are already in use."""
+        with self._lock:
+            self.ref_counts[slots] += 1
+
+    def release(self, slots) -> None:
+        """Remove a reference to slots, slots with no references left are returned to the pool."""
+        with self._lock:
+            for slot in np.atleast_1d(slots):
+                self.ref_counts[slot] -= 1
+                if self.ref_counts[slot] == 0:
+                    self.free_slots.append(slot)
+
+    def n_free(self) -> int:
+        """Number of slots available for new images."""
+        return len(self.free_slots)
+
 
 # GenericCamera class -------------------------------------------------------------------
 
@@ -19,6 +64,12 @@ class GenericCamera:
         self.device_model = "GenericCameraModel"  # Replace with the camera model name to be recorded in metadata.
         self.N_GPIO = 3  # Number of pins that the camera records each frame.
         self.BUFFER_SIZE = 100
+        self.frame_pool = None  # Preallocated image buffers, created when capturing begins.
+        self.frame_pool_size = None  # Number of frame pool slots, see set_frame_pool_size.
+        # Dropped frame detection, see get_frame_gaps. Reset to None when capturing begins.
+        self.previous_frame_number = None  # Camera frame counter of the last frame read.
+        self.previous_timestamp = None  # Timestamp (ns) of the last frame read.
+        self.inter_frame_interval = None  # Time between frames (ns), for cameras without a frame counter.
         self.trigger_line = None  # Name of the line which will be used to trigger external acqusition
         self.manual_control_enabled = (
             False  # If true, there is manual control available for the camera (gain / exposure time)
@@ -114,21 +165,86 @@ class GenericCamera:
         Important notes:
         1. This function must empty the buffer to make sure that no frames are dropped from the recording.
         2. This function time stamps from this function are used to calculate if the frames are being aquired too slowly such that there is a risk of dropping frames
+        3. Image data must be copied into a slot of the frame pool (see allocate_frame_pool) and the batch
+           returned with get_image_batch. If the frame pool is full, images are left in the camera buffer.
+        4. The camera frame counter of each image should be put in batch_frame_numbers, or -1 if the camera has no
+           frame counter, in which case dropped frames are found from the timestamps (see get_frame_gaps).
 
         Returns:
             {
-            'images' : img_buffer - a list of images (as numpy byte arrays)
-            'gpio_data' : gpio_buffer - a corresponding list of gpio data for each of the frames
-            'timestamps : timestamps_buffer - a corresponding list of timestampes for each frame
+            'images' : a list of images (views of frame pool slots as 1D numpy uint8 arrays)
+            'frame_indices' : array of the frame pool slots holding the images
+            'frame_pool' : the FramePool holding the images
+            'gpio_data' : array (n_images, N_GPIO) of gpio data for each of the frames
+            'timestamps : array of timestamps for each frame (nanoseconds)
+            'frame_gaps' : array of the number of frames dropped before each frame
             'dropped_frames': the number of dropped frames found (can be calculayted or a camera attributed)
             }:
         """
+        return self.get_image_batch(n_images=0)
+
+    # Frame pool ----------------------------------------------------------------------------------------------
+
+    def set_frame_pool_size(self, n_queued_frames: int) -> None:
+        """Size the frame pool to hold n_queued_frames waiting in the reader and writer queues, as well as a batch
+        being read and the latest image kept for display. Takes effect when capturing next begins."""
+        self.frame_pool_size = n_queued_frames + self.BUFFER_SIZE + 1
+
+    def allocate_frame_pool(self) -> None:
+        """Preallocate image buffers for frame_pool_size images, at least BUFFER_SIZE, and arrays for the batch data
+        returned by get_available_images. Called when capturing begins, the pool is only reallocated if the image
+        size or pool size changed."""
+        frame_size = self.get_width() * self.get_height()
+        n_slots = max(self.BUFFER_SIZE, self.frame_pool_size or 0)
+        if (
+            self.frame_pool is not None
+            and self.frame_pool.frame_size == frame_size
+            and len(self.frame_pool.frames) == n_slots
+        ):
+            return
+        self.frame_pool = FramePool(n_slots, frame_size)
+        self.batch_frame_indices = np.zeros(self.BUFFER_SIZE, dtype=np.intp)
+        self.batch_timestamps = np.zeros(self.BUFFER_SIZE, dtype=np.int64)
+        self.batch_frame_numbers = np.full(self.BUFFER_SIZE, -1, dtype=np.int64)  # Camera frame counter values.
+        self.batch_gpio_data = np.zeros((self.BUFFER_SIZE, self.N_GPIO), dtype=np.uint8)
+
+    def get_image_batch(self, n_images: int) -> dict:
+        """Return the first n_images entries of the batch arrays as the dictionary returned by get_available_images."""
+        frame_indices = self.batch_frame_indices[:n_images].copy()
+        frame_gaps = self.get_frame_gaps(n_images)
         return {
-            "images": img_buffer,
-            "gpio_data": gpio_buffer,
-            "timestamps": timestamps_buffer,
+            "images": [self.frame_pool.frames[slot] for slot in frame_indices],
+            "frame_indices": frame_indices,
+            "frame_pool": self.frame_pool,
+            "gpio_data": self.batch_gpio_data[:n_images].copy(),
+            "timestamps": self.batch_timestamps[:n_images].copy(),
+            "frame_gaps": frame_gaps,
+            "dropped_frames": int(frame_gaps.sum()),
         }
 
+    def get_frame_gaps(self, n_images: int) -> np.ndarray:
+        """Return the number of frames dropped before each of the first n_images frames of the batch, from gaps in
+        the camera frame counter, or from gaps in the timestamps if the camera has no frame counter."""
+        if n_images == 0:
+            return np.zeros(0, dtype=np.int64)
+        frame_numbers = self.batch_frame_numbers[:n_images]
+        timestamps = self.batch_timestamps[:n_images]
+        if frame_numbers[0] >= 0:
+            previous = frame_numbers[0] - 1 if self.previous_frame_number is None else self.previous_frame_number
+            frame_gaps = np.diff(frame_numbers, prepend=previous) - 1
+        elif self.inter_frame_interval:
+            previous = timestamps[0] if self.previous_timestamp is None else self.previous_timestamp
+            frame_gaps = np.rint(np.diff(timestamps, prepend=previous) / self.inter_frame_interval).astype(np.int64) - 1
+        else:
+            frame_gaps = np.zeros(n_images, dtype=np.int64)
+        self.previous_frame_number = int(frame_numbers[-1])
+        self.previous_timestamp = int(timestamps[-1])
+        return np.maximum(frame_gaps, 0)  # Negative after the frame counter is reset.
+
+    def release_images(self, new_images) -> None:
+        """Return the frame pool slots of a batch of images once they are no longer needed."""
+        new_images["frame_pool"].release(new_images["frame_indices"])
+
 
 # Camera system utility functions -------------------------------------------------------
 
@@ -0,0 +1,218 @@
+import time
+import cv2
+import numpy as np
+from collections import OrderedDict
+
+from . import GenericCamera
+from config.config import simulated_camera_config
+
+# Virtual cameras for testing and benchmarking without camera hardware. The number of cameras and the images
+# they generate are set by simulated_camera_config in config/config.py.
+
+BAR_POSITIONS = 32  # Number of positions of the moving bar drawn on the images, repeated in a loop.
+
+
+class SimulatedCamera(GenericCamera):
+    """Inherits from the camera class and generates images in software at the configured frame rate."""
+
+    def __init__(self, CameraConfig=None):
+        super().__init__(self)
+        self.unique_id = CameraConfig.unique_id
+        self.config = simulated_camera_config
+
+        # Options for camera -----------------------------------------------------------
+
+        self.serial_number, self.api = self.unique_id.split("-")
+        self.device_model = "SimulatedCamera"
+        self.N_GPIO = 3
+        self.manual_control_enabled = True
+        self.trigger_line = 2
+        self.rng = np.random.default_rng(self.config["seed"] + int(self.serial_number))
+        available_formats = OrderedDict(
+            [
+                ("Mono", {"Internal": "Mono8", "ffmpeg": "gray", "cv2": cv2.COLOR_GRAY2BGR}),
+                ("Colour", {"Internal": "BayerRG8", "ffmpeg": "bayer_rggb8", "cv2": cv2.COLOR_BayerRG2BGR}),
+            ]
+        )
+        self.pixel_format_map = OrderedDict([(fmt, available_formats[fmt]) for fmt in self.config["pixel_formats"]])
+        self.pixel_format = next(iter(self.pixel_format_map))
+        self.width = self.config["width"]
+        self.height = self.config["height"]
+        self.fps = 60
+        self.exposure_time = 15000
+        self.gain = 0
+        self.external_trigger = False
+        self.capturing = False
+        # Each camera's clock starts at a different time, as for real cameras.
+        self.clock_offset = int(self.rng.integers(0, 10**12))
+
+        # Configure user settings.
+        if CameraConfig is not None:
+            self.configure_settings(CameraConfig)
+
+    # Functions to get the camera parameters ----------------------------------------------
+
+    def get_width(self) -> int:
+        """Get the width of the camera image in pixels."""
+        return self.width
+
+    def get_height(self) -> int:
+        """Get the height of the camera image in pixels."""
+        return self.height
+
+    def get_frame_rate(self) -> int:
+        """Get the camera frame rate in Hz."""
+        return self.fps
+
+    def get_frame_rate_range(self, *exposure_time) -> tuple[int, int]:
+        """Get the min and max frame rate (Hz)."""
+        return 1, 1000
+
+    def get_exposure_time(self) -> float:
+        """Get exposure of camera"""
+        return float(self.exposure_time)
+
+    def get_exposure_time_range(self, *fps) -> tuple[int, int]:
+        """Get the min and max exposure time (us)"""
+        return 7, int(1e6 / int(fps[0] if fps else self.fps))
+
+    def get_gain(self) -> int:
+        """Get camera gain setting in dB."""
+        return self.gain
+
+    def get_gain_range(self) -> tuple[int, int]:
+        """Get range of gain"""
+        return 0, 30
+
+    def get_pixel_format(self) -> str:
+        """Get string specifying camera pixel format"""
+        return self.pixel_format_map[self.pixel_format]["Internal"]
+
+    def get_available_pixel_fmt(self) -> list[str]:
+        """Gets a string of the pixel formats available to the camera"""
+        return [fmt["Internal"] for fmt in self.pixel_format_map.values()]
+
+    # Functions to set camera parameters --------------------------------------------------
+
+    def configure_settings(self, CameraConfig):
+        """Configure all settings from CameraConfig."""
+        self.set_acqusition_mode(CameraConfig.external_trigger)
+        self.set_frame_rate(CameraConfig.fps)
+        self.set_gain(CameraConfig.gain)
+        self.set_exposure_time(CameraConfig.exposure_time)
+        if CameraConfig.pixel_format in self.pixel_format_map:
+            self.set_pixel_format(CameraConfig.pixel_format)
+
+    def set_frame_rate(self, frame_rate):
+        """Set the frame rate of the camera in Hz."""
+        self.fps = int(frame_rate)
+        if self.capturing:  # Frame times are counted from the last frame rate change.
+            self.start_capture_clock()
+
+    def set_exposure_time(self, exposure_time: float) -> None:
+        """Set the exposure time of the camera in microseconds."""
+        self.exposure_time = float(exposure_time)
+
+    def set_gain(self, gain: float):
+        """Set gain (dB)"""
+        self.gain = float(gain)
+
+    def set_pixel_format(self, pixel_format: str):
+        """Set the pixel format, either the pixel format name (e.g. 'Mono') or the camera's internal name."""
+        for name, fmt in self.pixel_format_map.items():
+            if pixel_format in (name, fmt["Internal"]):
+                self.pixel_format = name
+
+    def set_acqusition_mode(self, external_trigger: bool):
+        """Configuriung the acqusition mode of the camera. Triggers are simulated at the camera frame rate."""
+        self.external_trigger = external_trigger
+
+    # Functions to control the camera streaming and check status.
+
+    def begin_capturing(self, CameraConfig=None) -> None:
+        """Start generating images."""
+        if CameraConfig:
+            self.configure_settings(CameraConfig)
+        self.allocate_frame_pool()
+        self.background = self.rng.integers(0, 64, self.width * self.height, dtype=np.uint8)
+        self.start_capture_clock()
+        self.capturing = True
+
+    def stop_capturing(self) -> None:
+        """Stop generating images."""
+        self.capturing = False
+
+    def close_api(self):
+        """Release resources."""
+        self.stop_capturing()
+
+    def start_capture_clock(self):
+        """Set the time of the first frame and reset the frame counter."""
+        self.capture_start_time = time.perf_counter()
+        self.capture_start_timestamp = self.clock_offset + time.perf_counter_ns()
+        self.next_frame = 0  # Number of frames since capture start that have been taken from the buffer.
+        self.previous_frame_number = -1
+
+    def write_image(self, image, frame_number):
+        """Write the image for a frame into a frame pool slot, a bright bar moving across a noisy background."""
+        image[:] = self.background
+        bar_width = max(1, self.width // BAR_POSITIONS)
+        bar_start = (frame_number % BAR_POSITIONS) * bar_width
+        image.reshape(self.height, self.width)[:, bar_start : bar_start + bar_width] = 255
+
+    def get_gpio_state(self, frame_numbers):
+        """Return the GPIO pin states (n_frames, N_GPIO) for the given frame numbers."""
+        period = self.config["gpio_period"]
+        pins = np.arange(self.N_GPIO)
+        if self.config["gpio_pattern"] == "counter":  # Pins show the bits of a counter incremented every period.
+            return ((frame_numbers[:, None] // period) >> pins) & 1
+        elif self.config["gpio_pattern"] == "pulse":  # Pin i goes high for one frame, i frames into each period.
+            return (frame_numbers[:, None] % period == pins).astype(np.uint8)
+        return np.zeros((len(frame_numbers), self.N_GPIO), dtype=np.uint8)
+
+    def get_available_images(self):
+        """Gets all images generated since the last call and return images GPIO pinstate data and timestamps."""
+        if not self.capturing:
+            return
+        generated_frames = int((time.perf_counter() - self.capture_start_time) * self.fps)
+        # Frames that did not fit in the camera buffer are lost.
+        lost_frames = max(0, generated_frames - self.next_frame - self.BUFFER_SIZE)
+        self.next_frame += lost_frames
+        n_available = min(generated_frames - self.next_frame, self.frame_pool.n_free())
+        if n_available <= 0:
+            return
+        frame_numbers = np.arange(self.next_frame, self.next_frame + n_available)
+        self.next_frame += n_available
+        # Frames dropped by the camera.
+        if self.config["drop_probability"]:
+            frame_numbers = frame_numbers[self.rng.random(n_available) >= self.config["drop_probability"]]
+        n_images = len(frame_numbers)
+        if n_images == 0:
+            return
+        for i, frame_number in enumerate(frame_numbers):
+            slot = self.frame_pool.acquire()
+            self.write_image(self.frame_pool.frames[slot], frame_number)
+            self.batch_frame_indices[i] = slot
+        timestamps = self.capture_start_timestamp + (frame_numbers * 1e9 / self.fps).astype(np.int64)
+        if self.config["timestamp_jitter"]:
+            timestamps += self.rng.normal(0, self.config["timestamp_jitter"], n_images).astype(np.int64)
+        self.batch_timestamps[:n_images] = timestamps
+        self.batch_gpio_data[:n_images] = self.get_gpio_state(frame_numbers)
+        self.batch_frame_numbers[:n_images] = frame_numbers  # Dropped frames are found from gaps in frame numbers.
+        return self.get_image_batch(n_images)
+
+
+# Camera system functions -------------------------------------------------------------------------------
+
+
+def list_available_cameras(VERBOSE=False) -> list[str]:
+    """Return the unique IDs of the virtual cameras set by simulated_camera_config["n_cameras"]"""
+    unique_id_list = [f"{i:08d}-simulated" for i in range(simulated_camera_config["n_cameras"])]
+    if VERBOSE:
+        print(f"Number of cameras detected: {len(unique_id_list)}")
+    return unique_id_list
+
+
+def initialise_camera_api(CameraConfig):
+    """Instantiate the SimulatedCamera object"""
+    return SimulatedCamera(CameraConfig=CameraConfig)
@@ -1,5 +1,6 @@
 import PySpin
 import cv2
+import numpy as np
 from collections import OrderedDict
 from math import floor, ceil
 from . import GenericCamera
@@ -7,6 +8,14 @@ from . import GenericCamera
 
 PYSPINSYSTEM = PySpin.System.GetInstance()  # One PySpin system instance per pMV
 
+# Bits of the line status that give the state of each recorded GPIO pin, by device model. Models not listed use
+# "default", which reads the ExposureEndLineStatusAll chunk. Chameleon3 cameras embed the line status in byte 32,
+# and the frame counter in bytes 24-27, of the image data.
+GPIO_PIN_BITS = {
+    "default": [0, 2, 3],
+    "Chameleon3": [4, 5, 7],
+}
+
 
 class SpinnakerCamera(GenericCamera):
     """Inherits from the camera class and adds the spinnaker specific functions from the PySpin library"""
@@ -18,7 +27,6 @@ class SpinnakerCamera(GenericCamera):
         # Options for camera -----------------------------------------------------------
 
         self.serial_number, self.api = self.unique_id.split("-")
-        self.N_GPIO = 3  # Number of GPIO pins
         self.manual_control_enabled = True
         self.trigger_line = 2  # Trigger line name
         self.previous_frame_number = 0
@@ -28,6 +36,8 @@ class SpinnakerCamera(GenericCamera):
             (cam for cam in self.cam_list if cam.TLDevice.DeviceSerialNumber.GetValue() == self.serial_number), None
         )
         self.device_model = self.cam.TLDevice.DeviceModelName.GetValue()[:10]
+        self.gpio_pin_bits = np.array(GPIO_PIN_BITS.get(self.device_model, GPIO_PIN_BITS["default"]))
+        self.N_GPIO = len(self.gpio_pin_bits)  # Number of GPIO pins
         self.cam.Init()
         self.nodemap = self.cam.GetNodeMap()
         self.stream_nodemap = self.cam.GetTLStreamNodeMap()
@@ -266,8 +276,10 @@ class SpinnakerCamera(GenericCamera):
             self.cam.Init()
         if not self.cam.IsStreaming():
             self.cam.BeginAcquisition()
-        self.frame_timestamp = None
-        self.previous_frame_number = 0
+        self.allocate_frame_pool()
+        self.batch_line_status = np.zeros(self.BUFFER_SIZE, dtype=np.int64)  # Raw line status of each frame.
+        self.previous_frame_number = None
+        self.previous_timestamp = None
 
         if CameraConfig:
             self.configure_settings(CameraConfig)
@@ -287,73 +299,65 @@ class SpinnakerCamera(GenericCamera):
 
     def get_available_images(self):
         """Gets all available images from the buffer and return images GPIO pinstate data and timestamps."""
-        img_buffer = []
-        timestamps_buffer = []
-        gpio_buffer = []
-        dropped_frames = 0
+        n_images = 0
 
-        try:
-            while True:
+        while n_images < self.BUFFER_SIZE:
+            slot = self.frame_pool.acquire()
+            if slot is None:  # Frame pool full, leave remaining images in the camera buffer.
+                break
+            try:
                 next_image = self.cam.GetNextImage(0)  # Raises exception if buffer empty.
-                img_buffer.append(next_image.GetData())  # Image pixels as bytes.
-                chunk_data = next_image.GetChunkData()  # Additional image data.
-                timestamps_buffer.append(chunk_data.GetTimestamp())  # Image timestamp (nanoseconds)
-                # Frame timestamps
-                if self.frame_timestamp is None:
-                    self.frame_timestamp = timestamps_buffer[-1]
-                else:
-                    elapsed_frames = round((timestamps_buffer[-1] - self.frame_timestamp) / self.inter_frame_interval)
-                    self.frame_timestamp = timestamps_buffer[-1]
-                    dropped_frames += elapsed_frames - 1
-                # GPIO data
-                if self.device_model == "Chameleon3":
-                    img_data = img_buffer[-1]
-                    gpio_buffer.append([(img_data[32] >> 4) & 1, (img_data[32] >> 5) & 1, (img_data[32] >> 7) & 1])
-                else:
-                    gpio_binary = format(chunk_data.GetExposureEndLineStatusAll(), "04b")
-                    gpio_buffer.append([int(gpio_binary[3]), int(gpio_binary[1]), int(gpio_binary[0])])
-                next_image.Release()  # Clears image from buffer.
-        except PySpin.SpinnakerException:  # Buffer is empty.
-            if len(img_buffer) == 0:
-                return
-            else:
-                return {
-                    "images": img_buffer,
-                    "gpio_data": gpio_buffer,
-                    "timestamps": timestamps_buffer,
-                    "dropped_frames": dropped_frames,
-                }
+            except PySpin.SpinnakerException:  # Buffer is empty.
+                self.frame_pool.release(slot)
+                break
+            img_data = self.frame_pool.frames[slot]
+            img_data[:] = next_image.GetNDArray().reshape(-1)  # Copy image pixels into the frame pool.
+            self.batch_frame_indices[n_images] = slot
+            chunk_data = next_image.GetChunkData()  # Additional image data.
+            timestamp = chunk_data.GetTimestamp()  # Image timestamp (nanoseconds)
+            self.batch_timestamps[n_images] = timestamp
+            # GPIO line status and frame counter, decoded for the whole batch below. Chameleon3 line status and
+            # frame counter are read from the images.
+            if self.device_model != "Chameleon3":
+                self.batch_line_status[n_images] = chunk_data.GetExposureEndLineStatusAll()
+                self.batch_frame_numbers[n_images] = chunk_data.GetFrameID()
+            next_image.Release()  # Clears image from buffer.
+            n_images += 1
+
+        if n_images == 0:
+            return
+        line_status = self.batch_line_status[:n_images]
+        if self.device_model == "Chameleon3":
+            embedded_info = self.frame_pool.frames[self.batch_frame_indices[:n_images], :36]
+            line_status[:] = embedded_info[:, 32]
+            self.batch_frame_numbers[:n_images] = embedded_info[:, 24:28].copy().view(">u4")[:, 0]  # Big endian.
+        self.batch_gpio_data[:n_images] = (line_status[:, None] >> self.gpio_pin_bits) & 1
+        return self.get_image_batch(n_images)
 
 
 # Camera system functions -------------------------------------------------------------------------------
 
 
 def list_available_cameras(VERBOSE=False) -> list[str]:
-    """PySpin specific implementation of getting a list of serial numbers from all the pyspin cameras"""
+    """PySpin specific implementation of getting a list of serial numbers from all the pyspin cameras. Serial numbers
+    are read from the transport layer device nodemap, so cameras are not initialised."""
     unique_id_list = []
-    pyspin_system = PySpin.System.GetInstance()
-    pyspin_cam_list = pyspin_system.GetCameras()
+    pyspin_cam_list = PYSPINSYSTEM.GetCameras()
 
     if VERBOSE:
         print(f"Number of cameras detected: {pyspin_cam_list.GetSize()}")
 
     for cam in pyspin_cam_list:
         try:
-            cam.Init()
-            cam_id: str = f"{cam.DeviceSerialNumber()}-spinnaker"
+            cam_id: str = f"{cam.TLDevice.DeviceSerialNumber.GetValue()}-spinnaker"
             if VERBOSE:
                 print(f"Camera ID: {cam_id}")
             unique_id_list.append(cam_id)
         except Exception as e:
             if VERBOSE:
                 print(f"Error accessing camera: {e}")
-        finally:
-            if cam.IsStreaming():
-                continue
-            else:
-                cam.DeInit()
+        del cam  # Release the camera reference before the list is cleared.
     pyspin_cam_list.Clear()
-    pyspin_system.ReleaseInstance()
     return unique_id_list
 
 
@@ -1,7 +1,7 @@
 from ximea import xiapi
 
+import ctypes
 import cv2
-import numpy as np
 from collections import OrderedDict
 from math import floor, ceil
 
@@ -25,6 +25,7 @@ class XimeaCamera(GenericCamera):
         self.cam = xiapi.Camera()
         self.cam.open_device_by_SN(self.serial_number)
         self.previous_frame_number = 0
+        self.image = xiapi.Image()  # Reused for every image taken from the camera buffer.
         self.device_model = self.cam.get_device_model_id()
         # Dictionaries for supporting colored cameras -----------------------------------
         # List of color formats Ximea supports
@@ -157,6 +158,7 @@ class XimeaCamera(GenericCamera):
                 self.cam.start_acquisition()
             except xiapi.Xi_error as e:
                 print("Error starting acqusition:", e)
+        self.allocate_frame_pool()
         if CameraConfig:
             self.set_frame_rate(CameraConfig.fps)
             self.set_gain(CameraConfig.gain)
@@ -173,37 +175,31 @@ class XimeaCamera(GenericCamera):
 
     def get_available_images(self):
         """Gets all available images from the buffer and return images GPIO pinstate data and timestamps."""
-        img_buffer = []
-        timestamps_buffer = []
-        gpio_data = []
-        dropped_frames = 0
+        n_images = 0
+        next_image = self.image
         # Get all available images from camera buffer.
-        try:
-            while True:
-                next_image = xiapi.Image()  # img class to put data into
+        while n_images < self.BUFFER_SIZE:
+            slot = self.frame_pool.acquire()
+            if slot is None:  # Frame pool full, leave remaining images in the camera buffer.
+                break
+            try:
                 self.cam.get_image(next_image, timeout=0)  # Raise an exception if buffer is empty.
-                img_buffer.append(
-                    np.frombuffer(next_image.get_image_data_raw(), dtype=np.uint8)
-                )  # Add the data as numpy buffer arrays
-                timestamps_buffer.append(
-                    next_image.tsSec * 1000000000 + next_image.tsUSec * 1000  # Padded to nanosecond resolution
-                )  # Create timestamp for the image
-                if self.previous_frame_number != (next_image.acq_nframe - 1):
-                    dropped_frames += next_image.acq_nframe - self.previous_frame_number - 1
-                self.previous_frame_number = next_image.acq_nframe
-                gpio_data.append(
-                    [int(self.cam.get_gpi_level())]
-                )  # UNTESTED: function that returns GPI level of the single pin input
-        except xiapi.Xi_error:  # Buffer is empty.
-            if len(img_buffer) == 0:
-                return
-            else:
-                return {
-                    "images": img_buffer,
-                    "gpio_data": gpio_data,
-                    "timestamps": timestamps_buffer,
-                    "dropped_frames": dropped_frames,
-                }
+            except xiapi.Xi_error:  # Buffer is empty.
+                self.frame_pool.release(slot)
+                break
+            # Copy image pixels into the frame pool.
+            ctypes.memmove(self.frame_pool.frames[slot].ctypes.data, next_image.bp, self.frame_pool.frame_size)
+            self.batch_frame_indices[n_images] = slot
+            self.batch_timestamps[n_images] = (
+                next_image.tsSec * 1000000000 + next_image.tsUSec * 1000  # Padded to nanosecond resolution
+            )  # Create timestamp for the image
+            self.batch_frame_numbers[n_images] = next_image.acq_nframe  # Frame counter, used to find dropped frames.
+            self.batch_gpio_data[n_images, 0] = self.cam.get_gpi_level()  # UNTESTED: GPI level of the single pin input
+            n_images += 1
+
+        if n_images == 0:
+            return
+        return self.get_image_batch(n_images)
 
 
 # Camera system functions -------------------------------------------------------------------------------
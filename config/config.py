@@ -6,16 +6,65 @@ __version__ = "1.0.0"
 
 gui_config = {
     "camera_update_rate": 30,  # Rate at which to get new images from camera buffer.
-    "camera_updates_per_display_update": 1,  # How often images are fetched from camera per update of video display.
+    "display_update_rate": 30,  # Rate (Hz) at which video displays are updated, independent of camera_update_rate.
+    "display_downsampling": "stride",  # Method to downsample images to their on-screen size, "stride" or "area".
+    "camera_property_update_interval": 1,  # Time (s) between readouts of camera settings shown in the preview.
+    "display_backend": "pyqtgraph",  # Video display backend, "pyqtgraph", "qimage" or "opengl".
+    "software_opengl": False,  # Use software OpenGL rendering, e.g. on machines without a GPU.
     "font_size": 12,  # Font size to use in GUI.
 }
 
+# Acquisition settings ----------------------------------------------------------------
+
+acquisition_config = {
+    "reader_poll_interval": 0.002,  # Time (s) camera reader threads wait before polling an empty camera buffer again.
+    "reader_queue_size": 100,  # Maximum number of frames queued per camera between reader and recorder.
+    "camera_init_timeout": 30,  # Time (s) allowed for each camera to be opened and configured.
+    "camera_discovery_interval": 5,  # Time (s) between checks for connected cameras, 0 to only check on refresh.
+    "pre_trigger_duration": 0,  # Time (s) before recording starts that is included in recordings, 0 to disable.
+    "pre_trigger_max_size": 2**30,  # Maximum memory (bytes) used per camera for frames from before recording starts.
+    "gpio_trigger": None,  # Rule starting and stopping recording from GPIO inputs, see GUI/gpio_trigger.py.
+}
+
 # Default FFMPEG config ----------------------------------------------------------------
 
 ffmpeg_config = {
     "crf": 23,  # Controls video quality vs file size, range [1 - 51], lower is higher quality and larger files.
     "encoding_speed": "fast",  # Controls encoding speed vs file size, value values ["fast", "medium", "slow"]
     "compression_standard": "h264",  # ["h265" , "h264"]
+    "keyframe_interval": 250,  # Frames between keyframes, used to seek in recorded videos, 0 for the encoder default.
+    "fragmented_mp4": False,  # Write fragmented MP4 files, which stay readable if recording is interrupted.
+}
+
+# Recording settings -----------------------------------------------------------------
+
+recording_config = {
+    "max_encode_lag": 2,  # Time (s) images can wait to be written before the backpressure policy is applied.
+    "backpressure_policy": "alert",  # ["alert", "faster_preset", "raw_spill"] Action when the encoder falls behind.
+    "writer_queue_size": 200,  # Maximum number of frames waiting to be written per camera.
+    "gpio_file_format": "csv",  # ["csv", "npy"] Format of the GPIO and timestamp file, npy is a binary format.
+    "writer_full_policy": "block",  # ["block", "drop"] Wait for space or discard batches when the writer queue is full.
+    "output_format": "video",  # ["video", "raw"] Encode video with FFMPEG or write raw frames to disk.
+    "raw_write_size": 2**24,  # Size (bytes) of each write to raw video files.
+    "raw_preallocate_size": 2**30,  # Disk space (bytes) allocated ahead of writes to raw video files.
+    "raw_use_mmap": False,  # Copy frames into raw video files through memory mapped windows of the file.
+    "segment_duration": 0,  # Minutes of recording per file segment, 0 to record each session to one file set.
+    "segment_size": 0,  # Size (GB) of the video file at which a new segment is started, 0 for no size limit.
+    "sync_cameras": True,  # Fit camera clocks to the host clock and write an aligned frame table, see camera_sync.py.
+}
+
+# Simulated cameras ------------------------------------------------------------------
+
+simulated_camera_config = {
+    "n_cameras": 0,  # Number of virtual cameras listed by the simulated camera API, 0 to disable.
+    "width": 640,  # Image width (pixels).
+    "height": 480,  # Image height (pixels).
+    "pixel_formats": ["Mono", "Colour"],  # Pixel formats the virtual cameras support, in order of priority.
+    "gpio_pattern": "counter",  # ["counter", "pulse", "off"] State of GPIO pins as a function of frame number.
+    "gpio_period": 30,  # Frames per period of the GPIO pattern.
+    "timestamp_jitter": 0,  # Standard deviation of noise added to frame timestamps (nanoseconds).
+    "drop_probability": 0,  # Probability that each frame is dropped by the camera.
+    "seed": 0,  # Random seed, virtual camera i uses seed + i.
 }
 
 # Paths -------------------------------------------------------------------------------
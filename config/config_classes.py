@@ -0,0 +1,35 @@
+from dataclasses import dataclass
+
+# Configuration dataclasses shared by the GUI and headless recording -----------------
+
+
+@dataclass
+class CameraSettingsConfig:
+    """Represents the CamerasTab settings for one camera"""
+
+    name: str
+    unique_id: str
+    fps: int
+    exposure_time: float
+    gain: float
+    pixel_format: str
+    external_trigger: bool
+    downsampling_factor: int
+
+
+@dataclass
+class CameraWidgetConfig:
+    """Represents the configuration of a Camera_widget."""
+
+    label: str
+    subject_id: str
+
+
+@dataclass
+class ExperimentConfig:
+    """Represents the configuration of the VideoCaptureTab."""
+
+    data_dir: str
+    n_cameras: int
+    n_columns: int
+    cameras: list[CameraWidgetConfig]
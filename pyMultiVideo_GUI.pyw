@@ -1,5 +1,7 @@
+from GUI import startup_timing  # Imported first to time startup from launch.
 import logging
 import sys
+import json
 import argparse
 from config.config import gui_config
 
@@ -85,9 +87,14 @@ from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6 import QtGui
 from GUI.GUI_main import GUIMain
+from GUI.video_display import set_opengl_attributes
+
+startup_timing.mark("imports")
 
 
 def main(parsed_args, unparsed_args):
+    application_config = json.loads(parsed_args.application_config) if parsed_args.application_config else {}
+    set_opengl_attributes({**gui_config, **application_config.get("gui_config", {})})
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     font = QtGui.QFont()
@@ -96,6 +103,7 @@ def main(parsed_args, unparsed_args):
     # Parse the arguments to main window
     gui = GUIMain(parsed_args)
     gui.show()
+    startup_timing.mark("main window shown")
     sys.excepthook = gui.exception_hook
     app.exec()
 
@@ -0,0 +1,133 @@
+"""Record from cameras without the GUI, e.g. on machines with no display.
+
+python pyMultiVideo_headless.py record --experiment-config experiment.json --camera-config config/camera_configs.json
+
+Config options take either a path to a JSON file or a JSON formatted string, in the same format as
+the configs saved by the GUI. PyQt6 and pyqtgraph are not imported.
+
+python pyMultiVideo_headless.py convert-gpio data/subject_2024-01-01-120000_GPIO_data.npy
+
+converts binary GPIO files to the CSV layout.
+
+python pyMultiVideo_headless.py transcode-raw data/subject_2024-01-01-120000.raw
+
+encodes raw video files to video with the FFMPEG settings in config/config.py.
+"""
+
+from GUI import startup_timing  # Imported first to time startup from launch.
+import os
+import sys
+import json
+import shutil
+import argparse
+
+from config.config import gui_config, ffmpeg_config, paths_config, acquisition_config, recording_config
+from config.config import default_camera_config
+from config.config_classes import CameraSettingsConfig, CameraWidgetConfig, ExperimentConfig
+
+
+def load_json_arg(value):
+    """Load a config argument given as a path to a JSON file or as a JSON formatted string."""
+    if os.path.isfile(value):
+        with open(value, "r") as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def valid_time(value):
+    try:
+        hours, minutes = map(int, value.split(":"))
+        if hours < 0 or minutes < 0 or minutes >= 60:
+            raise ValueError
+        return hours * 3600 + minutes * 60
+    except ValueError:
+        raise argparse.ArgumentTypeError("Time must be in the format HH:MM with valid values.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record from cameras without the GUI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="Record video from the cameras in an experiment config")
+    record_parser.add_argument(
+        "--experiment-config", required=True, help="Experiment configuration, JSON file or string"
+    )
+    record_parser.add_argument(
+        "--camera-config",
+        default=os.path.join(paths_config["camera_dir"], "camera_configs.json"),
+        help="Camera configuration, JSON file or string (default: the camera configs saved by the GUI)",
+    )
+    record_parser.add_argument("--application-config", help="Application configuration, JSON file or string")
+    record_parser.add_argument("--duration", type=float, help="Recording duration in seconds")
+    record_parser.add_argument("--close-after", type=valid_time, help="Recording duration in the format HH:MM")
+    convert_parser = subparsers.add_parser("convert-gpio", help="Convert binary GPIO files (.npy) to CSV")
+    convert_parser.add_argument("filepaths", nargs="+", help="GPIO data files to convert")
+    convert_parser.add_argument(
+        "--first-timestamp",
+        type=int,
+        help="Camera timestamp (ns) CSV timestamps are relative to, by default the recording's first frame",
+    )
+    transcode_parser = subparsers.add_parser("transcode-raw", help="Encode raw video files (.raw) to video")
+    transcode_parser.add_argument("filepaths", nargs="+", help="Raw video files to encode")
+    return parser.parse_args()
+
+
+def load_configs(args):
+    """Return the experiment config, camera settings and application config specified by the arguments."""
+    config_data = load_json_arg(args.experiment_config)
+    config_data["cameras"] = [CameraWidgetConfig(**camera) for camera in config_data["cameras"]]
+    experiment_config = ExperimentConfig(**config_data)
+    if os.path.isfile(args.camera_config) or not args.camera_config.endswith(".json"):
+        cams_list = load_json_arg(args.camera_config)
+    else:  # No cameras have been saved by the GUI.
+        cams_list = []
+    camera_settings = [CameraSettingsConfig(**{**default_camera_config, **cam_dict}) for cam_dict in cams_list]
+    application_config = {
+        "gui_config": gui_config,
+        "ffmpeg_config": ffmpeg_config,
+        "acquisition_config": acquisition_config,
+        "recording_config": recording_config,
+    }
+    if args.application_config:  # Options not given keep their default values.
+        for key, value in load_json_arg(args.application_config).items():
+            if isinstance(value, dict) and isinstance(application_config.get(key), dict):
+                application_config[key] = {**application_config[key], **value}
+            else:
+                application_config[key] = value
+    application_config["ffmpeg_path"] = shutil.which("ffmpeg")
+    return experiment_config, camera_settings, application_config
+
+
+def main():
+    args = parse_args()
+    if args.command == "convert-gpio":
+        from GUI.gpio_log import convert_to_csv
+
+        for filepath in args.filepaths:
+            print(f"Converted {filepath} to {convert_to_csv(filepath, first_timestamp=args.first_timestamp)}")
+        return
+    if args.command == "transcode-raw":
+        from GUI.data_recorder import transcode_raw_video
+
+        ffmpeg_path = shutil.which("ffmpeg")
+        if not ffmpeg_path:
+            print("FFMPEG path not found. Please install FFMPEG and add to environment variables")
+            sys.exit(1)
+        for filepath in args.filepaths:
+            print(f"Encoded {filepath} to {transcode_raw_video(filepath, ffmpeg_path, ffmpeg_config)}")
+        return
+    experiment_config, camera_settings, application_config = load_configs(args)
+    if not application_config["ffmpeg_path"] and application_config["recording_config"]["output_format"] != "raw":
+        print("FFMPEG path not found. Please install FFMPEG and add to environment variables")
+        sys.exit(1)
+    duration = args.duration if args.duration is not None else args.close_after
+
+    # Imported after parsing so --help does not initialise the camera APIs.
+    from GUI.recording_session import RecordingSession
+
+    startup_timing.mark("imports")
+    session = RecordingSession(experiment_config, camera_settings, application_config)
+    session.run(duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -63,7 +63,7 @@ def create_camera_config(n_cameras, fps, downsampling_factor):
 
 def generate_performance_test_config(
     camera_update_rate,
-    updates_per_display,
+    display_update_rate,
     fps,
     n_camera,
     downsampling_factor,
@@ -76,7 +76,7 @@ def generate_performance_test_config(
         "application_config": {
             "gui_config": {
                 "camera_update_rate": camera_update_rate,
-                "camera_updates_per_display_update": updates_per_display,
+                "display_update_rate": display_update_rate,
                 "font_size": 12,
             },
             "ffmpeg_config": {
@@ -112,7 +112,7 @@ testing_parameters = {
     "fps_range": [30, 60, 90, 120],
     # GUI config
     "camera_update_range": [10, 20, 40],
-    "camera_updates_per_display_update": [1, 2, 4],
+    "display_update_range": [5, 15, 30],
     # FFMPEG
     "crf_range": [1, 23, 51],
     "encoding_speed_options": ["fast", "medium", "slow"],
@@ -139,7 +139,7 @@ except Exception as e:
 
 DOWNSAMPLING_FACTOR = 2
 CAMERA_UPDATE_RATE = 20
-UPDATES_PER_DISPLAY = 1
+DISPLAY_UPDATE_RATE = 20
 CRF = 23
 ENCODERING_SPEED = "fast"
 COMPRESSION_STANDARD = "h265"
@@ -153,11 +153,11 @@ for fps in testing_parameters["fps_range"]:
         for downsampling_factor in testing_parameters["downsample_range"]:
             for encoding_speed in testing_parameters["encoding_speed_options"]:
                 for compression_standard in testing_parameters["compression_standard"]:
-                    for updates_per_display in testing_parameters["camera_updates_per_display_update"]:
+                    for display_update_rate in testing_parameters["display_update_range"]:
                         for crf in testing_parameters["crf_range"]:
                             config_dir = (
                                 f"config_ncams_{n_camera}_downsample_{downsampling_factor}_fps_{fps}_"
-                                f"update_{CAMERA_UPDATE_RATE}_upd_per_disp_{updates_per_display}_"
+                                f"update_{CAMERA_UPDATE_RATE}_disp_{display_update_rate}_"
                                 f"crf_{crf}_speed_{encoding_speed}_comp_{compression_standard}"
                             )
                             test_config_dir = test_directory / config_dir
@@ -171,6 +171,6 @@ for fps in testing_parameters["fps_range"]:
                                 downsampling_factor=downsampling_factor,
                                 encoding_speed=encoding_speed,
                                 compression_standard=compression_standard,
-                                updates_per_display=updates_per_display,
+                                display_update_rate=display_update_rate,
                             ),
                         )
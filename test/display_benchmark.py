@@ -0,0 +1,124 @@
+"""Benchmark of the video display cost per camera tile count for each display backend.
+
+A grid of tiles like the video capture tab is shown for each backend and tile count, and every tile is given a
+new preview image and repainted --n-updates times. Images are generated before the timed updates so only display
+cost is measured. Results are saved to results.json and results.csv in the output folder.
+
+Run from the /code folder, e.g.:
+python test/display_benchmark.py --backend pyqtgraph qimage opengl --n-tiles 1 4 9 16 --tile-size 400x300
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+# Add the parent directory to sys.path for proper imports
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import pyqtgraph as pg
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QGridLayout, QWidget
+
+from config.config import __version__
+from GUI.video_display import get_display_backend, make_image_item
+
+
+def make_tile(display_backend):
+    """Return a graphics view and image item set up as in the camera widget."""
+    graphics_view = pg.GraphicsView(useOpenGL=display_backend == "opengl")
+    view_box = pg.ViewBox(defaultPadding=0, invertY=True)
+    view_box.setMouseEnabled(x=False, y=False)
+    graphics_view.setCentralItem(view_box)
+    image_item = make_image_item(display_backend)
+    view_box.addItem(image_item)
+    view_box.setAspectLocked()
+    return graphics_view, image_item
+
+
+def run_display_benchmark(app, display_backend, n_tiles, tile_width, tile_height, colour, n_updates):
+    """Display n_updates frames on every tile and return the display time and CPU time per update."""
+    window = QWidget()
+    layout = QGridLayout(window)
+    n_columns = int(np.ceil(np.sqrt(n_tiles)))
+    tiles = []
+    for i in range(n_tiles):
+        graphics_view, image_item = make_tile(display_backend)
+        graphics_view.setFixedSize(tile_width, tile_height)
+        layout.addWidget(graphics_view, i // n_columns, i % n_columns)
+        tiles.append(image_item)
+    window.show()
+    shape = (tile_height, tile_width, 3) if colour else (tile_height, tile_width)
+    frames = [np.random.randint(0, 256, shape, dtype=np.uint8) for _ in range(4)]
+    for image_item in tiles:  # First frame sets the view range.
+        image_item.setImage(frames[0])
+    app.processEvents()
+    start_time, start_cpu_time = time.perf_counter(), time.process_time()
+    for update in range(n_updates):
+        for image_item in tiles:
+            image_item.setImage(frames[update % len(frames)])
+        window.repaint()
+        app.processEvents()
+    wall_time, cpu_time = time.perf_counter() - start_time, time.process_time() - start_cpu_time
+    window.close()
+    return {
+        "ms_per_update": 1000 * wall_time / n_updates,
+        "cpu_ms_per_update": 1000 * cpu_time / n_updates,
+        "max_display_rate": n_updates / wall_time,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", nargs="+", default=["pyqtgraph", "qimage", "opengl"])
+    parser.add_argument("--n-tiles", type=int, nargs="+", default=[1, 4, 9, 16])
+    parser.add_argument("--tile-size", default="400x300", help="Tile size on screen (pixels), WIDTHxHEIGHT")
+    parser.add_argument("--colour", action="store_true", help="Display colour instead of mono images")
+    parser.add_argument("--n-updates", type=int, default=200, help="Number of display updates per run")
+    parser.add_argument("--software-opengl", action="store_true", help="Use software OpenGL rendering")
+    parser.add_argument("--output-dir", default=os.path.join("data", "benchmarks"))
+    args = parser.parse_args()
+
+    if args.software_opengl:
+        QApplication.setAttribute(Qt.ApplicationAttribute.AA_UseSoftwareOpenGL)
+    app = QApplication(sys.argv)
+    pg.setConfigOption("imageAxisOrder", "row-major")
+    tile_width, tile_height = map(int, args.tile_size.split("x"))
+    output_dir = Path(args.output_dir) / datetime.now().strftime("display-%Y-%m-%d-%H%M%S")
+    output_dir.mkdir(parents=True)
+    run_info = {"version": __version__, "platform": platform.platform(), "software_opengl": args.software_opengl}
+    rows = []
+    for requested_backend in args.backend:
+        display_backend = get_display_backend(requested_backend)
+        for n_tiles in args.n_tiles:
+            results = run_display_benchmark(
+                app, display_backend, n_tiles, tile_width, tile_height, args.colour, args.n_updates
+            )
+            rows.append(
+                {
+                    **run_info,
+                    "backend": display_backend,
+                    "n_tiles": n_tiles,
+                    "tile_size": args.tile_size,
+                    "colour": args.colour,
+                    **results,
+                }
+            )
+            print(
+                f"{display_backend:>9}, {n_tiles:>2} tiles: {results['ms_per_update']:.2f} ms per update, "
+                f"{results['cpu_ms_per_update']:.2f} ms CPU, max {results['max_display_rate']:.0f} Hz"
+            )
+    with open(output_dir / "results.json", "w") as f:
+        json.dump(rows, f, indent=4)
+    with open(output_dir / "results.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results saved to {output_dir}")
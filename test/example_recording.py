@@ -11,7 +11,7 @@ config_data = {
     "application_config": {
         "gui_config": {
             "camera_update_rate": 20,  # Rate at which to get new images from camera buffer.
-            "camera_updates_per_display_update": 1,  # How often images are fetched from camera per update of video display.
+            "display_update_rate": 20,  # Rate (Hz) at which video displays are updated.
             "font_size": 12,  # Font size to use in GUI.
         },
         "ffmpeg_config": {
@@ -0,0 +1,99 @@
+"""Tests of the frames recordings are started and stopped at by GPIO trigger rules.
+
+Run from the /code folder with: python -m pytest test
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add the parent directory to sys.path for proper imports
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from GUI.gpio_trigger import GPIOTrigger, split_batch
+
+FRAME_INTERVAL = 100_000_000  # Camera timestamp interval (ns), 10 fps.
+SIGNAL = [0] * 5 + [1] * 5 + [0] * 3 + [1] * 2 + [0] * 20  # GPIO1 state of each frame.
+BATCH_SIZES = [1, 3, 4, 7, 200]
+
+
+def get_events(rule, signal, batch_size):
+    """Return the (frame, event) of a GPIO1 signal evaluated in batches of batch_size frames, with frame numbers
+    from the start of the signal."""
+    gpio = np.zeros((len(signal), 3), dtype=np.uint8)
+    gpio[:, 0] = signal
+    timestamps = np.arange(len(signal), dtype=np.int64) * FRAME_INTERVAL
+    trigger = GPIOTrigger(rule)
+    events = []
+    for start in range(0, len(signal), batch_size):
+        batch_events = trigger.get_events(gpio[start : start + batch_size], timestamps[start : start + batch_size])
+        events += [(start + frame, event) for frame, event in batch_events]
+    return events
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_level_rule(batch_size):
+    rule = {"start": "GPIO1 high", "stop": "GPIO1 low"}
+    assert get_events(rule, SIGNAL, batch_size) == [(5, "start"), (10, "stop"), (13, "start"), (15, "stop")]
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_inverted_level_rule(batch_size):
+    # Recording continues after the last frame as the stop condition is not met again.
+    rule = {"start": "GPIO1 low", "stop": "GPIO1 high"}
+    expected = [(0, "start"), (5, "stop"), (10, "start"), (13, "stop"), (15, "start")]
+    assert get_events(rule, SIGNAL, batch_size) == expected
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_start_cancels_stop_during_delay(batch_size):
+    # The rising edge at frame 13 is within 0.5 s of the falling edge at frame 10, so recording continues until
+    # 0.5 s after the falling edge at frame 15.
+    rule = {"start": "GPIO1 rising", "stop": "GPIO1 falling", "stop_delay": 0.5}
+    assert get_events(rule, SIGNAL, batch_size) == [(5, "start"), (20, "stop")]
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_stop_delay(batch_size):
+    rule = {"start": "GPIO1 rising", "stop": "GPIO1 falling", "stop_delay": 0.2}
+    assert get_events(rule, SIGNAL, batch_size) == [(5, "start"), (12, "stop"), (13, "start"), (17, "stop")]
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_high_when_read_starts(batch_size):
+    # A level rule starts recording at the first frame, the first frame read is not a rising edge.
+    signal = [1] * 3 + [0] * 5
+    assert get_events({"start": "GPIO1 high", "stop": "GPIO1 low"}, signal, batch_size) == [(0, "start"), (3, "stop")]
+    assert get_events({"start": "GPIO1 rising", "stop": "GPIO1 falling"}, signal, batch_size) == []
+
+
+def test_invalid_condition():
+    with pytest.raises(ValueError):
+        GPIOTrigger({"start": "GPIO0 high", "stop": "GPIO1 low"})
+    with pytest.raises(ValueError):
+        GPIOTrigger({"start": "GPIO1 up", "stop": "GPIO1 low"})
+
+
+def test_split_batch():
+    n_frames = 10
+    frame_gaps = np.zeros(n_frames, dtype=np.int64)
+    frame_gaps[[2, 7]] = [1, 3]
+    new_images = {
+        "images": [np.full(4, i, dtype=np.uint8) for i in range(n_frames)],
+        "frame_indices": np.arange(n_frames),
+        "gpio_data": np.zeros((n_frames, 3), dtype=np.uint8),
+        "timestamps": np.arange(n_frames, dtype=np.int64) * FRAME_INTERVAL,
+        "frame_gaps": frame_gaps,
+        "dropped_frames": 4,
+        "read_time": 1.0,
+    }
+    parts = [split_batch(new_images, start, stop) for start, stop in [(0, 5), (5, n_frames)]]
+    assert [part["dropped_frames"] for part in parts] == [1, 3]
+    assert [len(part["images"]) for part in parts] == [5, 5]
+    assert all(part["read_time"] == new_images["read_time"] for part in parts)
+    for key in ("frame_indices", "timestamps", "frame_gaps"):
+        assert np.array_equal(np.concatenate([part[key] for part in parts]), new_images[key])
+    # Parts share the frames of the batch.
+    assert all(part["images"][0] is new_images["images"][i] for part, i in zip(parts, [0, 5]))
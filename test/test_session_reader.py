@@ -0,0 +1,85 @@
+"""Tests of reading recordings with the session reader.
+
+Run from the /code folder with: python -m pytest test
+"""
+
+import sys
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+# Add the parent directory to sys.path for proper imports
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from GUI.gpio_log import GPIOLogWriter
+from GUI.session_reader import SessionReader
+
+WIDTH, HEIGHT = 64, 48
+FIRST_TIMESTAMP = 5_313_620_515_965  # Camera timestamp (ns) of the first frame.
+FRAME_INTERVAL = 16_666_666  # (ns)
+
+
+def write_recording(tmp_path, gpio_file_format, n_video_frames=5, n_spill_frames=5):
+    """Write a recording of frames encoded to an mp4 file followed by frames written to a raw spill file, as after
+    the raw_spill backpressure policy, returning its file path stem."""
+    stem = str(tmp_path / "subject_2024-01-01-120000")
+    n_frames = n_video_frames + n_spill_frames
+    timestamps = FIRST_TIMESTAMP + np.arange(n_frames, dtype=np.int64) * FRAME_INTERVAL
+    gpio = np.zeros((n_frames, 3), dtype=np.uint8)
+    video_writer = cv2.VideoWriter(stem + ".mp4", cv2.VideoWriter_fourcc(*"mp4v"), 30, (WIDTH, HEIGHT))
+    for i in range(n_video_frames):
+        video_writer.write(np.full((HEIGHT, WIDTH, 3), i, dtype=np.uint8))
+    video_writer.release()
+    np.full((n_spill_frames, HEIGHT, WIDTH), 255, dtype=np.uint8).tofile(stem + "_spill.raw")
+    segments = []
+    for suffix, first_frame, last_frame in [("", 0, n_video_frames), ("_spill", n_video_frames, n_frames)]:
+        gpio_filename = f"{stem}{suffix}_GPIO_data.{gpio_file_format}"
+        if gpio_file_format == "npy":
+            gpio_log = GPIOLogWriter(gpio_filename, 3, first_frame)
+            gpio_log.write(timestamps[first_frame:last_frame], gpio[first_frame:last_frame])
+            gpio_log.close()
+        else:
+            rel_timestamps = timestamps[first_frame:last_frame] - FIRST_TIMESTAMP
+            table = np.column_stack([gpio[first_frame:last_frame], rel_timestamps])
+            np.savetxt(gpio_filename, table, fmt="%d", delimiter=",", header="GPIO1,GPIO2,GPIO3,Timestamp", comments="")
+        segments.append(
+            {
+                "video_file": Path(stem + (".mp4" if not suffix else "_spill.raw")).name,
+                "gpio_file": Path(gpio_filename).name,
+                "first_frame": first_frame,
+                "last_frame": last_frame - 1,
+                "first_timestamp": int(timestamps[first_frame]),
+                "last_timestamp": int(timestamps[last_frame - 1]),
+            }
+        )
+    metadata = {
+        "video_files": [{"filename": Path(stem).name + ".mp4", "first_frame": 0, "encoding_speed": "fast"}],
+        "raw_spill": {
+            "filename": Path(stem).name + "_spill.raw",
+            "first_frame": n_video_frames,
+            "width": WIDTH,
+            "height": HEIGHT,
+            "pixel_format": "gray",
+        },
+        "segments": segments,
+    }
+    with open(stem + "_metadata.json", "w") as f:
+        json.dump(metadata, f)
+    return stem
+
+
+@pytest.mark.parametrize("gpio_file_format", ["npy", "csv"])
+def test_timestamps_relative_to_first_frame(tmp_path, gpio_file_format):
+    with SessionReader(write_recording(tmp_path, gpio_file_format)) as session:
+        assert np.array_equal(session.timestamps, np.arange(10) * FRAME_INTERVAL)
+        assert session.frame_index_at_time(3 * FRAME_INTERVAL) == 3
+
+
+def test_iter_batches_cut_at_files(tmp_path):
+    with SessionReader(write_recording(tmp_path, "npy")) as session:
+        batches = list(session.iter_batches(batch_size=4))
+    assert [batch["frame_indices"].tolist() for batch in batches] == [[0, 1, 2, 3], [4], [5, 6, 7, 8], [9]]
+    assert [batch["frames"].shape[1:] for batch in batches] == [(HEIGHT, WIDTH, 3)] * 2 + [(HEIGHT, WIDTH)] * 2
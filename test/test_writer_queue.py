@@ -0,0 +1,70 @@
+"""Tests that the writer full policy is applied when the encoder is slower than the camera.
+
+Run from the /code folder with: python -m pytest test
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the parent directory to sys.path for proper imports
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from camera_api.simulated import SimulatedCamera
+from config.config import acquisition_config, default_camera_config, ffmpeg_config, recording_config
+from config.config_classes import CameraSettingsConfig
+from GUI.acquisition_engine import CameraReader
+from GUI.data_recorder import Data_recorder
+
+
+def record_with_slow_writer(tmp_path, monkeypatch, writer_full_policy, duration=1.5):
+    """Record from a simulated camera at 200 fps to a raw file written at about 50 fps, returning the recorder
+    and the maximum number of camera frames waiting to be written."""
+    settings = CameraSettingsConfig(**{**default_camera_config, "unique_id": "00000000-simulated", "fps": 200})
+    config = {**recording_config, "output_format": "raw", "writer_full_policy": writer_full_policy}
+    camera_api = SimulatedCamera(settings)
+    data_recorder = Data_recorder(camera_api, None, ffmpeg_config, config)
+    camera_api.set_frame_pool_size(acquisition_config["reader_queue_size"] + config["writer_queue_size"])
+    camera_api.begin_capturing(settings)
+    camera_reader = CameraReader(camera_api, queue_size=acquisition_config["reader_queue_size"])
+    camera_reader.start()
+    data_recorder.start_recording("test", str(tmp_path), settings)
+    raw_write = data_recorder.raw_video.write
+
+    def slow_write(images, timestamps):  # An encoder slower than the camera.
+        time.sleep(0.02 * len(images))
+        raw_write(images, timestamps)
+
+    monkeypatch.setattr(data_recorder.raw_video, "write", slow_write)
+    camera_reader.start_queueing()
+    max_pending_pool_frames = 0
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        for new_images in camera_reader.get_batches():
+            data_recorder.put_images(new_images)
+        max_pending_pool_frames = max(max_pending_pool_frames, data_recorder.pending_pool_frames)
+        time.sleep(0.01)
+    camera_reader.stop_queueing()
+    monkeypatch.undo()  # Write the remaining frames at full speed.
+    for new_images in camera_reader.get_batches():
+        data_recorder.put_images(new_images)
+    data_recorder.stop_recording()
+    camera_reader.stop()
+    camera_api.stop_capturing()
+    return data_recorder, max_pending_pool_frames
+
+
+@pytest.mark.parametrize("writer_full_policy", ["drop", "block"])
+def test_writer_full_policy(tmp_path, monkeypatch, writer_full_policy):
+    data_recorder, max_pending_pool_frames = record_with_slow_writer(tmp_path, monkeypatch, writer_full_policy)
+    events = [event for event in data_recorder.metadata["backpressure_events"] if "writer_queue_full" in event]
+    assert events and events[0]["writer_queue_full"] == writer_full_policy
+    assert max_pending_pool_frames <= recording_config["writer_queue_size"]
+    if writer_full_policy == "drop":
+        # Frames are discarded by the writer, not lost at the camera for lack of image buffers.
+        assert data_recorder.writer_dropped_frames > 0
+        assert data_recorder.dropped_frames == 0
+    else:
+        assert data_recorder.writer_dropped_frames == 0
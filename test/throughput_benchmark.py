@@ -0,0 +1,173 @@
+"""Throughput benchmark of recording from simulated cameras over a sweep of camera, encoder and application settings.
+
+Each combination of the parameter values is recorded for --duration seconds with the headless recording
+session, in a separate process so that CPU time and memory are measured per run. Results are saved to
+results.json and results.csv in the output folder, one row per camera per run.
+
+Run from the /code folder, e.g.:
+python test/throughput_benchmark.py --n-cameras 1 4 --resolution 640x480 1280x1024 --fps 60 120 --duration 10
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import itertools
+import subprocess
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+# Add the parent directory to sys.path for proper imports
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from config.config import __version__, gui_config, ffmpeg_config, acquisition_config, recording_config
+from config.config import default_camera_config
+
+SWEEP_PARAMETERS = [  # (name, type, default values)
+    ("n_cameras", int, [1]),
+    ("resolution", str, ["640x480"]),
+    ("fps", int, [60]),
+    ("pixel_format", str, ["Mono"]),
+    ("downsampling_factor", int, [1]),
+    ("compression_standard", str, [ffmpeg_config["compression_standard"]]),
+    ("crf", int, [ffmpeg_config["crf"]]),
+    ("encoding_speed", str, [ffmpeg_config["encoding_speed"]]),
+    ("backpressure_policy", str, [recording_config["backpressure_policy"]]),
+    ("gpio_file_format", str, [recording_config["gpio_file_format"]]),
+]
+
+
+def run_recording(run_config):
+    """Record from simulated cameras with the settings in run_config and return the per camera results."""
+    from config.config import simulated_camera_config
+
+    width, height = map(int, run_config["resolution"].split("x"))
+    simulated_camera_config.update(
+        {"n_cameras": run_config["n_cameras"], "width": width, "height": height, "pixel_formats": ["Mono", "Colour"]}
+    )
+    from GUI.recording_session import RecordingSession
+    from config.config_classes import CameraSettingsConfig, CameraWidgetConfig, ExperimentConfig
+
+    unique_ids = [f"{i:08d}-simulated" for i in range(run_config["n_cameras"])]
+    camera_settings = [
+        CameraSettingsConfig(
+            **{
+                **default_camera_config,
+                "unique_id": unique_id,
+                "fps": run_config["fps"],
+                "exposure_time": min(default_camera_config["exposure_time"], 1e6 / run_config["fps"] - 100),
+                "pixel_format": run_config["pixel_format"],
+                "downsampling_factor": run_config["downsampling_factor"],
+            }
+        )
+        for unique_id in unique_ids
+    ]
+    experiment_config = ExperimentConfig(
+        data_dir=run_config["data_dir"],
+        n_cameras=run_config["n_cameras"],
+        n_columns=1,
+        cameras=[
+            CameraWidgetConfig(label=unique_id, subject_id=f"camera-{i}") for i, unique_id in enumerate(unique_ids)
+        ],
+    )
+    application_config = {
+        "gui_config": gui_config,
+        "acquisition_config": acquisition_config,
+        "recording_config": {
+            **recording_config,
+            "backpressure_policy": run_config["backpressure_policy"],
+            "gpio_file_format": run_config["gpio_file_format"],
+        },
+        "ffmpeg_config": {
+            **ffmpeg_config,
+            **{key: run_config[key] for key in ("compression_standard", "crf", "encoding_speed")},
+        },
+        "ffmpeg_path": shutil.which("ffmpeg"),
+    }
+    session = RecordingSession(experiment_config, camera_settings, application_config)
+    start_time = time.perf_counter()
+    session.run(run_config["duration"])
+    wall_time = time.perf_counter() - start_time
+    # CPU time and peak memory of this process and the ffmpeg processes it started.
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    process_stats = {
+        "cpu_percent": 100 * (usage_self.ru_utime + usage_self.ru_stime) / wall_time,
+        "encoder_cpu_percent": 100 * (usage_children.ru_utime + usage_children.ru_stime) / wall_time,
+        "peak_rss_MB": usage_self.ru_maxrss / 1024,  # ru_maxrss is in kilobytes on Linux.
+        "encoder_peak_rss_MB": usage_children.ru_maxrss / 1024,
+    }
+    return [{**camera_results, **process_stats} for camera_results in session.get_results()]
+
+
+def run_benchmark(run_config):
+    """Run one recording in a new process and return its results."""
+    command = [sys.executable, __file__, "--run-config", json.dumps(run_config)]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        print(process.stderr)
+        return []
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def save_results(output_dir, rows):
+    """Save the results as JSON and CSV."""
+    with open(output_dir / "results.json", "w") as f:
+        json.dump(rows, f, indent=4)
+    if rows:
+        with open(output_dir / "results.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    for name, type_, default in SWEEP_PARAMETERS:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type_, nargs="+", default=default)
+    parser.add_argument("--duration", type=float, default=10, help="Recording duration of each run (s)")
+    parser.add_argument("--repeats", type=int, default=1, help="Number of runs of each combination of settings")
+    parser.add_argument("--output-dir", default=os.path.join("data", "benchmarks"))
+    parser.add_argument("--keep-data", action="store_true", help="Keep the recorded video files")
+    parser.add_argument("--run-config", help=argparse.SUPPRESS)  # Used to run a single recording in a new process.
+    args = parser.parse_args()
+
+    if args.run_config:
+        results = run_recording(json.loads(args.run_config))
+        print(json.dumps(results))
+        sys.exit()
+
+    if not shutil.which("ffmpeg"):
+        print("FFMPEG path not found. Please install FFMPEG and add to environment variables")
+        sys.exit(1)
+
+    output_dir = Path(args.output_dir) / datetime.now().strftime("%Y-%m-%d-%H%M%S")
+    output_dir.mkdir(parents=True)
+    sweep_names = [name for name, _, _ in SWEEP_PARAMETERS]
+    combinations = list(itertools.product(*[getattr(args, name) for name in sweep_names]))
+    run_info = {"version": __version__, "platform": platform.platform(), "python": platform.python_version()}
+    rows = []
+    for run_number, values in enumerate(combinations * args.repeats):
+        run_config = dict(zip(sweep_names, values))
+        print(f"Run {run_number + 1}/{len(combinations) * args.repeats}: {run_config}")
+        run_config["duration"] = args.duration
+        run_config["data_dir"] = (
+            str(output_dir / f"run-{run_number}") if args.keep_data else tempfile.mkdtemp(prefix="pmv_benchmark_")
+        )
+        results = run_benchmark(run_config)
+        if not args.keep_data:
+            shutil.rmtree(run_config["data_dir"], ignore_errors=True)
+        for camera_results in results:
+            rows.append({**run_info, "run": run_number, **run_config, **camera_results})
+            print(
+                f"    {camera_results['label']}: {camera_results['sustained_fps']:.1f} fps, "
+                f"{camera_results['dropped_frames']} dropped, encode lag {camera_results['encode_lag']:.2f} s"
+            )
+        save_results(output_dir, rows)  # Saved after every run so results are kept if the sweep is interrupted.
+    print(f"Results saved to {output_dir}")
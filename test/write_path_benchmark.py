@@ -0,0 +1,79 @@
+"""Benchmark of the data recorder's write path from camera image buffers to the ffmpeg pipe.
+
+Compares the previous write path (np.concatenate of the batch then a single write) with the current
+one (writelines of the original image buffers). The pipe is a reader process that discards the data,
+so the measurement is of the copies made in python rather than of video encoding.
+
+Run from the /code folder: python test/write_path_benchmark.py --width 2048 --height 2048 --fps 150
+"""
+
+import sys
+import time
+import argparse
+import tracemalloc
+import subprocess
+import numpy as np
+
+
+def concatenate_write(pipe, images):
+    """Write path before: copy the batch into one contiguous array then write it."""
+    frame = np.concatenate([img for img in images])
+    pipe.write(frame)
+
+
+def writelines_write(pipe, images):
+    """Write path after: write the original image buffers one after another."""
+    pipe.writelines(images)
+
+
+def run_benchmark(write_function, width, height, batch_size, n_batches):
+    """Return the bytes allocated per frame and the throughput of a write path."""
+    # Pipe to a process that reads and discards stdin, like ffmpeg would consume it.
+    discard_stdin = "import os, sys, shutil; shutil.copyfileobj(sys.stdin.buffer, open(os.devnull, 'wb'))"
+    sink = subprocess.Popen([sys.executable, "-c", discard_stdin], stdin=subprocess.PIPE)
+    # Images are allocated up front, as they would be by the camera API.
+    batches = [
+        [np.random.randint(0, 255, width * height, dtype=np.uint8) for _ in range(batch_size)]
+        for _ in range(min(n_batches, 4))
+    ]
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    allocated = 0
+    start_time = time.perf_counter()
+    for i in range(n_batches):
+        snapshot_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        write_function(sink.stdin, batches[i % len(batches)])
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - snapshot_size
+    elapsed = time.perf_counter() - start_time
+    tracemalloc.stop()
+    sink.stdin.close()
+    sink.wait()
+    n_frames = n_batches * batch_size
+    return {
+        "bytes_copied_per_frame": allocated / n_frames,
+        "frames_per_second": n_frames / elapsed,
+        "MB_per_second": n_frames * width * height / elapsed / 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--height", type=int, default=2048)
+    parser.add_argument("--fps", type=int, default=150, help="Camera frame rate (Hz)")
+    parser.add_argument("--update-rate", type=int, default=30, help="Rate (Hz) batches are passed to the recorder")
+    parser.add_argument("--n-batches", type=int, default=200)
+    args = parser.parse_args()
+
+    batch_size = max(1, args.fps // args.update_rate)
+    frame_bytes = args.width * args.height
+    print(f"Frame size: {args.width}x{args.height} ({frame_bytes / 1e6:.2f} MB), {batch_size} frames per batch")
+    for name, write_function in [("before (concatenate)", concatenate_write), ("after (writelines)", writelines_write)]:
+        result = run_benchmark(write_function, args.width, args.height, batch_size, args.n_batches)
+        print(
+            f"{name:22s} bytes copied per frame: {result['bytes_copied_per_frame']:>12.0f} "
+            f"({result['bytes_copied_per_frame'] / frame_bytes:.2f} frames), "
+            f"throughput: {result['frames_per_second']:.0f} fps, {result['MB_per_second']:.0f} MB/s"
+        )